@@ -22,7 +22,48 @@ class Settings(BaseSettings):
     
     # Models
     LLM_MODEL: str = "openai/gpt-4o-mini"  # Основная модель
+    LLM_FAST_MODEL: str = "openai/gpt-4.1-nano"  # Быстрая модель: простые вызовы и фолбэк при деградации основной
+    # Модель по типу вызова: "main" / "fast" / id модели. Не указан — LLM_MODEL.
+    # Типы: router, rerank, extract, refine, bio, recall, summary
+    LLM_MODEL_MAP: dict[str, str] = {"rerank": "fast", "bio": "fast"}
+    LLM_FALLBACK_P95_MS: int = 20000  # p95 основной модели выше порога -> LLM_FAST_MODEL (0 — выключено)
+    LLM_FALLBACK_WINDOW_SEC: int = 300  # Окно для rolling p95
+    LLM_FALLBACK_MIN_SAMPLES: int = 20  # Меньше замеров в окне — фолбэк не включается
     EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_BATCH_SIZE: int = 256  # Входов в одном запросе к embeddings API
+    EMBEDDING_MAX_CONCURRENCY: int = 4  # Одновременных батч-запросов в get_embeddings
+
+    # Telemetry: цена за 1M токенов [prompt, completion, cached prompt] — если провайдер не вернул usage.cost
+    LLM_PRICES_PER_MTOK: dict[str, list[float]] = {
+        "openai/gpt-4o-mini": [0.15, 0.60, 0.075],
+        "openai/gpt-4.1-nano": [0.10, 0.40, 0.025],
+        "text-embedding-3-small": [0.02, 0.0],
+    }
+    TELEMETRY_FLUSH_SEC: int = 60  # Как часто сбрасывать дневные агрегаты в llm_usage
+
+    # Resilience (llm_resilience): дедлайны, брейкер, хеджирование вызовов провайдеров
+    LLM_TIMEOUT_SEC: float = 30.0  # Дедлайн вызова по умолчанию (включая ретраи SDK)
+    # Дедлайн по типу вызова; router — на один шаг агента (для стрима — на весь стрим)
+    LLM_TIMEOUTS_SEC: dict[str, float] = {
+        "router": 45.0,
+        "rerank": 15.0,
+        "extract": 20.0,
+        "refine": 20.0,
+        "bio": 20.0,
+        "recall": 30.0,
+        "summary": 60.0,
+        "embed": 15.0,
+        "stt": 60.0,
+    }
+    LLM_BREAKER_ERROR_RATE: float = 0.5  # Доля сбоев (таймауты, 429, 5xx, обрывы) для размыкания
+    LLM_BREAKER_MIN_CALLS: int = 10  # Меньше исходов в окне — брейкер не размыкается
+    LLM_BREAKER_WINDOW_SEC: float = 60.0
+    LLM_BREAKER_COOLDOWN_SEC: float = 30.0  # Сколько держать разомкнутым до пробного вызова
+    LLM_HEDGE_ENABLED: bool = False  # Дубль запроса после p90 места вызова (удваивает стоимость медленного хвоста)
+    LLM_HEDGE_CALL_TYPES: list[str] = ["rerank", "extract", "refine", "bio", "embed"]  # Только идемпотентные, без стрима
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Пока замеров меньше — задержка LLM_HEDGE_DEFAULT_DELAY_MS
+    LLM_HEDGE_DEFAULT_DELAY_MS: int = 3000
+    LLM_HEDGE_MIN_DELAY_MS: int = 500  # Не хеджировать раньше (защита от шквала дублей на быстрых вызовах)
 
     # Voice (Groq)
     GROQ_API_KEY: str | None = None
@@ -30,10 +71,67 @@ class Settings(BaseSettings):
     # Proxy
     PROXY_URL: str | None = None
 
+    # HTTP (общий пул для LLM, эмбеддингов и STT)
+    HTTP_MAX_CONNECTIONS: int = 50
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SEC: float = 60.0
+    HTTP_CONNECT_TIMEOUT_SEC: float = 5.0
+    HTTP_READ_TIMEOUT_SEC: float = 60.0  # Агентский шаг с tools бывает долгим, STT грузит файл
+    HTTP2_ENABLED: bool = True
+
     # App Settings
     CHAT_HISTORY_DEPTH: int = 10
+    FREE_CHAT_HISTORY_DEPTH: int = 3  # "Короткая память" Free: сырых сообщений в контексте, остальное — в резюме
+    CONTEXT_TOKEN_BUDGET: int = 3000  # Бюджет токенов на историю в промпте агента (оценка локальная, см. context_builder)
+    CONTEXT_SYSTEM_ROW_MAX_TOKENS: int = 300  # Длинные system-строки истории ([Context Memory], [Tool Used]) сжимаются до этого размера
+    TOOL_SUMMARY_CHARS: int = 120  # Саммари контакта в результатах инструментов обрезается до N символов
+    SUMMARY_ENABLED: bool = True  # Rolling summary старой истории (chat_summaries)
+    SUMMARY_DEBOUNCE_SEC: float = 5.0  # Компакция ждет конца хода: сообщения одного хода сворачиваются одним вызовом
+    TOOL_TIMEOUT_SEC: float = 30.0  # Таймаут инструмента агента по умолчанию
+    # Таймауты инструментов агента; add/update включают extract/refine + embedding, поэтому дольше поиска
+    TOOL_TIMEOUTS_SEC: dict[str, float] = {
+        "search_contacts": 25.0,
+        "add_contact": 45.0,
+        "update_contact": 45.0,
+        "delete_contact": 15.0,
+        "check_subscription": 10.0,
+    }
+    # Бюджет времени на ход агента (все шаги роутера + инструменты) по тарифу, см. agent_budget
+    AGENT_BUDGET_SEC: dict[str, float] = {"free": 60.0, "pro": 90.0}
+    AGENT_BUDGET_DEFAULT_SEC: float = 60.0  # Тариф не из AGENT_BUDGET_SEC
+    AGENT_BUDGET_RESERVE_SEC: float = 10.0  # Остаток на ответ без инструментов: дальше шаги не начинаются
     LOG_LEVEL: str = "INFO"  # DEBUG, INFO, WARNING, ERROR
-    
+
+    # LLM traces (trace_recorder): промпты/ответы целиком, только выборка
+    TRACE_ENABLED: bool = False
+    TRACE_SAMPLE_RATE: float = 0.01  # Доля вызовов остальных юзеров
+    TRACE_USER_IDS: list[int] = []  # Opt-in: трейсится каждый вызов (еще — /trace on <user_id>)
+    TRACE_BUFFER_SIZE: int = 200  # Последние трейсы в памяти (/trace)
+    TRACE_DIR: str | None = None  # Например "traces" — JSONL по дням; без него только буфер
+    TRACE_QUEUE_SIZE: int = 1000  # Очередь на запись; переполнение — трейс только в буфере
+
+    # Streaming replies (финальный текстовый ответ агента)
+    STREAM_REPLIES: bool = True
+    STREAM_MIN_CHARS: int = 100  # Короче — ждем конца ответа (короткий текст может замениться списком контактов)
+    STREAM_EDIT_INTERVAL_SEC: float = 1.0  # Не чаще одного edit_message_text в секунду (лимиты Telegram)
+
+    # Search / Pagination
+    SEARCH_PAGE_SIZE: int = 10  # Контактов на одну страницу в чате
+    SEARCH_RESULT_SET_SIZE: int = 30  # Сколько кандидатов ранжируем за один поиск (кэшируется для "Дальше")
+    SEARCH_RESULTS_TTL_SEC: int = 900  # Сколько живет кэш страниц поиска
+    SEARCH_MATCH_THRESHOLD: float = 0.2  # Порог косинусной близости в match_contacts (подбирать через scripts/bench_search.py)
+    SPECULATIVE_SEARCH: bool = False  # Реплики-поиски ищутся параллельно с первым шагом роутера (speculative_search)
+
+    # LLM response cache (extract / refine / bio)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ITEMS: int = 512
+    LLM_CACHE_TTL_SEC: int = 604800  # 7 дней
+    LLM_CACHE_DIR: str | None = None  # Например "cache/llm" — дисковый уровень, переживает рестарт
+
+    # Duplicate detection (in-memory name index)
+    NAME_INDEX_TTL_SEC: int = 3600  # Полная перезагрузка индекса имен юзера из БД
+    NAME_MATCH_THRESHOLD: float = 0.55  # Порог похожести имен для предупреждения о дубле
+
     # Freemium / Monetization Settings
     TRIAL_DAYS: int = 3
     FREE_CONTACTS_LIMIT: int = 10
@@ -63,9 +161,11 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # Настраиваем логгер с уровнем из .env
+# enqueue: запись в stderr из фонового потока, хэндлеры не ждут вывода
 logger.add(
     sys.stderr,
     level=settings.LOG_LEVEL,
+    enqueue=True,
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
 )
 
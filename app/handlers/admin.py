@@ -30,6 +30,8 @@ async def cmd_admin(message: types.Message):
             "• <code>/check_user &lt;user_id&gt;</code>\n"
             "• <code>/debug_user &lt;user_id&gt;</code>\n"
             "• <code>/create_org &lt;name&gt;</code>\n"
+            "• <code>/llm_stats</code> — латентность и стоимость LLM\n"
+            "• <code>/trace [on|off &lt;user_id&gt;]</code> — трейсы промптов LLM\n"
         )
         await message.answer(text)
 
@@ -290,3 +292,106 @@ async def cmd_create_org(message: types.Message):
     except Exception as e:
         logger.error(f"Create org error: {e}")
         await message.reply(f"❌ Error: {e}")
+
+@router.message(Command("llm_stats"))
+async def cmd_llm_stats(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return
+
+    from app.services.telemetry import telemetry
+    from app.infrastructure.supabase.client import get_supabase
+
+    rows = telemetry.snapshot()
+    if rows:
+        lines = [
+            f"{r['site']:<14} {r['calls']:>5} {r['wall_p50_ms']:>6} {r['wall_p95_ms']:>6} {r['ttfb_p50_ms']:>5} "
+            f"{r['prompt_tokens'] + r['completion_tokens']:>8} {r['cached_pct']:>5} {r['cost_usd']:>7.3f}"
+            for r in rows
+        ]
+        header = f"{'site':<14} {'calls':>5} {'p50':>6} {'p95':>6} {'ttfb':>5} {'tokens':>8} {'cach%':>5} {'$':>7}"
+        text = "📊 <b>LLM (с рестарта):</b>\n<pre>" + "\n".join([header] + lines) + "</pre>"
+    else:
+        text = "📊 <b>LLM:</b> вызовов с рестарта не было."
+
+    from app.services.agent_budget import agent_budgets
+    budgets = agent_budgets.snapshot()
+    if budgets:
+        text += "\n\n⏱ <b>Бюджет хода агента:</b>\n" + "\n".join(
+            f"{plan}: {b['runs']} ходов, исчерпан {b.get('exhausted', 0)} ({b['exhausted_pct']}%) — "
+            f"список {b.get('partial', 0)}, ответ {b.get('answered', 0)}, ничего {b.get('timeout', 0)}"
+            for plan, b in budgets.items()
+        )
+
+    from app.services.speculative_search import speculative_search
+    spec = speculative_search.stats
+    if spec["started"]:
+        text += (
+            f"\n\n🔮 <b>Спекулятивный поиск:</b> hit rate {100 * speculative_search.hit_rate():.0f}% | "
+            f"запусков {spec['started']}, hit {spec['hits']}, miss {spec['misses']}, "
+            f"без поиска {spec['unused']}, орг {spec['skipped']}, ошибок {spec['errors']}"
+        )
+
+    # Топ юзеров по стоимости за сегодня (из llm_usage, без несброшенного буфера)
+    await telemetry.flush()
+    try:
+        from datetime import datetime, timezone
+        today = datetime.now(timezone.utc).date().isoformat()
+        response = get_supabase().table("llm_usage")\
+            .select("user_id, calls, cost_usd")\
+            .eq("day", today)\
+            .execute()
+        per_user = {}
+        for row in response.data or []:
+            agg = per_user.setdefault(row["user_id"], [0, 0.0])
+            agg[0] += row["calls"]
+            agg[1] += float(row["cost_usd"])
+        top = sorted(per_user.items(), key=lambda item: item[1][1], reverse=True)[:10]
+        if top:
+            text += "\n\n💸 <b>Сегодня, топ юзеров:</b>\n" + "\n".join(
+                f"<code>{user_id}</code>: {calls} вызовов, ${cost:.4f}" for user_id, (calls, cost) in top
+            )
+    except Exception as e:
+        logger.error(f"LLM stats query error: {e}")
+        text += f"\n\n❌ llm_usage: {e}"
+
+    await message.reply(text)
+
+@router.message(Command("trace"))
+async def cmd_trace(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return
+
+    import html
+    from app.services.trace_recorder import trace_recorder
+
+    args = message.text.split()
+    if len(args) == 3 and args[1] in ("on", "off") and args[2].isdigit():
+        user_id = int(args[2])
+        if args[1] == "on":
+            trace_recorder.opt_in(user_id)
+        else:
+            trace_recorder.opt_out(user_id)
+        await message.reply(f"✅ Трейсинг для <code>{user_id}</code>: {args[1]}")
+        return
+
+    if len(args) != 1:
+        await message.reply("Usage: <code>/trace</code> или <code>/trace on|off &lt;user_id&gt;</code>")
+        return
+
+    if not settings.TRACE_ENABLED:
+        await message.reply("ℹ️ Трейсинг выключен (TRACE_ENABLED=false).")
+        return
+
+    opted = ", ".join(str(u) for u in sorted(trace_recorder.opted_in)) or "-"
+    lines = [
+        f"🔎 <b>LLM traces</b> (sample {settings.TRACE_SAMPLE_RATE:.0%}, opt-in: {opted}, dropped: {trace_recorder.dropped})"
+    ]
+    for trace in trace_recorder.recent(limit=5):
+        response = trace["response"] or {}
+        choice = (response.get("choices") or [{}])[0].get("message", response)
+        answer = choice.get("content") or ", ".join(tc["function"]["name"] for tc in choice.get("tool_calls") or []) or "-"
+        lines.append(
+            f"\n<code>{trace['ts'][11:19]}</code> {trace['site']} user={trace['user_id']} "
+            f"{trace['wall_ms']}ms, {len(trace['messages'])} msgs\n→ {html.escape(answer[:200])}"
+        )
+    await message.reply("\n".join(lines))
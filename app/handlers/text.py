@@ -5,11 +5,14 @@ from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from loguru import logger
 from app.utils.chat_action import KeepTyping
+from app.utils.message_streamer import MessageStreamer
 from app.services.ai_service import ai_service
 from app.services.search_service import search_service
 from app.services.user_service import user_service
 from app.services.news_service import news_service
 from app.services.recall_service import recall_service
+from app.services.pagination_service import pagination_service
+from app.services.intent_service import intent_service
 from app.services.subscription_service import check_limits, get_limit_message
 from app.config import settings
 from app.schemas import (
@@ -26,6 +29,43 @@ def generate_request_id() -> str:
     """Генерирует короткий случайный ID для запроса (8 символов)."""
     return secrets.token_urlsafe(6)[:8]  # Берем первые 8 символов
 
+def build_contacts_list(results: list, header: str, next_token: str | None = None):
+    """
+    Рендерит страницу списка контактов: текст + кнопки удаления (+ "Дальше", если есть следующая страница).
+    """
+    items_text = []
+    builder = InlineKeyboardBuilder()
+    
+    for res in results:
+        short_id = str(res.id)[:5]
+        org_name = getattr(res, "org_name", None)
+        if org_name:
+            scope_badge = f" <i>📢 {org_name}</i>"
+        else:
+            scope_badge = " <i>🔒 Личное</i>"
+
+        item_str = f"🆔 <code>{short_id}</code> | 👤 <b>{res.name}</b>{scope_badge}"
+        if res.summary:
+            item_str += f"\n📝 {res.summary}"
+        items_text.append(item_str)
+        builder.button(text=f"🗑 {short_id}", callback_data=f"pre_del_{res.id}")
+
+    builder.adjust(3)
+    if next_token:
+        builder.row(types.InlineKeyboardButton(text="➡️ Дальше", callback_data=f"page_{next_token}"))
+
+    return header + "\n\n".join(items_text), builder.as_markup()
+
+def new_streamer(message: types.Message) -> MessageStreamer | None:
+    """Стример финального ответа агента (None, если потоковый вывод выключен в настройках)."""
+    if not settings.STREAM_REPLIES:
+        return None
+    return MessageStreamer(
+        message,
+        min_chars=settings.STREAM_MIN_CHARS,
+        interval_sec=settings.STREAM_EDIT_INTERVAL_SEC
+    )
+
 async def handle_agent_response(message: types.Message, response):
     try:
         user_id = message.from_user.id
@@ -36,27 +76,16 @@ async def handle_agent_response(message: types.Message, response):
                 await message.reply("Ничего не нашел 🤷‍♂️")
                 return
             
-            header = f"🔎 <b>Нашел {len(response)} контактов:</b>\n\n"
-            items_text = []
-            builder = InlineKeyboardBuilder()
-            
-            for res in response:
-                short_id = str(res.id)[:5]
-                org_name = getattr(res, "org_name", None)
-                if org_name:
-                    scope_badge = f" <i>📢 {org_name}</i>"
-                else:
-                    scope_badge = " <i>🔒 Личное</i>"
-
-                item_str = f"🆔 <code>{short_id}</code> | 👤 <b>{res.name}</b>{scope_badge}"
-                if res.summary:
-                    item_str += f"\n📝 {res.summary}"
-                items_text.append(item_str)
-                builder.button(text=f"🗑 {short_id}", callback_data=f"pre_del_{res.id}")
+            page, next_token = pagination_service.open(user_id, response, settings.SEARCH_PAGE_SIZE)
+            if next_token and not getattr(response, "next_cursor", None):
+                header = f"🔎 <b>Нашел {len(response)} контактов</b> (1–{len(page)}):\n\n"
+            elif next_token:
+                header = f"🔎 <b>Контакты 1–{len(page)}:</b>\n\n"
+            else:
+                header = f"🔎 <b>Нашел {len(page)} контактов:</b>\n\n"
 
-            full_text = header + "\n\n".join(items_text)
-            builder.adjust(3)
-            await message.reply(full_text, reply_markup=builder.as_markup())
+            text, markup = build_contacts_list(page, header, next_token)
+            await message.reply(text, reply_markup=markup)
         
         # 2. ДРАФТ СОЗДАНИЯ (Нужно подтверждение)
         elif isinstance(response, ContactDraft):
@@ -174,7 +203,7 @@ async def handle_agent_response(message: types.Message, response):
 
             elif action["type"] == "update":
                 update_ask = action["data"]
-                await search_service.update_contact(update_ask.contact_id, user_id, update_ask.updates)
+                await search_service.apply_update_ask(update_ask, user_id)
                 await message.reply(f"✅ <b>Обновил:</b> {update_ask.name}")
             
         # 6. ДЕЙСТВИЕ ОТМЕНЕНО (из текста "нет")
@@ -209,15 +238,40 @@ async def handle_agent_response(message: types.Message, response):
         logger.error(f"Agent response handler error: {e}")
         await message.reply("Ошибка при отображении ответа.")
 
+async def try_fast_intent(message: types.Message, user_text: str) -> bool:
+    """
+    Fast-path для ответа на ожидающее действие: "да" / "ок" / "нет" / "отмена"
+    разбираются локальным классификатором и сразу превращаются в ActionConfirmed / ActionCancelled.
+    Возвращает False, если действия нет или ответ неоднозначный / про другое действие (тогда решает Router LLM).
+    """
+    user_id = message.from_user.id
+    if user_id not in pending_actions:
+        return False
+
+    # Глагол действия ("удали", "обнови") подтверждает только ожидающее действие того же типа
+    intent = intent_service.classify(user_text, pending_actions[user_id].get("type"))
+    if intent is None:
+        return False
+
+    logger.info(f"Fast intent | {intent} | User: {user_id}")
+    response = ActionConfirmed() if intent == "confirm" else ActionCancelled()
+    await handle_agent_response(message, response)
+
+    # История как после обычного прохода агента: реплика юзера + вызов инструмента
+    tool_name = "confirm_action" if intent == "confirm" else "cancel_action"
+    await user_service.save_chat_message(user_id, "user", user_text)
+    await user_service.save_chat_message(user_id, "system", f"[Tool Used: {tool_name}, Args: {{}}]")
+    return True
+
 @router.message(F.text & ~F.text.startswith("/"))
 async def handle_text(message: types.Message):
     user_id = message.from_user.id
     user_text = message.text
     
     # --- Confirmation Lock (Блокировка действий) ---
-    if user_id in pending_actions:
-        # Пропускаем, пусть агент подтверждает или отменяет
-        pass 
+    # "да" / "нет" на ожидающее действие разбираем локально, без LLM
+    if await try_fast_intent(message, user_text):
+        return
         
     async with KeepTyping(message.bot, message.chat.id):
         # --- NEWS JACKING (Реакция на ссылки) ---
@@ -289,8 +343,10 @@ async def handle_text(message: types.Message):
         
         # --- STANDARD AGENT FLOW ---
         try:
-            response = await ai_service.run_router_agent(user_text, user_id)
-            await handle_agent_response(message, response)
+            streamer = new_streamer(message)
+            response = await ai_service.run_router_agent(user_text, user_id, streamer=streamer)
+            if streamer is None or not streamer.delivered:
+                await handle_agent_response(message, response)
         except Exception as e:
             logger.error(f"Text handler error: {e}")
             await message.reply("Что-то пошло не так.")
@@ -370,7 +426,7 @@ async def on_action_confirm(callback: types.CallbackQuery):
             update_ask = action["data"]
             try:
                 # update_contact теперь сам проверяет права и выбрасывает AccessDenied
-                await search_service.update_contact(update_ask.contact_id, user_id, update_ask.updates)
+                await search_service.apply_update_ask(update_ask, user_id)
                 await callback.message.edit_text(
                     f"✅ <b>Обновил:</b> {update_ask.name}\n\n📝 {update_ask.new_summary}"
                 )
@@ -393,6 +449,36 @@ async def on_action_confirm(callback: types.CallbackQuery):
         await callback.answer("Ошибка выполнения", show_alert=True)
         await user_service.save_chat_message(user_id, "system", f"[System] Action failed with error: {e}")
 
+@router.callback_query(F.data.startswith("page_"))
+async def on_next_page(callback: types.CallbackQuery):
+    """
+    Кнопка "Дальше" под списком контактов: отдает следующий срез из кэша поиска
+    или догружает следующую страницу листинга по keyset-курсору.
+    """
+    user_id = callback.from_user.id
+    token = callback.data.replace("page_", "")
+
+    try:
+        result = await pagination_service.next_page(user_id, token, settings.SEARCH_PAGE_SIZE)
+    except Exception as e:
+        logger.error(f"[on_next_page] Exception: {type(e).__name__}: {e}", exc_info=True)
+        await callback.answer("Ошибка загрузки", show_alert=True)
+        return
+
+    if result is None:
+        await callback.answer("Список устарел, повтори поиск", show_alert=True)
+        return
+
+    page, next_token, start = result
+    if not page:
+        await callback.answer("Больше контактов нет")
+        return
+
+    header = f"🔎 <b>Контакты {start}–{start + len(page) - 1}:</b>\n\n"
+    text, markup = build_contacts_list(page, header, next_token)
+    await callback.message.answer(text, reply_markup=markup)
+    await callback.answer()
+
 @router.callback_query(F.data == "cancel_action")
 async def on_action_cancel(callback: types.CallbackQuery):
     user_id = callback.from_user.id
@@ -4,7 +4,7 @@ from loguru import logger
 
 from app.services.audio_service import AudioService
 from app.services.ai_service import ai_service
-from app.handlers.text import handle_agent_response
+from app.handlers.text import handle_agent_response, try_fast_intent, new_streamer
 from app.services.user_service import user_service
 from app.utils.chat_action import KeepTyping
 from app.config import settings
@@ -58,12 +58,18 @@ async def handle_voice(message: types.Message):
         # Показываем юзеру, что мы услышали (и удаляем "Слушаю...")
         await status_msg.edit_text(f"🗣 <i>\"{transcribed_text}\"</i>")
         
-        # 4. Отправляем текст в Единый Мозг (Router Agent)
+        # 4. Голосовое "да" / "отмена" на ожидающее действие — без LLM
+        if await try_fast_intent(message, transcribed_text):
+            return
+
+        # 5. Отправляем текст в Единый Мозг (Router Agent)
         async with KeepTyping(message.bot, message.chat.id):
-            response = await ai_service.run_router_agent(transcribed_text, user_id)
+            streamer = new_streamer(message)
+            response = await ai_service.run_router_agent(transcribed_text, user_id, streamer=streamer)
             
-            # 5. Обрабатываем ответ агента (через общую функцию из text.py)
-            await handle_agent_response(message, response)
+            # 6. Обрабатываем ответ агента (через общую функцию из text.py), если он еще не дописан стримом
+            if streamer is None or not streamer.delivered:
+                await handle_agent_response(message, response)
         
     except Exception as e:
         logger.error(f"Voice pipeline error: {e}")
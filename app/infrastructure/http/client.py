@@ -0,0 +1,64 @@
+import httpx
+from app.config import settings
+from loguru import logger
+
+class HttpClient:
+    """
+    Общий пул HTTP-соединений для OpenRouter (chat + embeddings) и Groq (STT).
+    Один httpx.AsyncClient на процесс: keep-alive между запросами, лимиты пула,
+    явные таймауты и HTTP/2, если установлен пакет h2.
+    """
+    _instance: httpx.AsyncClient | None = None
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        if cls._instance is None:
+            http2 = settings.HTTP2_ENABLED
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("HTTP2_ENABLED=true, but package 'h2' is not installed. Falling back to HTTP/1.1")
+                    http2 = False
+
+            if settings.PROXY_URL:
+                logger.info(f"Using PROXY: {settings.PROXY_URL}")
+
+            # TTFB для телеметрии LLM (app/services/telemetry.py): хуки видят активный вызов через contextvar
+            from app.services.telemetry import telemetry
+
+            cls._instance = httpx.AsyncClient(
+                proxy=settings.PROXY_URL,
+                event_hooks={"request": [telemetry.on_request], "response": [telemetry.on_response]},
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SEC
+                ),
+                timeout=httpx.Timeout(
+                    connect=settings.HTTP_CONNECT_TIMEOUT_SEC,
+                    read=settings.HTTP_READ_TIMEOUT_SEC,
+                    write=settings.HTTP_READ_TIMEOUT_SEC,
+                    pool=settings.HTTP_CONNECT_TIMEOUT_SEC
+                )
+            )
+            logger.info(
+                f"HTTP client initialized (http2={http2}, max_connections={settings.HTTP_MAX_CONNECTIONS}, "
+                f"read_timeout={settings.HTTP_READ_TIMEOUT_SEC}s)"
+            )
+        return cls._instance
+
+    @classmethod
+    async def close(cls):
+        if cls._instance is not None:
+            await cls._instance.aclose()
+            cls._instance = None
+            logger.info("HTTP client closed")
+
+# Глобальный инстанс
+def get_http_client() -> httpx.AsyncClient:
+    return HttpClient.get_client()
+
+async def close_http_client():
+    await HttpClient.close()
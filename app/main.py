@@ -11,12 +11,21 @@ from app.handlers import base, voice, text, settings as settings_handler, profil
 from app.services.user_service import user_service
 from app.services.recall_service import recall_service
 from app.infrastructure.supabase.client import get_supabase
+from app.infrastructure.http.client import close_http_client
+from app.services.telemetry import telemetry
+from app.services.prompt_assembly import prompt_assembly
+from app.services.trace_recorder import trace_recorder
 
 # Твой ID для уведомлений (можно вынести в .env, но пока так)
 ADMIN_ID = 6108932752
 
 async def on_startup(bot: Bot):
     logger.info("Bot started! Polling...")
+
+    # Промпты читаются и замораживаются один раз: стабильный префикс для prompt caching провайдера
+    prompt_assembly.compile()
+    # Фоновая запись выборочных трейсов LLM в JSONL (если TRACE_ENABLED и задан TRACE_DIR)
+    trace_recorder.start()
     
     # Инициализируем Supabase клиент при старте (чтобы сразу видеть в логах, какой ключ используется)
     try:
@@ -40,6 +49,13 @@ async def on_startup(bot: Bot):
     except Exception as e:
         logger.error(f"Failed to send startup message: {e}")
 
+async def on_shutdown(bot: Bot):
+    # Досбрасываем телеметрию, пока пул и Supabase еще живы
+    await telemetry.flush()
+    await trace_recorder.stop()
+    # Закрываем общий пул соединений к LLM/STT (keep-alive сокеты, HTTP/2 сессии)
+    await close_http_client()
+
 async def main():
     logger.info("Starting NetWho Bot...")
     
@@ -68,8 +84,11 @@ async def main():
     # Middlewares (Order matters!)
     from app.middlewares.clear_state_on_command import ClearStateOnCommandMiddleware
     from app.middlewares.user_check import UserCheckMiddleware
+    from app.middlewares.telemetry_user import TelemetryUserMiddleware
     
     # Clear state on commands FIRST (highest priority)
+    # Атрибуция вызовов LLM юзеру (сообщения, колбэки, платежи)
+    dp.update.outer_middleware(TelemetryUserMiddleware())
     dp.message.middleware(ClearStateOnCommandMiddleware())
     # Then check/resurrect user
     dp.message.middleware(UserCheckMiddleware())
@@ -78,11 +97,14 @@ async def main():
     
     # Хук на старт
     dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
     
     # Scheduler Setup
     scheduler = AsyncIOScheduler()
     # Запускаем каждую минуту, чтобы попадать в пользовательские таймслоты
     scheduler.add_job(recall_service.process_recalls, "cron", minute='*', args=[bot])
+    # Дневные агрегаты телеметрии LLM -> llm_usage
+    scheduler.add_job(telemetry.flush, "interval", seconds=settings.TELEMETRY_FLUSH_SEC)
     
     scheduler.start()
     logger.info("Scheduler started")
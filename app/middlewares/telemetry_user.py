@@ -0,0 +1,25 @@
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from app.services.telemetry import telemetry
+
+class TelemetryUserMiddleware(BaseMiddleware):
+    """
+    Outer middleware на Update: привязывает все вызовы LLM / эмбеддингов / STT
+    внутри обработки апдейта к юзеру (для дневной стоимости в llm_usage).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        token = telemetry.bind_user(user.id if user else None)
+        try:
+            return await handler(event, data)
+        finally:
+            telemetry.reset_user(token)
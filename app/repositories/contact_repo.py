@@ -39,11 +39,17 @@ class ContactRepository:
         
         return self.db.table('contacts').insert(contact_data).execute()
 
-    async def search(self, user_id: int, query: str):
+    async def search(self, user_id: int, query: str, limit: int = 20, filters: dict | None = None):
         """
-        Hybrid search (Story 15)
+        Hybrid search (Story 15).
+        Результат отсортирован на стороне БД (см. migrations/fix_search_pagination_v6.sql).
+        filters — структурные фильтры RPC (p_org_id, p_role, p_company, p_interest),
+        применяются в WHERE (migrations/fix_search_meta_filters_v7.sql).
         """
-        return self.db.rpc('search_hybrid', {'p_user_id': user_id, 'p_query': query}).execute()
+        params = {'p_user_id': user_id, 'p_query': query, 'p_limit': limit}
+        if filters:
+            params.update(filters)
+        return self.db.rpc('search_hybrid', params).execute()
 
     async def increment_free_searches(self, user_id: int, org_id: str) -> int:
         """
@@ -1,6 +1,7 @@
 from datetime import datetime
 from uuid import UUID
-from pydantic import BaseModel, Field, ConfigDict
+from typing import Any
+from pydantic import BaseModel, Field, ConfigDict, PrivateAttr
 
 # --- User Schemas ---
 class UserSettings(BaseModel):
@@ -68,7 +69,9 @@ class ContactCreate(BaseModel):
 
 class ContactDraft(ContactCreate):
     """Промежуточный объект для подтверждения добавления"""
-    pass
+    # Вектор досчитывается в фоне, пока юзер смотрит на драфт (AIService.defer_embedding)
+    _embedding_task: Any = PrivateAttr(default=None)
+    _embedding_text: str | None = PrivateAttr(default=None)
 
 class ContactDeleteAsk(BaseModel):
     """Объект запроса подтверждения удаления"""
@@ -83,6 +86,9 @@ class ContactUpdateAsk(BaseModel):
     old_summary: str | None
     new_summary: str
     updates: dict
+    # updates без embedding: вектор досчитывается в фоне до подтверждения (AIService.defer_embedding)
+    _embedding_task: Any = PrivateAttr(default=None)
+    _embedding_text: str | None = PrivateAttr(default=None)
 
 class ActionConfirmed(BaseModel):
     """Сигнал о подтверждении действия из текста"""
@@ -115,3 +121,13 @@ class SearchResult(BaseModel):
     org_id: UUID | None = None
     org_name: str | None = None
     distance: float | None = None
+
+class SearchResultPage(list):
+    """
+    Страница листинга контактов (list[SearchResult]) с keyset-курсором на следующую.
+    Наследуется от list, чтобы код, ожидающий список результатов, работал без изменений.
+    """
+    def __init__(self, items=(), next_cursor: str | None = None, org_id: str | None = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+        self.org_id = org_id
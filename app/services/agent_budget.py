@@ -0,0 +1,73 @@
+import time
+from collections import Counter
+from loguru import logger
+from app.config import settings
+
+
+class AgentBudget:
+    """
+    Дедлайн одного хода агента (run_router_agent): шаги роутера и инструменты укладываются в step_window(),
+    последние reserve_sec оставлены на ответ юзеру без инструментов.
+    """
+
+    def __init__(self, owner: "AgentBudgets", plan: str, total_sec: float, reserve_sec: float, started: float):
+        self.owner = owner
+        self.plan = plan
+        self.total_sec = total_sec
+        self.reserve_sec = reserve_sec
+        self.deadline = started + total_sec
+
+    def left(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def step_window(self) -> float:
+        """Сколько можно потратить на шаг роутера / инструмент, не залезая в резерв на ответ."""
+        return self.left() - self.reserve_sec
+
+    def exhausted(self) -> bool:
+        return self.step_window() <= 0
+
+    def cap(self, timeout: float) -> float:
+        """Таймаут инструмента, урезанный до остатка бюджета."""
+        return max(0.0, min(timeout, self.step_window()))
+
+    def record(self, outcome: str, step: int):
+        """Бюджет кончился: outcome — partial (отдали последний список), answered (короткий ответ LLM), timeout (ничего)."""
+        stats = self.owner.stats[self.plan]
+        stats["exhausted"] += 1
+        stats[outcome] += 1
+        logger.warning(
+            f"Agent budget exhausted | plan={self.plan} | budget={self.total_sec:.0f}s | "
+            f"step={step} | outcome={outcome} | overrun={-self.left():.1f}s"
+        )
+
+
+class AgentBudgets:
+    """
+    Бюджеты времени на ход агента по тарифу (AGENT_BUDGET_SEC: free / pro).
+    Считает ходы и исчерпания бюджета по тарифу — для /llm_stats.
+    """
+
+    def __init__(self):
+        # plan -> runs / exhausted / partial / answered / timeout
+        self.stats: dict[str, Counter] = {}
+
+    def start(self, plan: str, started: float | None = None) -> AgentBudget:
+        total = settings.AGENT_BUDGET_SEC.get(plan, settings.AGENT_BUDGET_DEFAULT_SEC)
+        self.stats.setdefault(plan, Counter())["runs"] += 1
+        return AgentBudget(
+            self, plan, total, settings.AGENT_BUDGET_RESERVE_SEC,
+            started if started is not None else time.monotonic()
+        )
+
+    def snapshot(self) -> dict[str, dict]:
+        return {
+            plan: {
+                **stats,
+                "exhausted_pct": round(100 * stats["exhausted"] / stats["runs"], 1) if stats["runs"] else 0.0,
+            }
+            for plan, stats in sorted(self.stats.items())
+        }
+
+
+agent_budgets = AgentBudgets()
@@ -1,15 +1,29 @@
+import asyncio
 import json
 import re
-from typing import List, Union
+import time
+from typing import Any, List, NamedTuple, Union
 from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
 from loguru import logger
 from app.config import settings
 from app.schemas import (
     ContactCreate, SearchResult, ContactExtracted, 
     ContactDraft, UserSettings, ContactDeleteAsk, ContactUpdateAsk,
-    ActionConfirmed, ActionCancelled
+    ActionConfirmed, ActionCancelled, SearchResultPage
 )
-from app.prompts_loader import get_prompt
+from app.infrastructure.http.client import get_http_client
+from app.services.llm_cache import llm_cache
+from app.services.context_builder import context_builder, prompt_tokens
+from app.services.summary_service import summary_service
+from app.services.tool_encoding import ContactHandles, UnknownContactHandle, encode_contacts, log_encoding_savings
+from app.services.telemetry import telemetry
+from app.services.model_router import model_router
+from app.services.llm_resilience import CircuitOpenError, llm_resilience
+from app.services.prompt_assembly import prompt_assembly
+from app.services.trace_recorder import trace_recorder
+from app.services.speculative_search import Speculation, speculative_search
+from app.services.agent_budget import AgentBudget, agent_budgets
 
 # Fixed schema syntax
 TOOLS_SCHEMA = [
@@ -23,7 +37,7 @@ TOOLS_SCHEMA = [
                 "properties": {
                     "query": {
                         "type": "string",
-                        "description": "Поисковый запрос. ВАЖНО: 1) Используй ТОЛЬКО ключевые слова (имя, профессия), удаляй мусорные слова ('найди', 'кто есть'). 2) Для поиска внутри организации используй формат 'org:НазваниеОрги' (например: 'org:skop')."
+                        "description": "Поисковый запрос. ВАЖНО: 1) Используй ТОЛЬКО ключевые слова (имя, профессия), удаляй мусорные слова ('найди', 'кто есть'). 2) Для поиска внутри организации используй формат 'org:НазваниеОрги' (например: 'org:skop'). 3) Если в запросе есть должность, компания или интерес, выноси их в фильтры role:, company:, interest: (значение с пробелами — в кавычках), например: 'role:CTO company:Яндекс', 'interest:крипта', 'role:\"Product Manager\"'."
                     }
                 },
                 "required": ["query"]
@@ -85,7 +99,7 @@ TOOLS_SCHEMA = [
                 "properties": {
                     "contact_id": {
                         "type": "string",
-                        "description": "UUID контакта для удаления."
+                        "description": "ID контакта для удаления: хэндл из результатов поиска (c1, c2, ...) или UUID."
                     }
                 },
                 "required": ["contact_id"]
@@ -102,7 +116,7 @@ TOOLS_SCHEMA = [
                 "properties": {
                     "contact_id": {
                         "type": "string",
-                        "description": "UUID контакта."
+                        "description": "ID контакта: хэндл из результатов поиска (c1, c2, ...) или UUID."
                     },
                     "text": {
                         "type": "string",
@@ -127,35 +141,114 @@ TOOLS_SCHEMA = [
     }
 ]
 
+# Tools входят в кэшируемый префикс запросов роутера (см. prompt_assembly)
+prompt_assembly.register_tools("router", TOOLS_SCHEMA)
+
+# Инструменты без побочных эффектов и terminal-исходов: в одном шаге выполняются параллельно.
+# Остальные (add / update / delete / confirm / cancel) — строго по одному, в порядке вызовов.
+READ_ONLY_TOOLS = {"search_contacts", "check_subscription"}
+
+class ToolOutcome(NamedTuple):
+    """Результат одного tool call: текст для LLM или terminal-ответ пользователю (Draft / Ask / Confirm)."""
+    content: str = ""
+    terminal: Any = None
+    list_result: list | None = None
+
 class AIService:
     def __init__(self):
-        # Настройка HTTP клиента с прокси, если он задан
-        http_client = None
-        if settings.PROXY_URL:
-            import httpx
-            logger.info(f"Using PROXY: {settings.PROXY_URL}")
-            http_client = httpx.AsyncClient(proxy=settings.PROXY_URL)
+        # Общий пул соединений (прокси, таймауты, keep-alive, HTTP/2) — app/infrastructure/http
+        self.http_client = get_http_client()
 
         self.llm_client = AsyncOpenAI(
             api_key=settings.OPENROUTER_API_KEY,
             base_url=settings.OPENROUTER_BASE_URL,
-            http_client=http_client
+            http_client=self.http_client
         )
-        self.http_client = http_client
+        self._stt_client = None
+        self._embedding_semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+
+    def _get_stt_client(self):
+        """Groq-клиент создается один раз и ходит через тот же пул соединений."""
+        if self._stt_client is None:
+            from groq import AsyncGroq
+            self._stt_client = AsyncGroq(
+                api_key=settings.GROQ_API_KEY,
+                http_client=self.http_client
+            )
+        return self._stt_client
 
     async def get_embedding(self, text: str) -> list[float]:
+        """Один вектор — частный случай get_embeddings (общие батчи, дедупликация и лимит конкурентности)."""
+        return (await self.get_embeddings([text]))[0]
+
+    async def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """
+        Векторы для списка текстов одним-несколькими запросами.
+        Одинаковые входы считаются один раз, вход режется на батчи по EMBEDDING_BATCH_SIZE,
+        батчи идут параллельно, но не больше EMBEDDING_MAX_CONCURRENCY одновременно.
+        Порядок результата совпадает с порядком texts.
+        """
+        if not texts:
+            return []
+
+        unique = list(dict.fromkeys(texts))
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        batches = [unique[i:i + batch_size] for i in range(0, len(unique), batch_size)]
+
+        async def embed_batch(batch: list[str]) -> list[list[float]]:
+            async with self._embedding_semaphore:
+                logger.info(f"LLM Embedding Request | {len(batch)} inputs | First: {batch[0][:200]}")
+                async with telemetry.track("embed", "embed", settings.EMBEDDING_MODEL) as call:
+                    response = await llm_resilience.call(
+                        "embed", settings.EMBEDDING_MODEL,
+                        lambda: self.llm_client.embeddings.create(
+                            model=settings.EMBEDDING_MODEL,
+                            input=batch
+                        )
+                    )
+                    call.set_usage(response.usage)
+            # Провайдер может вернуть data не по порядку: раскладываем по index
+            vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            if len(vectors) != len(batch):
+                # Иначе zip ниже молча сдвинет векторы на чужие тексты
+                raise ValueError(
+                    f"Embedding provider returned {len(vectors)} vectors for {len(batch)} inputs "
+                    f"(model={settings.EMBEDDING_MODEL})"
+                )
+            logger.info(f"LLM Embedding Response | {len(vectors)} vectors | Vector Size: {len(vectors[0]) if vectors else 0}")
+            return vectors
+
         try:
-            logger.info(f"LLM Embedding Request | Input: {text}")
-            response = await self.llm_client.embeddings.create(
-                model=settings.EMBEDDING_MODEL,
-                input=text
-            )
-            logger.info(f"LLM Embedding Response | Vector Size: {len(response.data[0].embedding)}")
-            return response.data[0].embedding
+            results = await asyncio.gather(*[embed_batch(batch) for batch in batches])
         except Exception as e:
             logger.error(f"Embedding failed: {e}")
             raise
 
+        by_text = dict(zip(unique, (vector for batch in results for vector in batch), strict=True))
+        return [by_text[text] for text in texts]
+
+    def defer_embedding(self, obj, text: str, task: asyncio.Task | None = None):
+        """
+        Вешает фоновый get_embedding на драфт / запрос обновления (task — уже запущенный, если есть):
+        подтверждение показывается юзеру, не дожидаясь вектора. Забирается через resolve_deferred_embedding.
+        """
+        task = task or asyncio.create_task(self.get_embedding(text))
+        # Если действие отменят, результат никто не заберет — гасим "exception was never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        obj._embedding_task = task
+        obj._embedding_text = text
+
+    async def resolve_deferred_embedding(self, obj) -> list[float] | None:
+        """Вектор, запущенный через defer_embedding (None, если задачи нет). При сбое фоновой задачи — повтор."""
+        task = getattr(obj, "_embedding_task", None)
+        if task is None:
+            return None
+        try:
+            return await task
+        except Exception as e:
+            logger.warning(f"Deferred embedding failed ({e}), retrying inline")
+            return await self.get_embedding(obj._embedding_text)
+
     async def transcribe_audio(self, file_path: str) -> str:
         """
         Транскрибация аудио через Groq (Whisper).
@@ -165,25 +258,19 @@ class AIService:
             return ""
 
         try:
-            from groq import AsyncGroq
-            import os
-            
-            # Передаем http_client с прокси, если он есть
-            client = AsyncGroq(
-                api_key=settings.GROQ_API_KEY,
-                http_client=self.http_client
-            )
+            client = self._get_stt_client()
 
             logger.info(f"STT Request | File: {file_path}")
 
             with open(file_path, "rb") as audio_file:
-                transcription = await client.audio.transcriptions.create(
-                    file=audio_file,
-                    model="whisper-large-v3",
-                    response_format="json",
-                    language="ru",
-                    temperature=0.0
-                )
+                async with telemetry.track("stt", "stt", "whisper-large-v3"), llm_resilience.guard("stt", "whisper-large-v3"):
+                    transcription = await client.audio.transcriptions.create(
+                        file=audio_file,
+                        model="whisper-large-v3",
+                        response_format="json",
+                        language="ru",
+                        temperature=0.0
+                    )
             logger.info(f"STT Response | Text: '{transcription.text}'")
             return transcription.text
         except Exception as e:
@@ -191,9 +278,38 @@ class AIService:
             logger.error(f"Error type: {type(e)}")
             return ""
 
+    async def _chat(self, site: str, user_id: int | None = None, **params):
+        """
+        Единая точка вызова chat completions: телеметрия (время, TTFB, токены, стоимость) по месту вызова.
+        site — router.stepN / rerank / extract / recall / ...; user_id по умолчанию берется из контекста (telemetry.bind_user).
+        Модель — по типу вызова (часть site до точки), см. model_router.
+        Дедлайн, брейкер и хеджирование — по тому же типу, см. llm_resilience.
+        """
+        call_type = site.split(".")[0]
+        params.setdefault("model", model_router.resolve(call_type))
+        if "openrouter" in settings.OPENROUTER_BASE_URL:
+            # Usage accounting: OpenRouter вернет фактическую стоимость в usage.cost
+            params.setdefault("extra_body", {"usage": {"include": True}})
+        async with telemetry.track("chat", site, params["model"], user_id=user_id) as call:
+            response = await llm_resilience.call(
+                call_type, params["model"],
+                lambda: self.llm_client.chat.completions.create(**params),
+                site=site
+            )
+            call.set_usage(response.usage)
+        trace_recorder.record(site, call.user_id, params["model"], params.get("messages", []), response, call.wall_ms)
+        return response
+
     def _log_llm_messages(self, messages: list):
-        """Вспомогательный метод для логирования промптов."""
-        logger.info("--- LLM PROMPT START ---")
+        """
+        Дамп промпта в DEBUG. Строка собирается лениво: при LOG_LEVEL=INFO форматирования нет вовсе.
+        Полные промпты с ответами в проде — через trace_recorder (выборка / opt-in).
+        """
+        logger.opt(lazy=True).debug("{}", lambda: self._format_llm_messages(messages))
+
+    @staticmethod
+    def _format_llm_messages(messages: list) -> str:
+        lines = ["--- LLM PROMPT START ---"]
         for i, m in enumerate(messages):
             if isinstance(m, dict):
                 role = m.get("role", "unknown")
@@ -205,32 +321,44 @@ class AIService:
             
             # Укорачиваем для логов если слишком длинно, но оставляем достаточно контекста
             snippet = (content[:500] + "...") if isinstance(content, str) and len(content) > 500 else content
-            logger.info(f"Message {i} | Role: {role} | Content: {snippet}")
-        logger.info("--- LLM PROMPT END ---")
+            lines.append(f"Message {i} | Role: {role} | Content: {snippet}")
+        lines.append("--- LLM PROMPT END ---")
+        return "\n".join(lines)
+
+    async def _complete_cached(self, kind: str, messages: list, parse, **params):
+        """
+        Детерминированный вызов LLM через кэш (llm_cache): повторный вход не ходит в сеть.
+        В кэш попадает только ответ, который успешно распарсился через parse.
+        """
+        model = model_router.resolve(kind.lower())
+        key = llm_cache.make_key(kind, model, messages, params)
+        cached = await llm_cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM {kind} Cache Hit | Key: {key[:12]}")
+            return parse(cached)
+
+        logger.info(f"LLM {kind} Request | Model: {model}")
+        self._log_llm_messages(messages)
+
+        response = await self._chat(kind.lower(), messages=messages, model=model, **params)
+        content = response.choices[0].message.content
+        logger.info(f"LLM {kind} Response | Content: {content}")
+        result = parse(content)
+        await llm_cache.set(key, content)
+        return result
 
     async def extract_contact_info(self, text: str) -> ContactExtracted:
         """
         Извлекает структурированные данные из текста.
         """
-        system_prompt = get_prompt("extractor")
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": text}
-        ]
+        messages = prompt_assembly.messages("extractor", text)
         
         try:
-            logger.info(f"LLM Extract Request | Model: {settings.LLM_MODEL}")
-            self._log_llm_messages(messages)
-            
-            response = await self.llm_client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=messages,
+            return await self._complete_cached(
+                "Extract", messages,
+                lambda content: ContactExtracted(**json.loads(content)),
                 response_format={"type": "json_object"}
             )
-            content = response.choices[0].message.content
-            logger.info(f"LLM Extract Response | Content: {content}")
-            data = json.loads(content)
-            return ContactExtracted(**data)
         except Exception as e:
             logger.error(f"Extraction failed: {e}")
             raise
@@ -239,27 +367,14 @@ class AIService:
         """
         Обновляет информацию о контакте на основе старой инфы и обновления.
         """
-        system_prompt = get_prompt("refiner")
-        user_content = f"OLD_SUMMARY:\n{old_summary}\n\nUPDATE:\n{update_text}"
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content}
-        ]
+        messages = prompt_assembly.messages("refiner", f"OLD_SUMMARY:\n{old_summary}", f"UPDATE:\n{update_text}")
         
         try:
-            logger.info(f"LLM Refine Request | Model: {settings.LLM_MODEL}")
-            self._log_llm_messages(messages)
-            
-            response = await self.llm_client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=messages,
+            return await self._complete_cached(
+                "Refine", messages,
+                lambda content: ContactExtracted(**json.loads(content)),
                 response_format={"type": "json_object"}
             )
-            content = response.choices[0].message.content
-            logger.info(f"LLM Refine Response | Content: {content}")
-            data = json.loads(content)
-            return ContactExtracted(**data)
         except Exception as e:
             logger.error(f"Refinement failed: {e}")
             # Fallback: просто используем экстрактор на новом тексте, если рефайнер упал
@@ -273,7 +388,7 @@ class AIService:
             return []
             
         # Убираем технические префиксы для LLM
-        clean_query = query.replace("org:", "").strip()
+        clean_query = re.sub(r'\b(org|role|company|interest):', '', query, flags=re.IGNORECASE).replace('"', '').strip()
         
         # Если запрос "все", "all" или очень короткий (1-2 символа), то не фильтруем.
         # Короткие запросы обычно буквенные (поиск по инициалу), LLM часто ошибается в них.
@@ -302,28 +417,18 @@ class AIService:
                 "meta": meta_dict
             })
         
-        system_prompt = (
-            "You are a relevance filter. "
-            "Your task is to analyze the user's search query and the list of candidate contacts.\n"
-            "Return a JSON object with key 'relevant_ids' containing a list of UUIDs (strings) of contacts that are relevant to the query.\n"
-            "Consider synonyms and professional context (e.g. 'гошник' is a Go/Golang developer).\n"
-            "Pay attention to '_org_context' or 'company' fields for organization membership.\n"
-            "If a contact matches loosely but is definitely not what the user asked for, exclude it.\n"
-            "If no contacts are relevant, return empty list."
+        messages = prompt_assembly.messages(
+            "reranker",
+            f"Query: {clean_query}",
+            f"Candidates: {json.dumps(candidates_list, ensure_ascii=False)}"
         )
         
-        user_content = f"Query: {clean_query}\nCandidates: {json.dumps(candidates_list, ensure_ascii=False)}"
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content}
-        ]
-        
         try:
             logger.info(f"LLM Rerank Request | Query: {query} | Candidates Count: {len(candidates)}")
             self._log_llm_messages(messages)
             
-            response = await self.llm_client.chat.completions.create(
-                model=settings.LLM_MODEL,
+            response = await self._chat(
+                "rerank",
                 messages=messages,
                 response_format={"type": "json_object"}
             )
@@ -346,77 +451,469 @@ class AIService:
         """
         Извлекает Bio и интересы пользователя из текста.
         """
-        system_prompt = (
-            "You are an expert profile analyzer. "
-            "Extract a concise professional bio and interests from the user's text. "
-            "Format the output as a short 1-2 sentence summary in Russian. "
-            "Example input: 'Я продакт менеджер, делаю стартап в крипте, ищу инвесторов' "
-            "Example output: 'Product Manager в крипто-стартапе. Интересы: инвестиции, блокчейн.'"
-        )
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": text}
-        ]
+        messages = prompt_assembly.messages("bio_extractor", text)
         
         try:
             logger.info(f"LLM Bio Request | Text: {text}")
-            self._log_llm_messages(messages)
-            
-            response = await self.llm_client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=messages
-            )
-            content = response.choices[0].message.content
-            logger.info(f"LLM Bio Response | Content: {content}")
-            return content
+            return await self._complete_cached("Bio", messages, lambda content: content)
         except Exception as e:
             logger.error(f"Bio extraction failed: {e}")
             return text  # Fallback to raw text
 
-    async def run_router_agent(self, user_text: str, user_id: int) -> Union[str, List[SearchResult], ContactCreate, ContactDraft, ContactDeleteAsk, ActionConfirmed, ActionCancelled]:
+    async def _execute_tool(self, fn_name: str, fn_args: dict, user_id: int, settings_obj: UserSettings, handles: ContactHandles, speculation: Speculation | None = None) -> ToolOutcome:
+        """
+        Выполняет один tool call агента.
+        Возвращает ToolOutcome: текст для LLM, либо terminal-объект, который прерывает цикл (Draft / Ask / Confirm).
+        handles — хэндлы контактов текущего хода (c1 -> UUID), см. tool_encoding.
+        speculation — поиск, запущенный до решения роутера (speculative_search): берется, если запрос совпал.
+        """
+        from app.services.user_service import user_service
+        from app.services.search_service import search_service
+
+        tool_result_content = "" # Строка для LLM
+        list_result = None # Список контактов для UI
+
+        if fn_name == "search_contacts":
+            # Берем расширенный набор кандидатов: отранжированный список кэшируется
+            # для кнопки "Дальше" (user-026), повторно пайплайн не запускается.
+            results = await speculation.take(fn_args["query"]) if speculation is not None else None
+            if results is None:
+                results = await search_service.search(fn_args["query"], user_id, limit=settings.SEARCH_RESULT_SET_SIZE)
+
+            # Re-ranking / Filtering
+            # Листинг (все контакты / org:Name) не фильтруем: там нечего ранжировать,
+            # а rerank по названию орги только выкидывает ее же контакты.
+            if results and not isinstance(results, SearchResultPage):
+                results = await self.rerank_contacts(fn_args["query"], results)
+
+            list_result = results # Запоминаем для UI
+
+            if results:
+                # Компактная выдача для LLM: хэндлы вместо UUID, обрезанные саммари
+                tool_result_content = (
+                    "Contacts (pass the handle, e.g. c1, as contact_id):\n"
+                    + encode_contacts(results, handles)
+                )
+                log_encoding_savings(fn_name, results, tool_result_content)
+
+                # Сохраняем в контекст БД
+                search_context = "Search Results:\n" + "\n".join(
+                    [f"ID: {r.id} | Name: {r.name} | Summary: {r.summary}" for r in results]
+                )
+                await user_service.save_chat_message(user_id, "system", f"[Context Memory] {search_context}")
+            else:
+                tool_result_content = "No contacts found."
+
+        elif fn_name == "add_contact":
+            text_to_process = fn_args["text"]
+            force_new = fn_args.get("force_new", False)
+
+            extracted = await self.extract_contact_info(text_to_process)
+
+            # --- Name Fallback (Fix for None validation error) ---
+            if not extracted.name or not extracted.name.strip():
+                # Пробуем сгенерировать имя из текста
+                words = text_to_process.split()[:5]
+                generated_name = " ".join(words)
+                if not generated_name:
+                    generated_name = "Новая заметка"
+
+                extracted.name = f"Заметка: {generated_name}..."
+            # -----------------------------------------------------
+
+            # Имя известно: проверка дублей и эмбеддинг идут параллельно
+            full_text = f"{extracted.name} {extracted.summary} {extracted.meta}"
+            embedding_task = asyncio.create_task(self.get_embedding(full_text))
+
+            # --- Disambiguation Check ---
+            if not force_new:
+                try:
+                    duplicates = await search_service.find_similar_contacts_by_name(extracted.name, user_id)
+                except BaseException:
+                    embedding_task.cancel()
+                    raise
+                # Фильтруем совсем левые совпадения, если надо, но пока верим базе
+                if duplicates:
+                    # Контакт не создаем — вектор не нужен
+                    embedding_task.cancel()
+                    dup_list_str = encode_contacts(duplicates, handles)
+                    tool_result_content = (
+                        f"WARNING: Found existing contacts with similar name '{extracted.name}':\n{dup_list_str}\n\n"
+                        "ACTION REQUIRED: Ask user if they want to UPDATE one of these (call update_contact) "
+                        "or CREATE NEW (call add_contact with force_new=True)."
+                    )
+                    # Прерываем выполнение, возвращаем инфу агенту (LLM увидит предупреждение)
+                    logger.info(f"Tool Result | {fn_name} | WARNING: Duplicates found")
+                    return ToolOutcome(tool_result_content)
+
+            contact_create = ContactCreate(
+                user_id=user_id,
+                name=extracted.name,
+                summary=extracted.summary,
+                raw_text=text_to_process,
+                meta=extracted.meta.model_dump()
+            )
+
+            logger.debug(f"[ai_service] add_contact: name='{extracted.name}', user_id={user_id}, force_new={force_new}")
+
+            if settings_obj.confirm_add:
+                # Если нужно подтверждение, мы ПРЕРЫВАЕМ цикл и возвращаем Draft.
+                # Вектор не ждем: он досчитается, пока юзер читает драфт (забирается в create_contact)
+                draft = ContactDraft(**contact_create.model_dump())
+                self.defer_embedding(draft, full_text, task=embedding_task)
+                await user_service.save_chat_message(user_id, "system", "[System] Draft created. Waiting for user confirmation via 'confirm_action' or 'cancel_action'.")
+                return ToolOutcome(terminal=draft)
+            else:
+                contact_create.embedding = await embedding_task
+                contact = await search_service.create_contact(contact_create)
+                logger.info(f"[ai_service] add_contact: Contact created successfully - id={contact.id}, name='{contact.name}'")
+                tool_result_content = f"Contact '{extracted.name}' created successfully."
+
+        elif fn_name == "confirm_action":
+            return ToolOutcome(terminal=ActionConfirmed())
+
+        elif fn_name == "cancel_action":
+            return ToolOutcome(terminal=ActionCancelled())
+
+        elif fn_name == "delete_contact":
+            contact_id = handles.resolve(fn_args.get("contact_id"))
+            logger.debug(f"[ai_service] delete_contact: contact_id={contact_id}, user_id={user_id}")
+            if settings_obj.confirm_delete:
+                # Если нужно подтверждение, ищем контакт для отображения
+                contact = await search_service.get_contact_by_id(contact_id, user_id)
+                if contact:
+                    logger.debug(f"[ai_service] delete_contact: Contact found, returning ContactDeleteAsk")
+                    await user_service.save_chat_message(user_id, "system", f"[System] Deletion requested for ID {contact_id}. Waiting for confirmation via 'confirm_action' or 'cancel_action'.")
+                    return ToolOutcome(terminal=ContactDeleteAsk(
+                        contact_id=str(contact.id),
+                        name=contact.name,
+                        summary=contact.summary
+                    ))
+                else:
+                    logger.warning(f"[ai_service] delete_contact: Contact not found or access denied")
+                    tool_result_content = "ERROR: Access Denied. Contact not found or does not belong to you."
+            else:
+                try:
+                    success = await search_service.delete_contact(contact_id, user_id)
+                    logger.info(f"[ai_service] delete_contact: success={success}")
+                    status = 'deleted' if success else 'not found'
+                    tool_result_content = f"Contact {status}."
+                except Exception as e:
+                    from app.services.search_service import AccessDenied
+                    if isinstance(e, AccessDenied):
+                        logger.warning(f"[ai_service] delete_contact: AccessDenied - {e}")
+                        tool_result_content = "ERROR: Access Denied. Contact does not belong to you."
+                    else:
+                        logger.error(f"[ai_service] delete_contact: Exception - {type(e).__name__}: {e}", exc_info=True)
+                        tool_result_content = f"ERROR: Failed to delete contact. {str(e)}"
+
+        elif fn_name == "update_contact":
+            contact_id = handles.resolve(fn_args["contact_id"])
+            new_text = fn_args["text"]
+            existing = await search_service.get_contact_by_id(contact_id, user_id)
+            if not existing:
+                tool_result_content = "Contact not found."
+            else:
+                # Используем Refiner вместо тупого Append + Extract
+                extracted = await self.refine_contact_info(
+                    old_summary=existing.summary or "",
+                    update_text=new_text
+                )
+
+                updated_raw_text = f"{existing.raw_text}\n\n[Refined Update]: {new_text}"
+                full_text = f"{extracted.name} {extracted.summary} {extracted.meta}"
+
+                updates = {
+                    "name": extracted.name,
+                    "summary": extracted.summary,
+                    "meta": extracted.meta.model_dump(),
+                    "raw_text": updated_raw_text
+                }
+
+                if settings_obj.confirm_update:
+                     await user_service.save_chat_message(user_id, "system", f"[System] Update requested for ID {contact_id}. Waiting for confirmation.")
+                     update_ask = ContactUpdateAsk(
+                         contact_id=str(existing.id),
+                         name=existing.name,
+                         old_summary=existing.summary,
+                         new_summary=extracted.summary,
+                         updates=updates
+                     )
+                     # Вектор досчитывается, пока юзер читает запрос подтверждения (search_service.apply_update_ask)
+                     self.defer_embedding(update_ask, full_text)
+                     return ToolOutcome(terminal=update_ask)
+                else:
+                    updates["embedding"] = await self.get_embedding(full_text)
+                    await search_service.update_contact(contact_id, user_id, updates)
+                    tool_result_content = f"Contact '{extracted.name}' updated."
+
+        elif fn_name == "check_subscription":
+            is_pro = await user_service.is_pro(user_id)
+            user_data = await user_service.get_user(user_id)
+
+            if is_pro and user_data.pro_until:
+                # Convert to readable format
+                expiry_str = user_data.pro_until.strftime("%d.%m.%Y %H:%M")
+                tool_result_content = f"У пользователя активна Pro подписка. Истекает: {expiry_str}"
+            elif is_pro and user_data.trial_ends_at:
+                expiry_str = user_data.trial_ends_at.strftime("%d.%m.%Y %H:%M")
+                tool_result_content = f"У пользователя активен Pro Trial (тестовый период). Истекает: {expiry_str}"
+            else:
+                tool_result_content = "У пользователя НЕТ активной Pro подписки. Предложи купить через /buy_pro."
+
+        # Логируем результат инструмента
+        logger.info(f"Tool Result | {fn_name} | Content: {tool_result_content[:200]}...")
+        return ToolOutcome(tool_result_content, list_result=list_result)
+
+    async def _run_tool_call(self, tool_call, user_id: int, settings_obj: UserSettings, handles: ContactHandles, speculation: Speculation | None = None, budget: AgentBudget | None = None) -> ToolOutcome:
+        """
+        Обертка над _execute_tool: парсинг аргументов, таймаут инструмента, ошибки -> текст для LLM.
+        AccessDenied пробрасывается: это ответ пользователю (лимиты Story 23), а не ошибка инструмента.
+        """
+        from app.services.search_service import AccessDenied
+
+        fn_name = tool_call.function.name
+        timeout = settings.TOOL_TIMEOUTS_SEC.get(fn_name, settings.TOOL_TIMEOUT_SEC)
+        if budget is not None:
+            timeout = budget.cap(timeout)
+        try:
+            fn_args = json.loads(tool_call.function.arguments or "{}")
+            return await asyncio.wait_for(self._execute_tool(fn_name, fn_args, user_id, settings_obj, handles, speculation), timeout=timeout)
+        except AccessDenied:
+            raise
+        except UnknownContactHandle as e:
+            return ToolOutcome(f"ERROR: {e}")
+        except asyncio.TimeoutError:
+            logger.error(f"Tool Timeout | {fn_name} | {timeout}s | User: {user_id}")
+            return ToolOutcome(f"ERROR: Tool '{fn_name}' timed out after {timeout:.0f}s. Tell the user and suggest trying again.")
+        except Exception as e:
+            logger.error(f"Tool Failed | {fn_name} | {type(e).__name__}: {e}", exc_info=True)
+            return ToolOutcome(f"ERROR: Tool '{fn_name}' failed. {e}")
+
+    async def _run_tool_calls(self, tool_calls: list, user_id: int, settings_obj: UserSettings, handles: ContactHandles, speculation: Speculation | None = None, budget: AgentBudget | None = None) -> list[ToolOutcome]:
+        """
+        Выполняет tool calls одного шага роутера в порядке вызовов: подряд идущие READ_ONLY_TOOLS — параллельно,
+        остальные — по одному. После terminal-исхода (Draft / Ask / Confirm) оставшиеся вызовы не выполняются:
+        в историю пишется [Tool Skipped], чтобы роутер повторил их после ответа юзера.
+        Возвращает исход на каждый вызов (для пропущенных — текст SKIPPED).
+        """
+        from app.services.user_service import user_service
+
+        outcomes: list[ToolOutcome] = []
+        i = 0
+        while i < len(tool_calls):
+            batch = [tool_calls[i]]
+            while (
+                batch[0].function.name in READ_ONLY_TOOLS
+                and i + len(batch) < len(tool_calls)
+                and tool_calls[i + len(batch)].function.name in READ_ONLY_TOOLS
+            ):
+                batch.append(tool_calls[i + len(batch)])
+            i += len(batch)
+
+            for tool_call in batch:
+                logger.info(f"Agent executing tool: {tool_call.function.name}")
+                # Сохраняем факт вызова в БД (до выполнения, в порядке вызовов)
+                tool_summary = f"[Tool Used: {tool_call.function.name}, Args: {tool_call.function.arguments}]"
+                await user_service.save_chat_message(user_id, "system", tool_summary)
+
+            tasks = [
+                asyncio.create_task(self._run_tool_call(tool_call, user_id, settings_obj, handles, speculation, budget))
+                for tool_call in batch
+            ]
+            try:
+                batch_outcomes = await asyncio.gather(*tasks)
+            except BaseException:
+                # AccessDenied (или отмена хода): соседние вызовы не должны доделываться в фоне
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            outcomes.extend(batch_outcomes)
+
+            if any(outcome.terminal is not None for outcome in batch_outcomes):
+                for tool_call in tool_calls[i:]:
+                    logger.info(f"Agent skipped tool after terminal outcome: {tool_call.function.name}")
+                    await user_service.save_chat_message(
+                        user_id, "system",
+                        f"[Tool Skipped: {tool_call.function.name}, Args: {tool_call.function.arguments}] "
+                        "Not executed: waiting for the user's answer to the previous action. Call it again after that."
+                    )
+                    outcomes.append(ToolOutcome(
+                        f"SKIPPED: '{tool_call.function.name}' was not executed, an earlier call in this step is waiting for the user."
+                    ))
+                break
+        return outcomes
+
+    async def _stream_router_step(self, messages: list, streamer, site: str = "router.stream") -> ChatCompletionMessage:
+        """
+        Шаг роутера через streaming API. Текст по мере генерации уходит в streamer
+        (app/utils/message_streamer.py), tool_calls собираются из дельт.
+        Возвращает такое же сообщение, как обычный (не потоковый) вызов.
+        """
+        content = ""
+        calls: dict[int, dict] = {}
+        model = model_router.resolve("router")
+        # Дедлайн "router" — на весь стрим, а не только до первого чанка
+        # Usage accounting OpenRouter — как в _chat: стоимость приходит в usage последнего чанка
+        extra_body = {"usage": {"include": True}} if "openrouter" in settings.OPENROUTER_BASE_URL else None
+        async with telemetry.track("chat", site, model) as telemetry_call, llm_resilience.guard("router", model):
+            stream = await self.llm_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                tools=TOOLS_SCHEMA,
+                tool_choice="auto",
+                stream=True,
+                stream_options={"include_usage": True},
+                extra_body=extra_body
+            )
+
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    telemetry_call.set_usage(chunk.usage)
+                    logger.info(f"LLM Router Usage | prompt={chunk.usage.prompt_tokens} completion={chunk.usage.completion_tokens}")
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.tool_calls:
+                    for tc in delta.tool_calls:
+                        call = calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                        if tc.id:
+                            call["id"] = tc.id
+                        if tc.function and tc.function.name:
+                            call["name"] += tc.function.name
+                        if tc.function and tc.function.arguments:
+                            call["arguments"] += tc.function.arguments
+                if delta.content:
+                    content += delta.content
+                    # Пока есть шанс, что это шаг с инструментами, пользователю ничего не показываем
+                    if not calls:
+                        await streamer.push(content)
+
+        if calls:
+            # Модель начала с текста, а потом ушла в инструменты: недописанный ответ убираем
+            await streamer.abort()
+
+        tool_calls = [
+            ChatCompletionMessageToolCall(
+                id=call["id"], type="function",
+                function={"name": call["name"], "arguments": call["arguments"]}
+            )
+            for _, call in sorted(calls.items())
+        ]
+        msg = ChatCompletionMessage(role="assistant", content=content or None, tool_calls=tool_calls or None)
+        trace_recorder.record(site, telemetry_call.user_id, model, messages, msg, telemetry_call.wall_ms)
+        return msg
+
+    async def _finish_over_budget(self, messages: list, user_id: int, budget: AgentBudget, step: int, last_tool_list_result, streamer):
+        """
+        Бюджет хода исчерпан: инструменты больше не вызываются.
+        Есть список контактов с прошлых шагов — отдаем его, иначе короткий ответ без инструментов в резерв бюджета.
+        """
+        from app.services.user_service import user_service
+
+        if streamer is not None:
+            # Стрим шага мог оборваться посередине
+            await streamer.abort()
+        if last_tool_list_result:
+            budget.record("partial", step)
+            return last_tool_list_result
+
+        messages.append({
+            "role": "system",
+            "content": (
+                "TIME LIMIT: the time for this request is up. Do NOT call tools.\n"
+                "Briefly tell the user what you managed to do or find so far; "
+                "if nothing yet, say you did not make it in time and suggest narrowing the request."
+            )
+        })
+        logger.info(f"LLM Router Final Request (budget) | User: {user_id}")
+        try:
+            async with asyncio.timeout(max(budget.left(), 0.0)):
+                final_response = await self._chat(
+                    "router.final",
+                    messages=messages,
+                    tools=TOOLS_SCHEMA,
+                    tool_choice="none"
+                )
+        except TimeoutError:
+            budget.record("timeout", step)
+            return "⏳ Не успел за отведенное время. Попробуй сузить запрос или повторить."
+
+        budget.record("answered", step)
+        final_content = final_response.choices[0].message.content
+        if final_content:
+            await user_service.save_chat_message(user_id, "assistant", final_content)
+            return final_content
+        return "⏳ Не успел за отведенное время. Попробуй сузить запрос или повторить."
+
+    async def run_router_agent(self, user_text: str, user_id: int, streamer=None) -> Union[str, List[SearchResult], ContactCreate, ContactDraft, ContactDeleteAsk, ActionConfirmed, ActionCancelled]:
         """
         Агент-маршрутизатор с памятью и поддержкой многошаговых вызовов (Loop).
+        streamer (MessageStreamer) — если передан, финальный текстовый ответ печатается в чат по мере генерации;
+        после возврата проверяйте streamer.delivered, чтобы не отправить текст второй раз.
         """
         # ЛОКАЛЬНЫЙ ИМПОРТ
         from app.services.user_service import user_service
-        from app.services.search_service import search_service
         
+        started = time.monotonic()
         user = await user_service.get_user(user_id)
         settings_obj = user.settings if user and user.settings else UserSettings()
         
         # 1. Получаем историю
         history = await user_service.get_chat_history(user_id)
         
-        system_prompt = get_prompt("router")
+        # Префикс (системный промпт + tools) байт в байт одинаков для всех юзеров и шагов — кэшируется провайдером
+        system_prompt = prompt_assembly.system_text("router")
         
-        # 2. Формируем начальный контекст
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(history)
-        messages.append({"role": "user", "content": user_text})
+        # 2. Формируем начальный контекст в пределах бюджета токенов
+        summary = await summary_service.get_summary(user_id)
+        messages, context_stats = context_builder.build(system_prompt, history, user_text, summary=summary)
+        logger.info(f"Router Context | User: {user_id} | {context_stats}")
 
         # 3. Сохраняем сообщение Юзера в историю (один раз)
         await user_service.save_chat_message(user_id, "user", user_text)
 
         max_steps = 10
+        handles = ContactHandles() # c1, c2, ... вместо UUID в результатах инструментов этого хода
         step_count = 0
         last_tool_list_result = None # Здесь будем хранить список контактов, если он был получен
+        # Бюджет времени на весь ход (по тарифу), отсчет — с начала обработки реплики
+        budget = agent_budgets.start(user_service.plan_of(user), started=started)
+        # Реплика похожа на поиск — ищем, пока роутер думает над первым шагом
+        speculation = speculative_search.start(user_text, user_id)
 
         try:
             while step_count < max_steps:
                 step_count += 1
+
+                # Бюджет хода на исходе: инструменты больше не вызываем, отдаем что есть
+                if budget.exhausted():
+                    return await self._finish_over_budget(messages, user_id, budget, step_count, last_tool_list_result, streamer)
                 
                 # Запрос к LLM
-                logger.info(f"LLM Router Request | Step {step_count} | User: {user_id}")
+                logger.info(f"LLM Router Request | Step {step_count} | User: {user_id} | ~{prompt_tokens(messages)} prompt tokens")
                 self._log_llm_messages(messages)
                 
-                response = await self.llm_client.chat.completions.create(
-                    model=settings.LLM_MODEL,
-                    messages=messages,
-                    tools=TOOLS_SCHEMA,
-                    tool_choice="auto"
-                )
-                
-                msg = response.choices[0].message
+                try:
+                    # Шаг не залезает в резерв бюджета на ответ
+                    async with asyncio.timeout(budget.step_window()):
+                        if streamer is not None:
+                            msg = await self._stream_router_step(messages, streamer, site=f"router.step{step_count}")
+                        else:
+                            response = await self._chat(
+                                f"router.step{step_count}",
+                                messages=messages,
+                                tools=TOOLS_SCHEMA,
+                                tool_choice="auto"
+                            )
+                            msg = response.choices[0].message
+                            if response.usage:
+                                logger.info(f"LLM Router Usage | Step {step_count} | prompt={response.usage.prompt_tokens} completion={response.usage.completion_tokens}")
+                except TimeoutError:
+                    if not budget.exhausted():
+                        raise  # Дедлайн самого вызова (llm_resilience), а не бюджета хода
+                    return await self._finish_over_budget(messages, user_id, budget, step_count, last_tool_list_result, streamer)
                 messages.append(msg) # Добавляем ответ ассистента в контекст текущей сессии
                 
                 # Логируем ответ
@@ -447,213 +944,47 @@ class AIService:
                     if last_tool_list_result and isinstance(last_tool_list_result, list) and len(last_tool_list_result) > 0:
                         if not final_text or len(final_text) < 100:
                             logger.info("Using last_tool_list_result instead of short final_text")
+                            if streamer is not None:
+                                await streamer.abort()
                             return last_tool_list_result
-                        
-                    return final_text
 
-                # Если есть вызов инструментов
-                tool_call = msg.tool_calls[0]
-                fn_name = tool_call.function.name
-                fn_args = json.loads(tool_call.function.arguments)
-                
-                logger.info(f"Agent executing tool: {fn_name}")
-                
-                # Сохраняем факт вызова в БД
-                tool_summary = f"[Tool Used: {fn_name}, Args: {json.dumps(fn_args, ensure_ascii=False)}]"
-                await user_service.save_chat_message(user_id, "system", tool_summary)
-
-                # Выполняем инструмент
-                tool_result_content = "" # Строка для LLM
-                execution_result = None # Объект для логики
-
-                if fn_name == "search_contacts":
-                    results = await search_service.search(fn_args["query"], user_id)
-                    
-                    # Re-ranking / Filtering
-                    if results:
-                        results = await self.rerank_contacts(fn_args["query"], results)
-
-                    execution_result = results
-                    last_tool_list_result = results # Запоминаем для UI
-                    
-                    if results:
-                        # Формируем JSON для LLM
-                        tool_result_content = json.dumps([
-                            {"id": str(r.id), "name": r.name, "summary": r.summary} 
-                            for r in results
-                        ], ensure_ascii=False)
-                        
-                        # Сохраняем в контекст БД
-                        search_context = "Search Results:\n" + "\n".join(
-                            [f"ID: {r.id} | Name: {r.name} | Summary: {r.summary}" for r in results]
-                        )
-                        await user_service.save_chat_message(user_id, "system", f"[Context Memory] {search_context}")
-                    else:
-                        tool_result_content = "No contacts found."
-                
-                elif fn_name == "add_contact":
-                    text_to_process = fn_args["text"]
-                    force_new = fn_args.get("force_new", False)
-                    
-                    extracted = await self.extract_contact_info(text_to_process)
-
-                    # --- Name Fallback (Fix for None validation error) ---
-                    if not extracted.name or not extracted.name.strip():
-                        # Пробуем сгенерировать имя из текста
-                        words = text_to_process.split()[:5]
-                        generated_name = " ".join(words)
-                        if not generated_name:
-                            generated_name = "Новая заметка"
-                        
-                        extracted.name = f"Заметка: {generated_name}..."
-                    # -----------------------------------------------------
-                    
-                    # --- Disambiguation Check ---
-                    if not force_new:
-                        duplicates = await search_service.find_similar_contacts_by_name(extracted.name, user_id)
-                        # Фильтруем совсем левые совпадения, если надо, но пока верим базе
-                        if duplicates:
-                            dup_list_str = "\n".join([f"- ID: {d.id} | Name: {d.name} | Summary: {d.summary}" for d in duplicates])
-                            tool_result_content = (
-                                f"WARNING: Found existing contacts with similar name '{extracted.name}':\n{dup_list_str}\n\n"
-                                "ACTION REQUIRED: Ask user if they want to UPDATE one of these (call update_contact) "
-                                "or CREATE NEW (call add_contact with force_new=True)."
-                            )
-                            # Прерываем выполнение, возвращаем инфу агенту
-                            messages.append({
-                                "role": "tool",
-                                "tool_call_id": tool_call.id,
-                                "content": tool_result_content
-                            })
-                            logger.info(f"Tool Result | {fn_name} | WARNING: Duplicates found")
-                            continue # Переход к следующему шагу цикла (LLM увидит предупреждение)
-
-                    full_text = f"{extracted.name} {extracted.summary} {extracted.meta}"
-                    embedding = await self.get_embedding(full_text)
-                    
-                    contact_create = ContactCreate(
-                        user_id=user_id,
-                        name=extracted.name,
-                        summary=extracted.summary,
-                        raw_text=text_to_process,
-                        meta=extracted.meta.model_dump(),
-                        embedding=embedding
-                    )
-                    
-                    logger.debug(f"[ai_service] add_contact: name='{extracted.name}', user_id={user_id}, force_new={force_new}")
-                    
-                    if settings_obj.confirm_add:
-                        # Если нужно подтверждение, мы ПРЕРЫВАЕМ цикл и возвращаем Draft
-                        await user_service.save_chat_message(user_id, "system", "[System] Draft created. Waiting for user confirmation via 'confirm_action' or 'cancel_action'.")
-                        return ContactDraft(**contact_create.model_dump())
-                    else:
-                        contact = await search_service.create_contact(contact_create)
-                        logger.info(f"[ai_service] add_contact: Contact created successfully - id={contact.id}, name='{contact.name}'")
-                        tool_result_content = f"Contact '{extracted.name}' created successfully."
-                        execution_result = contact_create
+                    if streamer is not None:
+                        await streamer.finish(final_text)
+                    return final_text
 
-                elif fn_name == "confirm_action":
-                    return ActionConfirmed()
-                
-                elif fn_name == "cancel_action":
-                    return ActionCancelled()
-
-                elif fn_name == "delete_contact":
-                    contact_id = fn_args.get("contact_id")
-                    logger.debug(f"[ai_service] delete_contact: contact_id={contact_id}, user_id={user_id}")
-                    if settings_obj.confirm_delete:
-                        # Если нужно подтверждение, ищем контакт для отображения
-                        contact = await search_service.get_contact_by_id(contact_id, user_id)
-                        if contact:
-                            logger.debug(f"[ai_service] delete_contact: Contact found, returning ContactDeleteAsk")
-                            await user_service.save_chat_message(user_id, "system", f"[System] Deletion requested for ID {contact_id}. Waiting for confirmation via 'confirm_action' or 'cancel_action'.")
-                            return ContactDeleteAsk(
-                                contact_id=str(contact.id),
-                                name=contact.name,
-                                summary=contact.summary
-                            )
-                        else:
-                            logger.warning(f"[ai_service] delete_contact: Contact not found or access denied")
-                            tool_result_content = "ERROR: Access Denied. Contact not found or does not belong to you."
-                    else:
-                        try:
-                            success = await search_service.delete_contact(contact_id, user_id)
-                            logger.info(f"[ai_service] delete_contact: success={success}")
-                            status = 'deleted' if success else 'not found'
-                            tool_result_content = f"Contact {status}."
-                        except Exception as e:
-                            from app.services.search_service import AccessDenied
-                            if isinstance(e, AccessDenied):
-                                logger.warning(f"[ai_service] delete_contact: AccessDenied - {e}")
-                                tool_result_content = "ERROR: Access Denied. Contact does not belong to you."
-                            else:
-                                logger.error(f"[ai_service] delete_contact: Exception - {type(e).__name__}: {e}", exc_info=True)
-                                tool_result_content = f"ERROR: Failed to delete contact. {str(e)}"
-
-                elif fn_name == "update_contact":
-                    contact_id = fn_args["contact_id"]
-                    new_text = fn_args["text"]
-                    existing = await search_service.get_contact_by_id(contact_id, user_id)
-                    if not existing:
-                        tool_result_content = "Contact not found."
-                    else:
-                        # Используем Refiner вместо тупого Append + Extract
-                        extracted = await self.refine_contact_info(
-                            old_summary=existing.summary or "",
-                            update_text=new_text
-                        )
-                        
-                        updated_raw_text = f"{existing.raw_text}\n\n[Refined Update]: {new_text}"
-                        full_text = f"{extracted.name} {extracted.summary} {extracted.meta}"
-                        embedding = await self.get_embedding(full_text)
-                        
-                        updates = {
-                            "name": extracted.name,
-                            "summary": extracted.summary,
-                            "meta": extracted.meta.model_dump(),
-                            "raw_text": updated_raw_text,
-                            "embedding": embedding
-                        }
-                        
-                        if settings_obj.confirm_update:
-                             await user_service.save_chat_message(user_id, "system", f"[System] Update requested for ID {contact_id}. Waiting for confirmation.")
-                             return ContactUpdateAsk(
-                                 contact_id=str(existing.id),
-                                 name=existing.name,
-                                 old_summary=existing.summary,
-                                 new_summary=extracted.summary,
-                                 updates=updates
-                             )
-                        else:
-                            await search_service.update_contact(contact_id, user_id, updates)
-                            tool_result_content = f"Contact '{extracted.name}' updated."
+                # Если есть вызовы инструментов — выполняем ВСЕ (read-only параллельно, остальные по одному)
+                # (раньше брался только tool_calls[0], и второй поиск стоил еще одного шага LLM)
+                outcomes = await self._run_tool_calls(msg.tool_calls, user_id, settings_obj, handles, speculation, budget)
 
-                elif fn_name == "check_subscription":
-                    is_pro = await user_service.is_pro(user_id)
-                    user_data = await user_service.get_user(user_id)
-                    
-                    if is_pro and user_data.pro_until:
-                        # Convert to readable format
-                        expiry_str = user_data.pro_until.strftime("%d.%m.%Y %H:%M")
-                        tool_result_content = f"У пользователя активна Pro подписка. Истекает: {expiry_str}"
-                    elif is_pro and user_data.trial_ends_at:
-                        expiry_str = user_data.trial_ends_at.strftime("%d.%m.%Y %H:%M")
-                        tool_result_content = f"У пользователя активен Pro Trial (тестовый период). Истекает: {expiry_str}"
-                    else:
-                        tool_result_content = "У пользователя НЕТ активной Pro подписки. Предложи купить через /buy_pro."
+                # Draft / Ask / Confirm прерывают цикл (после него остальные вызовы шага пропущены)
+                for outcome in outcomes:
+                    if outcome.terminal is not None:
+                        return outcome.terminal
 
-                # Логируем результат инструмента
-                logger.info(f"Tool Result | {fn_name} | Content: {tool_result_content[:200]}...")
+                # Несколько поисков за шаг: для UI объединяем списки без дублей
+                step_lists = [o.list_result for o in outcomes if o.list_result is not None]
+                if len(step_lists) == 1:
+                    last_tool_list_result = step_lists[0]
+                elif step_lists:
+                    seen_ids = set()
+                    last_tool_list_result = []
+                    for res in (r for lst in step_lists for r in lst):
+                        if res.id not in seen_ids:
+                            seen_ids.add(res.id)
+                            last_tool_list_result.append(res)
 
-                # Добавляем результат инструмента в messages для следующего шага LLM
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": tool_result_content
-                })
+                # Результаты ВСЕХ инструментов добавляем в messages до следующего шага LLM
+                for tool_call, outcome in zip(msg.tool_calls, outcomes):
+                    messages.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call.id,
+                        "content": outcome.content
+                    })
 
             # --- Retry / Final Attempt Logic after Max Steps ---
             logger.warning(f"Agent reached MAX STEPS ({max_steps}) for user {user_id}")
+            if budget.exhausted():
+                return await self._finish_over_budget(messages, user_id, budget, step_count, last_tool_list_result, streamer)
             
             # Добавляем системное сообщение с требованием завершить и объясниться
             messages.append({
@@ -670,11 +1001,22 @@ class AIService:
             logger.info(f"LLM Router Final Request | User: {user_id}")
             self._log_llm_messages(messages)
             
-            final_response = await self.llm_client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=messages,
-                # tools=None, # Не передаем инструменты, чтобы он не пытался их вызвать
-            )
+            try:
+                async with asyncio.timeout(max(budget.left(), 0.0)):
+                    final_response = await self._chat(
+                        "router.final",
+                        messages=messages,
+                        # Tools передаем, чтобы не ломать кэшируемый префикс, но вызывать их запрещаем
+                        tools=TOOLS_SCHEMA,
+                        tool_choice="none"
+                    )
+            except TimeoutError:
+                # Бюджет кончился на финальном ответе: как в _finish_over_budget, но второй запрос уже не влезет
+                if last_tool_list_result:
+                    budget.record("partial", step_count)
+                    return last_tool_list_result
+                budget.record("timeout", step_count)
+                return "⏳ Не успел за отведенное время. Попробуй сузить запрос или повторить."
             
             final_content = final_response.choices[0].message.content
             logger.info(f"LLM Router Final Response | Content: {final_content}")
@@ -689,7 +1031,11 @@ class AIService:
             if isinstance(e, AccessDenied):
                 logger.warning(f"Access Denied during agent execution: {e}")
                 return str(e)
-            
+
+            if streamer is not None:
+                # Стрим мог оборваться посередине ответа (например, по дедлайну)
+                await streamer.abort()
+
             error_type = type(e).__name__
             error_msg = str(e)
             
@@ -699,11 +1045,16 @@ class AIService:
                 f"Type: {error_type} | "
                 f"Message: {error_msg} | "
                 f"User: {user_id} | "
-                f"Model: {settings.LLM_MODEL} | "
+                f"Model: {model_router.primary('router')} | "
                 f"Has Proxy: {bool(settings.PROXY_URL)} | "
                 f"Has API Key: {bool(settings.OPENROUTER_API_KEY)}",
                 exc_info=True
             )
+            if isinstance(e, (TimeoutError, CircuitOpenError)):
+                return "Модель сейчас не отвечает, попробуй еще раз через минуту."
             return "Произошла ошибка (Agent Error)."
+        finally:
+            if speculation is not None:
+                speculation.discard()
 
 ai_service = AIService()
@@ -0,0 +1,152 @@
+import math
+import re
+from loguru import logger
+from app.config import settings
+
+# Служебные оверхеды формата чата (role, разделители) на одно сообщение
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_SEARCH_MEMORY_PREFIX = "[Context Memory] Search Results:"
+_TOOL_USED_RE = re.compile(r"^\[Tool Used: (?P<name>[^,\]]+), Args: (?P<args>.*)\]$", re.DOTALL)
+_SEARCH_ROW_RE = re.compile(r"^ID: (?P<id>\S+) \| Name: (?P<name>.*?) \| Summary: .*$")
+
+
+def estimate_tokens(text: str | None) -> int:
+    """
+    Локальная оценка числа токенов без токенайзера.
+    Латиница/цифры — ~4 символа на токен, кириллица и прочий юникод — ~2.5 (BPE режет ее мельче).
+    Погрешность ~10-15%, для бюджета контекста этого достаточно.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / 4 + other_chars / 2.5)
+
+
+def message_tokens(message) -> int:
+    if isinstance(message, dict):
+        content = message.get("content")
+        tool_calls = message.get("tool_calls")
+    else:
+        content = getattr(message, "content", None)
+        tool_calls = getattr(message, "tool_calls", None)
+
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content if isinstance(content, str) else None)
+    for tc in tool_calls or []:
+        fn = tc["function"] if isinstance(tc, dict) else tc.function
+        name = fn["name"] if isinstance(fn, dict) else fn.name
+        arguments = fn["arguments"] if isinstance(fn, dict) else fn.arguments
+        tokens += estimate_tokens(name) + estimate_tokens(arguments)
+    return tokens
+
+
+def prompt_tokens(messages: list) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Грубо переводим токены в символы по средней плотности текста и режем с запасом
+    ratio = len(text) / max(1, estimate_tokens(text))
+    return text[:max(0, int(max_tokens * ratio) - 1)].rstrip() + "…"
+
+
+class ContextBuilder:
+    """
+    Собирает контекст Router-агента в пределах бюджета токенов.
+
+    История из chat_history идет от новых к старым, пока влезает в budget_tokens.
+    Если вся история в бюджет не влезает, служебные system-строки сжимаются (от старых к новым),
+    пока не влезет; влезает — идут как есть:
+    - "[Context Memory] Search Results:" — остаются только ID и имена (саммари уже были в ответе);
+    - "[Tool Used: ..., Args: {...}]" — аргументы обрезаются;
+    - прочие длинные system-строки — обрезаются до max_system_tokens.
+    """
+
+    def __init__(self, budget_tokens: int = 3000, max_system_tokens: int = 300):
+        self.budget_tokens = budget_tokens
+        self.max_system_tokens = max_system_tokens
+
+    def compact_system_row(self, content: str) -> str:
+        if content.startswith(_SEARCH_MEMORY_PREFIX):
+            names = []
+            for line in content.splitlines()[1:]:
+                match = _SEARCH_ROW_RE.match(line)
+                if match:
+                    names.append(f"{match['id']} {match['name']}")
+            compact = f"{_SEARCH_MEMORY_PREFIX} " + "; ".join(names)
+            return _truncate(compact, self.max_system_tokens)
+
+        match = _TOOL_USED_RE.match(content)
+        if match:
+            args = _truncate(match["args"], self.max_system_tokens // 2)
+            return f"[Tool Used: {match['name']}, Args: {args}]"
+
+        return _truncate(content, self.max_system_tokens)
+
+    def build(self, system_prompt: str, history: list[dict], user_text: str, summary: str | None = None) -> tuple[list[dict], dict]:
+        """
+        Возвращает (messages, stats). history — в хронологическом порядке (как отдает get_chat_history).
+        Системный промпт и текущая реплика юзера попадают всегда, бюджет — на резюме старой истории
+        (summary_service) и сами сообщения.
+        """
+        summary_message = None
+        used = 0
+        if summary:
+            summary_message = {"role": "system", "content": f"[Conversation Summary] {_truncate(summary, self.budget_tokens // 3)}"}
+            used += message_tokens(summary_message)
+
+        rows = [{"role": item["role"], "content": item.get("content") or ""} for item in history]
+        costs = [MESSAGE_OVERHEAD_TOKENS + estimate_tokens(row["content"]) for row in rows]
+        total = used + sum(costs)
+
+        # Сжимаем system-строки только при переполнении и начиная со старых:
+        # свежие результаты поиска с саммари нужны для уточняющих вопросов ("а чем занимается второй?")
+        compacted = 0
+        for i, row in enumerate(rows):
+            if total <= self.budget_tokens:
+                break
+            if row["role"] != "system":
+                continue
+            compact = self.compact_system_row(row["content"])
+            if compact != row["content"]:
+                compacted += 1
+                row["content"] = compact
+                cost = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(compact)
+                total -= costs[i] - cost
+                costs[i] = cost
+
+        # Все еще не влезает — отбрасываем самые старые строки
+        selected = []
+        for row, cost in zip(reversed(rows), reversed(costs)):
+            if used + cost > self.budget_tokens:
+                break
+            selected.append(row)
+            used += cost
+        selected.reverse()
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary_message:
+            messages.append(summary_message)
+        messages.extend(selected)
+        messages.append({"role": "user", "content": user_text})
+
+        stats = {
+            "history_rows": len(history),
+            "history_used": len(selected),
+            "history_compacted": compacted,
+            "history_tokens": used,
+            "summary": bool(summary_message),
+            "prompt_tokens": prompt_tokens(messages),
+        }
+        if len(selected) < len(history):
+            logger.debug(f"Context budget: dropped {len(history) - len(selected)} oldest history rows")
+        return messages, stats
+
+
+context_builder = ContextBuilder(
+    budget_tokens=settings.CONTEXT_TOKEN_BUDGET,
+    max_system_tokens=settings.CONTEXT_SYSTEM_ROW_MAX_TOKENS
+)
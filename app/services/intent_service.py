@@ -0,0 +1,146 @@
+import re
+from typing import Literal
+
+Intent = Literal["confirm", "cancel"]
+
+# Нейтральные слова-подтверждения (после нормализации: нижний регистр, ё -> е, без пунктуации и эмодзи)
+CONFIRM_WORDS = {
+    "да", "ага", "угу", "ок", "окей", "ok", "okay", "yes", "yep", "y", "+", "👍",
+    "давай", "го", "конечно", "верно", "подтверждаю", "подтверди", "подтвердить",
+    "правильно", "отлично", "норм", "годится", "можно", "согласен", "согласна",
+}
+
+# Глаголы действия: подтверждают только "свое" ожидающее действие (pending_actions[...]["type"]).
+# "удали" на драфт добавления — не подтверждение, а что-то другое: решает LLM
+ACTION_WORDS = {
+    "add": {"сохрани", "сохраняй", "сохранить", "сохраняем", "записывай", "запиши", "записать"},
+    "del": {"удаляй", "удали", "удалить"},
+    "update": {"обновляй", "обнови", "обновить", "меняй", "поменяй"},
+}
+
+# Слова-отмены
+CANCEL_WORDS = {
+    "нет", "неа", "no", "nope", "n", "-", "👎",
+    "отмена", "отмени", "отменить", "отменяй", "стоп", "stop", "cancel",
+    "забудь", "забей", "неважно", "передумал", "передумала",
+}
+
+# Нейтральные слова, которые не меняют смысл короткого ответа ("да, пожалуйста", "нет, спасибо").
+# После "не" не выбрасываются: "не так", "не все" — это правка, а не отмена
+FILLER_WORDS = {"пожалуйста", "плиз", "спасибо", "все", "так", "уже", "его", "ее", "это", "контакт", "тогда"}
+
+# Фразы целиком (многословные отмены, где отдельные слова неоднозначны)
+CANCEL_PHRASES = {"не надо", "не нужно", "не сохраняй", "не удаляй", "не записывай", "не надо сохранять", "не стоит"}
+CONFIRM_PHRASES = {"да давай", "все верно", "все так", "так и есть"}
+
+# Маркеры уточнения: "да, но поменяй компанию" — это правка, ее разбирает LLM
+CLARIFY_WORDS = {"но", "а", "только", "кроме", "еще", "добавь", "измени", "исправь", "и"}
+
+MAX_TOKENS = 4
+
+_PUNCT_RE = re.compile(r"[^\w\s+\-👍👎]", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+
+# Реплики-поиски для спекулятивного поиска (после нормализации): "найди крипту", "кто у меня есть из крипты"
+_SEARCH_RE = re.compile(
+    r"^(?:найди|найти|поищи|покажи|ищу|кто у меня(?: есть)?|есть (?:ли )?(?:у меня )?кто(?:нибудь|-нибудь|-то)?)"
+    r"(?: (?:мне|плиз|пожалуйста|кого-нибудь|кого-то|кого|всех|из|среди|по))*"
+    r" (?P<query>.+)$"
+)
+# Хвост, который роутер в запрос не переносит
+_SEARCH_TAIL_RE = re.compile(r"(?: (?:плиз|пожалуйста|есть|у меня))+$")
+# "все", "всех контактов" — листинг, роутер отдает его как "*"
+LISTING_WORDS = {"все", "всех", "все контакты", "всех контактов", "контакты"}
+SEARCH_MAX_TOKENS = 5
+
+
+class IntentService:
+    """
+    Локальный fast-path для ответов на ожидающее действие (Draft / удаление / обновление).
+
+    "да", "ок", "сохрани", "нет", "отмена" раньше шли через полный вызов Router LLM
+    (с загрузкой истории и юзера) ради одного confirm_action / cancel_action.
+    Здесь — нормализация + словарь + пара правил, без сети. Все неоднозначное
+    (длинный текст, уточнения, смешанные сигналы) возвращает None и уходит в LLM.
+    """
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = text.lower().replace("ё", "е")
+        text = _PUNCT_RE.sub(" ", text)
+        return _SPACE_RE.sub(" ", text).strip()
+
+    def classify(self, text: str | None, action: str | None = None) -> Intent | None:
+        """
+        action — тип ожидающего действия ("add" / "del" / "update"): глаголы действия
+        засчитываются как подтверждение только для него, чужой глагол — None (решает LLM).
+        """
+        if not text:
+            return None
+
+        confirm_words = CONFIRM_WORDS | ACTION_WORDS.get(action, set())
+
+        norm = self.normalize(text)
+        if not norm:
+            return None
+
+        tokens = norm.split(" ")
+        # Глагол чужого действия ("удали" / "не удаляй" на драфт добавления) — не про ожидающее действие
+        foreign = set().union(*(words for kind, words in ACTION_WORDS.items() if kind != action))
+        if foreign & set(tokens):
+            return None
+
+        if norm in CANCEL_PHRASES:
+            return "cancel"
+        if norm in CONFIRM_PHRASES:
+            return "confirm"
+
+        if len(tokens) > MAX_TOKENS:
+            return None
+        if any(t in CLARIFY_WORDS for t in tokens):
+            return None
+
+        if "не" in tokens:
+            # "нет, не сохраняй", "нет, не надо": отмена, только если после "не" — глагол своего действия
+            # или хвост фразы-отмены. Все остальное ("не так", "не все", "не Петров") — правка, решает LLM
+            neg = tokens.index("не")
+            head = [t for t in tokens[:neg] if t not in FILLER_WORDS]
+            negated = tokens[neg + 1:]
+            if not all(t in CANCEL_WORDS for t in head) or not negated:
+                return None
+            if all(t in confirm_words for t in negated) or " ".join(tokens[neg:]) in CANCEL_PHRASES:
+                return "cancel"
+            return None
+
+        meaningful = [t for t in tokens if t not in FILLER_WORDS]
+        if not meaningful:
+            return None
+
+        if all(t in CANCEL_WORDS for t in meaningful):
+            return "cancel"
+
+        if all(t in confirm_words for t in meaningful):
+            return "confirm"
+
+        # "да нет наверное", "ок стоп" и прочее смешанное — пусть решает LLM
+        return None
+
+    def search_query(self, text: str | None) -> str | None:
+        """
+        Поисковый запрос из реплики вида "найди X" / "кто у меня есть из X" (X — не длиннее SEARCH_MAX_TOKENS слов).
+        Это только догадка для спекулятивного поиска: что искать на самом деле, решает роутер.
+        """
+        if not text:
+            return None
+
+        match = _SEARCH_RE.match(self.normalize(text))
+        if not match:
+            return None
+
+        query = _SEARCH_TAIL_RE.sub("", " " + match["query"]).strip()
+        if not query or query in LISTING_WORDS or len(query.split(" ")) > SEARCH_MAX_TOKENS:
+            return None
+        return query
+
+
+intent_service = IntentService()
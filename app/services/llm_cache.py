@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from loguru import logger
+from app.config import settings
+
+class LLMCache:
+    """
+    Content-addressed кэш ответов LLM для "чистых" вызовов (extract / refine / bio).
+    Ключ = sha256(вид вызова + модель + версия промпта + вход), где версия промпта — хэш
+    системного промпта: правка prompts.yaml автоматически инвалидирует старые ответы.
+
+    Два уровня: ограниченный LRU в памяти и (опционально) файлы на диске,
+    чтобы кэш переживал рестарт бота.
+    """
+
+    def __init__(self, max_items: int = 512, ttl_sec: int = 604800, disk_dir: str | None = None, enabled: bool = True):
+        self.enabled = enabled
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(kind: str, model: str, messages: list[dict], params: dict | None = None) -> str:
+        system = "\n".join(m["content"] for m in messages if m.get("role") == "system")
+        payload = [m for m in messages if m.get("role") != "system"]
+        prompt_version = hashlib.sha256(system.encode("utf-8")).hexdigest()[:16]
+        input_hash = hashlib.sha256(
+            json.dumps([payload, params or {}], ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        return hashlib.sha256(f"{kind}|{model}|{prompt_version}|{input_hash}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> tuple[float, str] | None:
+        path = self._disk_path(key)
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data["created_at"], data["value"]
+
+    def _write_disk(self, key: str, created_at: float, value: str):
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"created_at": created_at, "value": value}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
+    def _remember(self, key: str, created_at: float, value: str):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+
+        entry = self._memory.get(key)
+        if entry is None and self.disk_dir:
+            try:
+                entry = await asyncio.to_thread(self._read_disk, key)
+            except Exception as e:
+                logger.warning(f"LLM cache disk read failed: {e}")
+                entry = None
+            if entry is not None:
+                self._remember(key, *entry)
+
+        if entry is None or time.time() - entry[0] > self.ttl_sec:
+            self._memory.pop(key, None)
+            self.misses += 1
+            return None
+
+        self._memory.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        created_at = time.time()
+        self._remember(key, created_at, value)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, created_at, value)
+            except Exception as e:
+                logger.warning(f"LLM cache disk write failed: {e}")
+
+llm_cache = LLMCache(
+    max_items=settings.LLM_CACHE_MAX_ITEMS,
+    ttl_sec=settings.LLM_CACHE_TTL_SEC,
+    disk_dir=settings.LLM_CACHE_DIR,
+    enabled=settings.LLM_CACHE_ENABLED
+)
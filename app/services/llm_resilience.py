@@ -0,0 +1,202 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, TypeVar
+import openai
+from loguru import logger
+from app.config import settings
+from app.services.telemetry import telemetry
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Провайдер/модель временно отключены брейкером: вызов отклонен без похода в сеть."""
+
+    def __init__(self, key: str, retry_in: float):
+        super().__init__(f"Circuit open for {key}, retry in {retry_in:.0f}s")
+        self.key = key
+        self.retry_in = retry_in
+
+
+def is_provider_failure(exc: BaseException) -> bool:
+    """
+    Считается ли ошибка сбоем провайдера (для брейкера).
+    Таймауты, обрывы соединения, 429 и 5xx — да; 4xx от кривого запроса — нет, это наша ошибка.
+    """
+    if isinstance(exc, (asyncio.TimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    Брейкер по скользящему окну ошибок.
+
+    closed: вызовы идут, исходы пишутся в окно window_sec. Если за окно набралось min_calls исходов
+    и доля сбоев >= error_rate — open.
+    open: cooldown_sec все вызовы сразу падают с CircuitOpenError.
+    half_open: пропускается один пробный вызов; успех — closed, сбой — снова open.
+    """
+
+    def __init__(self, key: str, error_rate: float = 0.5, min_calls: int = 10, window_sec: float = 60.0, cooldown_sec: float = 30.0):
+        self.key = key
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_sec = window_sec
+        self.cooldown_sec = cooldown_sec
+        self.state = "closed"
+        self._events: deque[tuple[float, bool]] = deque()  # (monotonic ts, failed)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _trim(self, now: float):
+        while self._events and self._events[0][0] < now - self.window_sec:
+            self._events.popleft()
+
+    def before_call(self):
+        """Пропускает вызов или бросает CircuitOpenError."""
+        if self.state == "closed":
+            return
+        now = time.monotonic()
+        if self.state == "open":
+            retry_in = self._opened_at + self.cooldown_sec - now
+            if retry_in > 0:
+                raise CircuitOpenError(self.key, retry_in)
+            self.state = "half_open"
+            logger.info(f"Circuit HALF-OPEN | {self.key}")
+        # half_open: один пробный вызов за раз
+        if self._probe_in_flight:
+            raise CircuitOpenError(self.key, 0)
+        self._probe_in_flight = True
+
+    def record(self, failed: bool):
+        now = time.monotonic()
+        if self.state == "half_open":
+            self._probe_in_flight = False
+            if failed:
+                self._open(now, "probe failed")
+            else:
+                self.state = "closed"
+                self._events.clear()
+                logger.info(f"Circuit CLOSED | {self.key}")
+            return
+
+        self._events.append((now, failed))
+        self._trim(now)
+        if self.state != "closed" or len(self._events) < self.min_calls:
+            return
+        failures = sum(1 for _, f in self._events if f)
+        rate = failures / len(self._events)
+        if rate >= self.error_rate:
+            self._open(now, f"{failures}/{len(self._events)} failed in {self.window_sec:.0f}s")
+
+    def release(self):
+        """Пробный вызов отменен, не дойдя до результата — даем пройти следующему."""
+        self._probe_in_flight = False
+
+    def _open(self, now: float, reason: str):
+        self.state = "open"
+        self._opened_at = now
+        self._events.clear()
+        logger.warning(f"Circuit OPEN | {self.key} | {reason} | cooldown {self.cooldown_sec:.0f}s")
+
+
+class LLMResilience:
+    """
+    Дедлайны, брейкер и хеджирование для вызовов провайдеров (llm_client, эмбеддинги, STT).
+
+    - Таймаут на весь вызов по типу (LLM_TIMEOUTS_SEC, по умолчанию LLM_TIMEOUT_SEC) — вместе с ретраями SDK.
+      Зависший провайдер больше не держит хэндлер (и "печатает...") бесконечно.
+    - Брейкер на модель: при всплеске сбоев вызовы сразу падают с CircuitOpenError, а не ждут таймаута.
+    - Хеджирование (LLM_HEDGE_CALL_TYPES, только идемпотентные вызовы без стрима): если ответа нет дольше p90
+      этого места вызова, уходит дубль запроса, берется первый успешный, второй отменяется.
+    """
+
+    def __init__(self):
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(
+                key,
+                error_rate=settings.LLM_BREAKER_ERROR_RATE,
+                min_calls=settings.LLM_BREAKER_MIN_CALLS,
+                window_sec=settings.LLM_BREAKER_WINDOW_SEC,
+                cooldown_sec=settings.LLM_BREAKER_COOLDOWN_SEC
+            )
+        return self._breakers[key]
+
+    @staticmethod
+    def timeout_for(call_type: str) -> float:
+        return settings.LLM_TIMEOUTS_SEC.get(call_type, settings.LLM_TIMEOUT_SEC)
+
+    def hedge_delay(self, call_type: str, site: str) -> float | None:
+        """Через сколько секунд слать дубль (None — не хеджируем)."""
+        if not settings.LLM_HEDGE_ENABLED or call_type not in settings.LLM_HEDGE_CALL_TYPES:
+            return None
+        p90 = telemetry.site_percentile(site, 90, settings.LLM_HEDGE_MIN_SAMPLES)
+        delay_ms = max(p90 if p90 is not None else settings.LLM_HEDGE_DEFAULT_DELAY_MS, settings.LLM_HEDGE_MIN_DELAY_MS)
+        return delay_ms / 1000
+
+    @asynccontextmanager
+    async def guard(self, call_type: str, key: str):
+        """Брейкер + дедлайн вокруг произвольного блока (например, чтения стрима целиком)."""
+        breaker = self.breaker(key)
+        breaker.before_call()
+        timeout = self.timeout_for(call_type)
+        try:
+            async with asyncio.timeout(timeout):
+                yield
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except BaseException as e:
+            breaker.record(is_provider_failure(e))
+            if isinstance(e, TimeoutError):
+                logger.error(f"LLM Timeout | {call_type} | {key} | {timeout:.0f}s")
+            raise
+        else:
+            breaker.record(False)
+
+    async def call(self, call_type: str, key: str, factory: Callable[[], Awaitable[T]], site: str | None = None) -> T:
+        """
+        Выполняет factory() с дедлайном и брейкером по key (обычно — модель).
+        factory должна создавать новый запрос на каждый вызов: при хеджировании она вызывается дважды.
+        """
+        hedge_delay = self.hedge_delay(call_type, site or call_type)
+        async with self.guard(call_type, key):
+            if hedge_delay is None:
+                return await factory()
+            return await self._hedged(factory, hedge_delay, site or call_type)
+
+    async def _hedged(self, factory: Callable[[], Awaitable[T]], delay: float, site: str) -> T:
+        primary = asyncio.ensure_future(factory())
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                logger.info(f"LLM Hedge | {site} | no response after {delay * 1000:.0f}ms, sending duplicate")
+                pending.add(asyncio.ensure_future(factory()))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            logger.info(f"LLM Hedge | {site} | duplicate won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+
+llm_resilience = LLMResilience()
@@ -0,0 +1,53 @@
+from loguru import logger
+from app.config import settings
+from app.services.telemetry import telemetry
+
+# Алиасы в LLM_MODEL_MAP: "main" -> LLM_MODEL, "fast" -> LLM_FAST_MODEL, иначе — id модели как есть
+MODEL_ALIASES = ("main", "fast")
+
+
+class ModelRouter:
+    """
+    Выбор модели по типу вызова (router, rerank, extract, refine, bio, recall, summary).
+
+    Тип -> модель задается в LLM_MODEL_MAP (по умолчанию — LLM_MODEL).
+    Если rolling p95 основной модели типа за LLM_FALLBACK_WINDOW_SEC выше LLM_FALLBACK_P95_MS,
+    вызовы временно уходят на LLM_FAST_MODEL. Пока модель в фолбэке, новых замеров у нее нет:
+    старые выходят из окна, замеров становится меньше LLM_FALLBACK_MIN_SAMPLES — и трафик возвращается.
+    """
+
+    def __init__(self):
+        self._degraded: set[str] = set()
+
+    @staticmethod
+    def _model_for(alias_or_model: str) -> str:
+        if alias_or_model == "main":
+            return settings.LLM_MODEL
+        if alias_or_model == "fast":
+            return settings.LLM_FAST_MODEL
+        return alias_or_model
+
+    def primary(self, call_type: str) -> str:
+        return self._model_for(settings.LLM_MODEL_MAP.get(call_type, "main"))
+
+    def resolve(self, call_type: str) -> str:
+        model = self.primary(call_type)
+        fast = settings.LLM_FAST_MODEL
+        if not settings.LLM_FALLBACK_P95_MS or model == fast:
+            return model
+
+        p95 = telemetry.model_p95(model, settings.LLM_FALLBACK_WINDOW_SEC, settings.LLM_FALLBACK_MIN_SAMPLES)
+        degraded = p95 is not None and p95 > settings.LLM_FALLBACK_P95_MS
+
+        # Логируем только смену состояния, а не каждый вызов
+        if degraded and model not in self._degraded:
+            self._degraded.add(model)
+            logger.warning(f"Model fallback ON | {model} p95={p95:.0f}ms > {settings.LLM_FALLBACK_P95_MS}ms -> {fast}")
+        elif not degraded and model in self._degraded:
+            self._degraded.discard(model)
+            logger.info(f"Model fallback OFF | back to {model}")
+
+        return fast if degraded else model
+
+
+model_router = ModelRouter()
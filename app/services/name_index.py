@@ -0,0 +1,218 @@
+import asyncio
+import re
+import time
+from typing import Awaitable, Callable
+from loguru import logger
+
+# Транслитерация кириллицы в латиницу (упрощенный ГОСТ, нам важна не точность, а совпадение форм)
+_CYR_TO_LAT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "", "ы": "i", "ь": "", "э": "e", "ю": "iu",
+    "я": "ia", "і": "i", "ї": "i", "є": "e",
+}
+
+# Уменьшительные и иноязычные формы -> полное имя (в кириллице, ключи нормализуются при загрузке модуля)
+_NAME_VARIANTS = {
+    "александр": ["саша", "шура", "санек", "саня", "alex", "alexander", "alexandr", "sasha"],
+    "александра": ["сашенька", "alexandra"],
+    "алексей": ["леша", "лёша", "алеша", "alexey", "alexei", "aleksey"],
+    "анастасия": ["настя", "nastya", "anastasia"],
+    "анна": ["аня", "анечка", "ann", "anna", "anya"],
+    "андрей": ["андрюша", "andrew", "andrey", "andrei"],
+    "борис": ["боря", "boris"],
+    "валентин": ["валя", "valentin"],
+    "василий": ["вася", "vasily", "vasiliy"],
+    "виктор": ["витя", "victor", "viktor"],
+    "виталий": ["виталик", "vitaly", "vitaliy"],
+    "владимир": ["вова", "володя", "vladimir", "vova"],
+    "владислав": ["влад", "vlad", "vladislav"],
+    "георгий": ["жора", "гоша", "george", "georgy"],
+    "григорий": ["гриша", "grigory", "gregory"],
+    "дмитрий": ["дима", "митя", "dmitry", "dmitriy", "dima"],
+    "евгений": ["женя", "евгеша", "eugene", "evgeny", "evgeniy", "zhenya"],
+    "екатерина": ["катя", "катюша", "kate", "katya", "ekaterina", "catherine"],
+    "елена": ["лена", "helen", "elena", "lena"],
+    "иван": ["ваня", "john", "ivan", "vanya"],
+    "игорь": ["игорек", "igor"],
+    "илья": ["илюша", "ilya", "ilia"],
+    "камиль": ["kamil"],
+    "константин": ["костя", "kostya", "konstantin"],
+    "мария": ["маша", "маня", "mary", "maria", "masha"],
+    "михаил": ["миша", "michael", "mikhail", "misha", "mike"],
+    "наталья": ["наташа", "natalia", "natasha", "natalya"],
+    "николай": ["коля", "nick", "nikolay", "nikolai", "kolya"],
+    "никита": ["nikita"],
+    "ольга": ["оля", "olga", "olya"],
+    "павел": ["паша", "paul", "pavel", "pasha"],
+    "петр": ["петя", "peter", "pyotr", "petr", "petya"],
+    "роман": ["рома", "roman", "roma"],
+    "сергей": ["сережа", "серега", "sergey", "sergei", "serge"],
+    "станислав": ["стас", "stas", "stanislav"],
+    "татьяна": ["таня", "tanya", "tatiana", "tatyana"],
+    "федор": ["федя", "fedor", "fyodor"],
+    "юлия": ["юля", "julia", "yulia", "yuliya"],
+    "юрий": ["юра", "yury", "yuri", "yuriy"],
+    "ярослав": ["слава", "yaroslav"],
+}
+
+_TOKEN_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def _latinize(token: str) -> str:
+    """
+    Приводит токен имени к единой латинской фонетической форме:
+    'Саша' и 'Sasha' дают 'sasha', 'Alexander' и 'Александр' — почти одинаковые строки.
+    """
+    token = token.lower().replace("ё", "е")
+    token = "".join(_CYR_TO_LAT.get(ch, ch) for ch in token)
+    # Сглаживаем различия английского и русского написания
+    token = token.replace("ph", "f").replace("x", "ks").replace("w", "v").replace("kh", "h")
+    token = re.sub(r"c(?!h)", "k", token)
+    token = token.replace("y", "i").replace("j", "i")
+    # Схлопываем удвоенные буквы (Anna -> Ana, Алла -> Ala)
+    token = re.sub(r"(.)\1+", r"\1", token)
+    return token
+
+
+def _build_variant_map() -> dict[str, str]:
+    variants = {}
+    for full, forms in _NAME_VARIANTS.items():
+        canon = _latinize(full)
+        variants[canon] = canon
+        for form in forms:
+            variants[_latinize(form)] = canon
+    return variants
+
+
+_VARIANT_TO_CANON = _build_variant_map()
+
+
+def canonical_token(token: str) -> str:
+    latin = _latinize(token)
+    return _VARIANT_TO_CANON.get(latin, latin)
+
+
+def _trigrams(value: str) -> frozenset[str]:
+    padded = f"  {value} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _tokenize(name: str) -> list[tuple[str, frozenset[str]]]:
+    tokens = []
+    for raw in _TOKEN_RE.findall(name or ""):
+        canon = canonical_token(raw)
+        if canon:
+            tokens.append((canon, _trigrams(canon)))
+    return tokens
+
+
+def name_similarity(query_tokens: list, name_tokens: list) -> float:
+    """
+    Похожесть двух имен 0..1: среднее по токенам запроса лучшего совпадения с токенами имени
+    (канонические формы / Jaccard по триграммам). Совпадения слабее 0.5 считаются нулем,
+    поэтому одно общее имя при разных фамилиях дает не больше 0.5 ("Анна Смирнова" / "Анна Кузнецова").
+    """
+    if not query_tokens or not name_tokens:
+        return 0.0
+
+    best_per_token = []
+    for q_canon, q_grams in query_tokens:
+        best = 0.0
+        for n_canon, n_grams in name_tokens:
+            if q_canon == n_canon:
+                best = 1.0
+                break
+            union = len(q_grams | n_grams)
+            if union:
+                best = max(best, len(q_grams & n_grams) / union)
+        best_per_token.append(best if best >= 0.5 else 0.0)
+
+    return sum(best_per_token) / len(best_per_token)
+
+
+class NameIndex:
+    """
+    In-process индекс имен контактов по юзерам для проверки дублей в add_contact.
+
+    Вместо ILIKE '%name%' по всей таблице держим в памяти триграммы канонических форм
+    (транслитерация + уменьшительные), поэтому "Саша" находит "Александр" и "Alexander".
+    Индекс юзера загружается из БД при первом обращении (cold start) и дальше
+    поддерживается инкрементально мутациями контактов (upsert/remove).
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[int], Awaitable[list[dict]]],
+        ttl_sec: int = 3600,
+        threshold: float = 0.55
+    ):
+        self._loader = loader
+        self._ttl_sec = ttl_sec
+        self._threshold = threshold
+        # {user_id: {"entries": {contact_id: entry}, "loaded_at": ts}}
+        self._users: dict[int, dict] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+
+    @staticmethod
+    def _make_entry(row: dict) -> dict:
+        return {
+            "id": str(row["id"]),
+            "name": row.get("name") or "",
+            "summary": row.get("summary"),
+            "tokens": _tokenize(row.get("name") or ""),
+            "lowered": (row.get("name") or "").lower(),
+        }
+
+    async def _ensure_loaded(self, user_id: int) -> dict:
+        state = self._users.get(user_id)
+        if state and time.monotonic() - state["loaded_at"] < self._ttl_sec:
+            return state["entries"]
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            state = self._users.get(user_id)
+            if state and time.monotonic() - state["loaded_at"] < self._ttl_sec:
+                return state["entries"]
+
+            rows = await self._loader(user_id)
+            entries = {str(row["id"]): self._make_entry(row) for row in rows}
+            self._users[user_id] = {"entries": entries, "loaded_at": time.monotonic()}
+            logger.debug(f"[NameIndex] Loaded {len(entries)} names for user {user_id}")
+            return entries
+
+    async def find_similar(self, user_id: int, name: str, limit: int = 5) -> list[tuple[dict, float]]:
+        """
+        Возвращает [(entry, score)] по убыванию похожести.
+        Подстрочное совпадение (старое поведение ILIKE) всегда считается дублем.
+        """
+        entries = await self._ensure_loaded(user_id)
+        query_tokens = _tokenize(name)
+        query_lowered = (name or "").strip().lower()
+
+        scored = []
+        for entry in entries.values():
+            if query_lowered and query_lowered in entry["lowered"]:
+                score = 1.0
+            else:
+                score = name_similarity(query_tokens, entry["tokens"])
+            if score >= self._threshold:
+                scored.append((entry, score))
+
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:limit]
+
+    def upsert(self, user_id: int, row: dict):
+        """Обновляет запись, только если индекс юзера уже загружен (иначе ее подтянет cold start)."""
+        state = self._users.get(user_id)
+        if state:
+            state["entries"][str(row["id"])] = self._make_entry(row)
+
+    def remove(self, user_id: int, contact_id: str):
+        state = self._users.get(user_id)
+        if state:
+            state["entries"].pop(str(contact_id), None)
+
+    def invalidate(self, user_id: int):
+        self._users.pop(user_id, None)
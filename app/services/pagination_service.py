@@ -0,0 +1,105 @@
+import secrets
+import time
+from collections import OrderedDict
+from loguru import logger
+from app.config import settings
+from app.schemas import SearchResult, SearchResultPage
+from app.services.search_service import search_service
+
+class PaginationService:
+    """
+    Состояние кнопки "Дальше" для списков контактов в чате.
+
+    Результат поиска (гибрид + rerank) уже отранжирован, поэтому целиком кладем его в память
+    и листаем срезами — без повторного прогона всего пайплайна.
+    Листинг (все контакты / org:Name) приходит страницей с keyset-курсором: когда буфер
+    закончился, следующая страница догружается из БД строго после курсора.
+    """
+    MAX_TOKENS_PER_USER = 20
+    SWEEP_INTERVAL_SEC = 60  # Как часто _put вычищает протухшие токены всех юзеров
+
+    def __init__(self):
+        # {user_id: OrderedDict{token: (result_set, offset)}}
+        # result_set = {"items": [...], "cursor": str | None, "org_id": str | None, "created": ts}
+        self._pages: dict[int, OrderedDict] = {}
+        self._last_sweep = time.monotonic()
+
+    @staticmethod
+    def _expired(result_set: dict, now: float) -> bool:
+        return now - result_set["created"] > settings.SEARCH_RESULTS_TTL_SEC
+
+    def _sweep(self, now: float):
+        """Удаляет протухшие токены и опустевших юзеров (иначе память растет с числом юзеров)."""
+        for user_id in list(self._pages):
+            pages = self._pages[user_id]
+            for token in [t for t, (result_set, _) in pages.items() if self._expired(result_set, now)]:
+                del pages[token]
+            if not pages:
+                del self._pages[user_id]
+        self._last_sweep = now
+
+    def _put(self, user_id: int, result_set: dict, offset: int) -> str:
+        now = time.monotonic()
+        if now - self._last_sweep > self.SWEEP_INTERVAL_SEC:
+            self._sweep(now)
+        token = secrets.token_urlsafe(6)[:8]
+        pages = self._pages.setdefault(user_id, OrderedDict())
+        pages[token] = (result_set, offset)
+        while len(pages) > self.MAX_TOKENS_PER_USER:
+            pages.popitem(last=False)
+        return token
+
+    def _has_more(self, result_set: dict, offset: int) -> bool:
+        return offset < len(result_set["items"]) or bool(result_set["cursor"])
+
+    def open(self, user_id: int, results: list[SearchResult], page_size: int) -> tuple[list[SearchResult], str | None]:
+        """
+        Регистрирует новый список и возвращает (первая страница, токен следующей страницы | None).
+        """
+        result_set = {
+            "items": list(results),
+            "cursor": results.next_cursor if isinstance(results, SearchResultPage) else None,
+            "org_id": results.org_id if isinstance(results, SearchResultPage) else None,
+            "created": time.monotonic(),
+        }
+        first_page = result_set["items"][:page_size]
+        if not self._has_more(result_set, page_size):
+            return first_page, None
+        return first_page, self._put(user_id, result_set, page_size)
+
+    async def next_page(self, user_id: int, token: str, page_size: int) -> tuple[list[SearchResult], str | None, int] | None:
+        """
+        Возвращает (страница, токен следующей | None, номер первого элемента страницы) или None, если токен протух.
+        Повторное нажатие на ту же кнопку отдает ту же страницу.
+        """
+        entry = self._pages.get(user_id, {}).get(token)
+        if not entry:
+            return None
+
+        result_set, offset = entry
+        if self._expired(result_set, time.monotonic()):
+            pages = self._pages[user_id]
+            pages.pop(token, None)
+            if not pages:
+                del self._pages[user_id]
+            return None
+
+        items = result_set["items"]
+        # Буфер закончился, но есть курсор листинга — догружаем из БД только следующий срез
+        if offset + page_size > len(items) and result_set["cursor"]:
+            more = await search_service.list_contacts_page(
+                user_id,
+                org_id=result_set["org_id"],
+                cursor=result_set["cursor"],
+                limit=page_size
+            )
+            logger.debug(f"[Pagination] Loaded {len(more)} more rows for user {user_id} (org_id={result_set['org_id']})")
+            items.extend(more)
+            result_set["cursor"] = more.next_cursor
+
+        page = items[offset:offset + page_size]
+        next_offset = offset + page_size
+        next_token = self._put(user_id, result_set, next_offset) if self._has_more(result_set, next_offset) else None
+        return page, next_token, offset + 1
+
+pagination_service = PaginationService()
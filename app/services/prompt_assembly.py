@@ -0,0 +1,62 @@
+import hashlib
+import json
+from loguru import logger
+from app.prompts_loader import PromptsConfig
+from app.services.context_builder import estimate_tokens
+
+# Провайдеры (OpenAI через OpenRouter) кэшируют префикс промпта от ~1024 токенов, совпадающий байт в байт
+PROVIDER_CACHE_MIN_TOKENS = 1024
+
+
+class PromptAssembly:
+    """
+    Сборка промптов со стабильным префиксом под prompt caching провайдера.
+
+    Порядок всегда один: статика (системный промпт + tools) -> контекст юзера, который меняется редко
+    (bio, фокус, резюме истории) -> переменная часть (кандидаты, сообщения, запрос).
+    Любой байт, изменившийся в начале, сбрасывает кэш всего, что после него, поэтому переменное
+    никогда не подставляется внутрь системного промпта.
+
+    Шаблоны компилируются один раз (compile() на старте): системные сообщения замораживаются,
+    для каждого префикса считается отпечаток — по логам видно, что он не меняется между деплоями.
+    """
+
+    def __init__(self):
+        self._system: dict[str, str] = {}
+        self._tools: dict[str, list] = {}
+
+    def register_tools(self, key: str, tools: list):
+        """Tools, которые идут в запросах с промптом key (входят в кэшируемый префикс)."""
+        self._tools[key] = tools
+
+    def compile(self):
+        PromptsConfig.load()
+        self._system = {key: value for key, value in PromptsConfig._prompts.items() if isinstance(value, str)}
+        for key, content in self._system.items():
+            tools = self._tools.get(key)
+            tokens = estimate_tokens(content) + (estimate_tokens(json.dumps(tools, ensure_ascii=False)) if tools else 0)
+            cacheable = "cacheable" if tokens >= PROVIDER_CACHE_MIN_TOKENS else "below cache minimum"
+            logger.info(f"Prompt compiled | {key} | ~{tokens} prefix tokens ({cacheable}) | sha={self.fingerprint(key)}")
+
+    def system_text(self, key: str) -> str:
+        if not self._system:
+            self.compile()
+        return self._system.get(key, "")
+
+    def fingerprint(self, key: str) -> str:
+        """Отпечаток статического префикса (системный промпт + tools)."""
+        payload = self._system.get(key, "") + json.dumps(self._tools.get(key), ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+    def messages(self, key: str, *parts: str) -> list[dict]:
+        """
+        [system, user]: системный промпт key как есть, затем части пользовательского сообщения.
+        parts передаются от самой стабильной к самой переменной; пустые пропускаются.
+        """
+        return [
+            {"role": "system", "content": self.system_text(key)},
+            {"role": "user", "content": "\n\n".join(part for part in parts if part)}
+        ]
+
+
+prompt_assembly = PromptAssembly()
@@ -5,11 +5,12 @@ from aiogram import Bot
 import tenacity
 from app.infrastructure.supabase.client import get_supabase
 from app.services.ai_service import ai_service
+from app.services.telemetry import telemetry
 from app.services.search_service import search_service
 from app.services.user_service import user_service
 from app.schemas import RecallSettings
 from app.config import settings
-from app.prompts_loader import get_prompt
+from app.services.prompt_assembly import prompt_assembly
 
 class RecallService:
     def __init__(self):
@@ -60,33 +61,22 @@ class RecallService:
             for c in contacts
         ])
 
-        system_prompt = get_prompt("recall_advisor")
-        
-        # Добавляем контекст пользователя
+        # Контекст пользователя (меняется редко) идет перед списком контактов (меняется каждый раз)
         user_context = ""
         if bio:
             user_context += f"\nUSER BIO (WHO AM I): {bio}"
         if focus:
             user_context += f"\nCURRENT FOCUS/GOAL: {focus}"
             
-        user_content = f"{user_context}\n\nContacts List:\n{contacts_str}"
+        messages = prompt_assembly.messages("recall_advisor", user_context.strip(), f"Contacts List:\n{contacts_str}")
 
         try:
             logger.info(f"LLM Recall Request | User Context: {user_context[:200]}...")
             
             # Логируем промпты через ai_service хелпер
-            ai_service._log_llm_messages([
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ])
+            ai_service._log_llm_messages(messages)
 
-            response = await ai_service.llm_client.chat.completions.create(
-                model=settings.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ]
-            )
+            response = await ai_service._chat("recall", messages=messages)
             content = response.choices[0].message.content.strip()
             logger.info(f"LLM Recall Response | Content: {content}")
             
@@ -171,7 +161,12 @@ class RecallService:
 
                 bio = user.get('bio')
                 focus = rs.get('focus')
-                message_text = await self.generate_recall_message(contacts, bio=bio, focus=focus)
+                # Планировщик работает вне апдейта: привязываем вызов LLM к юзеру вручную
+                token = telemetry.bind_user(user_id)
+                try:
+                    message_text = await self.generate_recall_message(contacts, bio=bio, focus=focus)
+                finally:
+                    telemetry.reset_user(token)
                 
                 try:
                     footer = ""
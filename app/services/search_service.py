@@ -2,22 +2,51 @@ import re
 from uuid import UUID
 from loguru import logger
 from app.infrastructure.supabase.client import get_supabase
-from app.schemas import ContactCreate, ContactInDB, SearchResult
+from app.schemas import ContactCreate, ContactInDB, ContactUpdateAsk, SearchResult, SearchResultPage
 from app.repositories.contact_repo import ContactRepository
 from app.repositories.org_repo import OrgRepository
+from app.services.name_index import NameIndex
 from app.services.user_service import user_service
+from app.config import settings
 
 class AccessDenied(Exception):
     """Исключение при отсутствии прав доступа к ресурсу."""
     pass
 
+# org:skop, role:CTO, company:"Тинькофф Банк", interest:крипта
+_FILTER_RE = re.compile(r'\b(org|role|company|interest):(?:"([^"]+)"|(\S+))', re.IGNORECASE)
+
+def parse_search_filters(query: str) -> tuple[str, dict[str, str]]:
+    """
+    Выделяет из запроса структурные фильтры (org:, role:, company:, interest:).
+    Значение с пробелами берется в кавычки. Возвращает (остаток запроса, {фильтр: значение}).
+    """
+    filters: dict[str, str] = {}
+
+    def _take(match: re.Match) -> str:
+        filters[match.group(1).lower()] = (match.group(2) or match.group(3)).strip()
+        return " "
+
+    rest = _FILTER_RE.sub(_take, query)
+    return " ".join(rest.split()), filters
+
 class SearchService:
     def __init__(self):
         self.supabase = get_supabase()
         self.repo = ContactRepository(self.supabase)
         self.org_repo = OrgRepository(self.supabase)
+        self.name_index = NameIndex(
+            loader=self._load_contact_names,
+            ttl_sec=settings.NAME_INDEX_TTL_SEC,
+            threshold=settings.NAME_MATCH_THRESHOLD
+        )
 
     async def create_contact(self, contact_data: ContactCreate) -> ContactInDB:
+        if contact_data.embedding is None:
+            # Подтвержденный драфт: вектор считался в фоне, пока юзер смотрел на подтверждение
+            from app.services.ai_service import ai_service
+            contact_data.embedding = await ai_service.resolve_deferred_embedding(contact_data)
+
         try:
             data = contact_data.model_dump(exclude_none=True)
             logger.debug(f"[CREATE] Creating contact: name='{contact_data.name}', user_id={contact_data.user_id}, org_id={contact_data.org_id}")
@@ -31,6 +60,7 @@ class SearchService:
             if not response.data:
                 raise ValueError("Failed to insert contact")
             contact = ContactInDB(**response.data[0])
+            self.name_index.upsert(contact.user_id, response.data[0])
             logger.info(f"[CREATE] Contact created: id={contact.id}, name='{contact.name}', user_id={contact.user_id}")
             return contact
         except Exception as e:
@@ -120,11 +150,22 @@ class SearchService:
                 .execute()
             if not response.data:
                 return None
+            self.name_index.upsert(user_id, response.data[0])
             return ContactInDB(**response.data[0])
         except Exception as e:
             logger.error(f"Error updating contact: {e}")
             raise
 
+    async def apply_update_ask(self, update_ask: ContactUpdateAsk, user_id: int) -> ContactInDB | None:
+        """Подтвержденное обновление: updates + вектор, который досчитывался в фоне (AIService.defer_embedding)."""
+        from app.services.ai_service import ai_service
+
+        updates = dict(update_ask.updates)
+        embedding = await ai_service.resolve_deferred_embedding(update_ask)
+        if embedding is not None:
+            updates["embedding"] = embedding
+        return await self.update_contact(update_ask.contact_id, user_id, updates)
+
     async def delete_contact(self, contact_id: UUID | str, user_id: int) -> bool:
         """
         Удаляет контакт с явной проверкой прав доступа.
@@ -151,6 +192,7 @@ class SearchService:
             deleted = bool(response.data)
             
             if deleted:
+                self.name_index.remove(user_id, str(contact_id))
                 logger.info(f"[DELETE] Contact {contact_id} deleted by user {user_id}")
             else:
                 logger.warning(f"[DELETE] DB returned empty response - contact may not exist or already deleted")
@@ -171,79 +213,118 @@ class SearchService:
             logger.error(f"Error counting contacts: {e}")
             return 0
 
-    async def find_similar_contacts_by_name(self, name: str, user_id: int) -> list[ContactInDB]:
+    async def _load_contact_names(self, user_id: int) -> list[dict]:
+        """Cold start индекса имен: только нужные колонки, без embedding/raw_text."""
+        response = self.supabase.table("contacts")\
+            .select("id, name, summary")\
+            .eq("user_id", user_id)\
+            .execute()
+        return response.data or []
+
+    async def find_similar_contacts_by_name(self, name: str, user_id: int) -> list[SearchResult]:
         """
-        Ищет контакты с похожим именем (ILike).
+        Ищет контакты с похожим именем по in-memory индексу (подстрока, транслит, уменьшительные формы).
+        Результат отсортирован по похожести.
         """
         try:
-            # Простой поиск по подстроке case-insensitive
-            response = self.supabase.table("contacts")\
-                .select("*")\
-                .eq("user_id", user_id)\
-                .ilike("name", f"%{name}%")\
-                .execute()
-            
-            if not response.data:
-                return []
-                
-            return [ContactInDB(**item) for item in response.data]
+            matches = await self.name_index.find_similar(user_id, name)
+            return [
+                SearchResult(id=entry["id"], name=entry["name"], summary=entry["summary"], meta={})
+                for entry, _score in matches
+            ]
         except Exception as e:
             logger.error(f"Find similar failed: {e}")
             return []
 
-    async def get_recent_contacts(self, user_id: int, limit: int = 10) -> list[SearchResult]:
+    @staticmethod
+    def _encode_cursor(row: dict) -> str:
+        """Keyset-курсор листинга: (created_at, id) последней показанной строки."""
+        return f"{row['created_at']}|{row['id']}"
+
+    async def list_contacts_page(
+        self,
+        user_id: int,
+        org_id: str | None = None,
+        cursor: str | None = None,
+        limit: int = 10
+    ) -> SearchResultPage:
+        """
+        Keyset-пагинация листинга: личные контакты юзера или все контакты организации.
+        Сортировка (created_at DESC, id DESC), следующая страница начинается строго после курсора,
+        поэтому "Дальше" не перечитывает уже показанные строки (в отличие от OFFSET).
+        """
+        query = self.supabase.table("contacts")\
+            .select("id, name, summary, meta, org_id, org_name, created_at")\
+            .eq("is_archived", False)
+
+        if org_id:
+            query = query.eq("org_id", str(org_id))
+        else:
+            query = query.eq("user_id", user_id)
+
+        if cursor:
+            created_at, last_id = cursor.split("|", 1)
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{last_id})'
+            )
+
+        # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+        response = query\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .limit(limit + 1)\
+            .execute()
+
+        rows = response.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = self._encode_cursor(rows[-1]) if has_more and rows else None
+
+        return SearchResultPage(
+            [SearchResult(**item) for item in rows],
+            next_cursor=next_cursor,
+            org_id=str(org_id) if org_id else None
+        )
+
+    async def get_recent_contacts(self, user_id: int, limit: int = 10, cursor: str | None = None) -> list[SearchResult]:
         """
         Получить последние добавленные контакты (для запроса "Кто у меня есть").
+        Возвращает SearchResultPage: если контактов больше, чем limit, в next_cursor лежит курсор.
         """
         try:
-            logger.debug(f"[get_recent_contacts] user_id={user_id}, limit={limit}")
-            response = self.supabase.table("contacts")\
-                .select("id, name, summary, meta, org_id, organizations(name)")\
-                .eq("user_id", user_id)\
-                .eq("is_archived", False)\
-                .order("created_at", desc=True)\
-                .limit(limit)\
-                .execute()
-            
-            if not response.data:
-                return []
-
-            results: list[SearchResult] = []
-            for item in response.data:
-                org_rel = item.get("organizations")
-                org_name = None
-                if isinstance(org_rel, dict):
-                    org_name = org_rel.get("name")
-                item.pop("organizations", None)
-                item["org_name"] = org_name
-                results.append(SearchResult(**item))
-
-            return results
+            logger.debug(f"[get_recent_contacts] user_id={user_id}, limit={limit}, cursor={cursor}")
+            return await self.list_contacts_page(user_id, cursor=cursor, limit=limit)
         except Exception as e:
             logger.error(f"[get_recent_contacts] Exception: {e}", exc_info=True)
             return []
 
+    @staticmethod
+    def _rpc_filters(org_id, meta_filters: dict[str, str]) -> dict:
+        """Параметры фильтров для search_hybrid / match_contacts (только заданные)."""
+        params = {f"p_{key}": value for key, value in meta_filters.items()}
+        if org_id:
+            params["p_org_id"] = str(org_id)
+        return params
+
     async def search(self, query: str, user_id: int, limit: int = 10) -> list[SearchResult]:
         try:
-            # 1. Попытка выделить организацию из запроса (Story 16)
-            q = query.strip()
+            # 1. Структурные фильтры (org:, role:, company:, interest:) и организация (Story 16)
+            q, meta_filters = parse_search_filters(query.strip())
+            org_name_query = meta_filters.pop("org", None)
+            org_name_query = org_name_query.lower() if org_name_query else None
+            # Текст без фильтров: "company:Яндекс" — фильтр, а не упоминание орги "Яндекс"
             q_lower = q.lower()
             
             org_id = None
-            org_name_query = None
-
-            if "org:" in q_lower:
-                match = re.search(r'org:(\S+)', q, re.IGNORECASE)
-                if match:
-                    org_name_query = match.group(1).lower()
-                    q = re.sub(r'org:\S+', '', q, flags=re.IGNORECASE).strip()
-                    if not q: q = "*"
+
+            if org_name_query and not q and not meta_filters:
+                q = "*"
             
             # Если не нашли через org:, попробуем найти упоминание организации в тексте
             if not org_name_query:
                 user_memberships = await self.get_user_orgs(user_id)
                 for org in user_memberships:
-                    if org['name'].lower() in q_lower:
+                    if q_lower and org['name'].lower() in q_lower:
                         org_id = org['id']
                         break
             else:
@@ -264,7 +345,7 @@ class SearchService:
 
             # 2. Если организация найдена, и запрос был только про неё (или "все"), 
             # возвращаем список контактов этой организации
-            if org_id and (q == "*" or not q):
+            if org_id and (q == "*" or not q) and not meta_filters:
                 # Double check: if user is pending, they should only see this via the limit logic above
                 # But here we are already after the limit check. 
                 # Let's add an extra security layer: check if user is actually APPROVED to bypass limits
@@ -273,23 +354,7 @@ class SearchService:
                 # However, the direct select below bypasses our search_hybrid SQL function's security.
                 # Let's make it respect the membership status.
                 
-                response = self.supabase.table("contacts")\
-                    .select("id, name, summary, meta, org_id, organizations(name)")\
-                    .eq("org_id", str(org_id))\
-                    .eq("is_archived", False)\
-                    .order("created_at", desc=True)\
-                    .limit(limit)\
-                    .execute()
-
-                # Filter results to ensure user is allowed to see them if they are pending
-                # (Actually, if they reached here, check_search_limit already passed)
-
-                results: list[SearchResult] = []
-                for item in response.data:
-                    org_rel = item.get("organizations")
-                    item["org_name"] = org_rel.get("name") if isinstance(org_rel, dict) else None
-                    item.pop("organizations", None)
-                    results.append(SearchResult(**item))
+                results = await self.list_contacts_page(user_id, org_id=str(org_id), limit=limit)
                 
                 # Story 23: Increment counter for simple list search
                 await user_service.increment_free_searches(user_id, str(org_id))
@@ -301,9 +366,16 @@ class SearchService:
             
             # ХАК: Если запрос похож на "покажи всех", вызываем get_recent_contacts
             if q == "*" or q_lower in ["все", "all", "все контакты"]:
-                return await self.get_recent_contacts(user_id, limit)
+                if not meta_filters:
+                    return await self.get_recent_contacts(user_id, limit)
+                # "все CTO": остаются только фильтры
+                q = ""
+                q_lower = ""
+
+            # Фильтры уходят в WHERE обеих RPC: и SQL, и векторный этап идут по отфильтрованному набору
+            rpc_filters = self._rpc_filters(org_id, meta_filters)
 
-            logger.debug(f"Searching for '{q}' (org_id={org_id}) for user {user_id}...")
+            logger.debug(f"Searching for '{q}' (org_id={org_id}, filters={meta_filters}) for user {user_id}...")
             
             # --- TRUE HYBRID SEARCH (SQL + Vector) ---
             
@@ -311,32 +383,27 @@ class SearchService:
             sql_results = []
             try:
                 # 1.1 Поиск по имени и описанию через RPC
-                response = await self.repo.search(user_id, q)
+                response = await self.repo.search(user_id, q, limit=max(limit, 20), filters=rpc_filters)
                 if response.data:
                     sql_results = [SearchResult(**item) for item in response.data]
                     logger.debug(f"SQL Search found {len(sql_results)} items via RPC")
                 
-                # 1.2 Если мы в контексте конкретной организации, фильтруем или добавляем её
-                if org_id:
-                    # Фильтруем SQL результаты, оставляя только те, что в этой орге
-                    sql_results = [r for r in sql_results if str(r.org_id) == str(org_id)]
-                else:
+                # 1.2 Вне контекста организации добавляем контакты орг, подходящих под запрос
+                # (в контексте орги фильтр p_org_id уже применен в RPC)
+                if not org_id and q_lower and not meta_filters:
                     # Ищем организации пользователя, подходящие под запрос
                     user_orgs = await self.get_user_orgs(user_id)
                     matched_org_ids = [str(org['id']) for org in user_orgs if q_lower in org['name'].lower()]
                     
                     if matched_org_ids:
                         org_response = self.supabase.table("contacts")\
-                            .select("id, name, summary, meta, org_id, organizations(name)")\
+                            .select("id, name, summary, meta, org_id, org_name")\
                             .in_("org_id", matched_org_ids)\
                             .eq("is_archived", False)\
                             .execute()
                         
                         if org_response.data:
                             for item in org_response.data:
-                                org_rel = item.get("organizations")
-                                item["org_name"] = org_rel.get("name") if isinstance(org_rel, dict) else None
-                                item.pop("organizations", None)
                                 res = SearchResult(**item)
                                 if not any(r.id == res.id for r in sql_results):
                                     sql_results.append(res)
@@ -347,22 +414,21 @@ class SearchService:
             vector_results = []
             try:
                 from app.services.ai_service import ai_service
-                embedding = await ai_service.get_embedding(q)
+                # Только фильтры без текста: векторному этапу нечего сравнивать
+                embedding = await ai_service.get_embedding(q) if q else None
                 
                 if embedding:
                     params = {
                         "query_embedding": embedding,
                         "match_user_id": user_id,
-                        "match_threshold": 0.2, # Еще ниже порог для гибкости (Story 18)
-                        "match_count": limit
+                        "match_threshold": settings.SEARCH_MATCH_THRESHOLD, # Низкий порог для гибкости (Story 18)
+                        "match_count": limit,
+                        **rpc_filters
                     }
                     
                     vec_response = self.supabase.rpc("match_contacts", params).execute()
                     if vec_response.data:
                         vector_results = [SearchResult(**item) for item in vec_response.data]
-                        # Если есть org_id, фильтруем
-                        if org_id:
-                            vector_results = [r for r in vector_results if str(r.org_id) == str(org_id)]
             except Exception as e:
                 logger.error(f"Vector Search failed: {e}")
 
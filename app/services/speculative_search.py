@@ -0,0 +1,102 @@
+import asyncio
+from loguru import logger
+from app.config import settings
+from app.services.intent_service import intent_service
+
+
+def _query_key(query: str) -> str:
+    return " ".join(query.lower().replace("ё", "е").split())
+
+
+class Speculation:
+    """
+    Спекулятивный поиск одного хода агента: задача search_service.search, запущенная до решения роутера.
+    take() отдает результат, если роутер ищет то же самое; discard() в конце хода отменяет невостребованное.
+    """
+
+    def __init__(self, owner: "SpeculativeSearch", query: str, task: asyncio.Task):
+        self.owner = owner
+        self.query = query
+        self.task = task
+        self.taken = False
+        self.missed = False
+
+    async def take(self, query: str):
+        """Результат поиска для query инструмента или None (промах, ошибка, уже отдан) — тогда обычный поиск."""
+        if self.taken:
+            return None
+        if _query_key(query) != self.query:
+            if not self.missed:
+                self.missed = True
+                self.owner.stats["misses"] += 1
+                logger.info(f"Speculative search miss | guessed='{self.query}' | router='{query}'")
+            return None
+
+        self.taken = True
+        try:
+            results = await self.task
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.owner.stats["errors"] += 1
+            logger.warning(f"Speculative search failed, falling back | '{self.query}' | {type(e).__name__}: {e}")
+            return None
+        if results is None:
+            # Упоминание организации: такой поиск не запускался (лимиты Story 23)
+            self.owner.stats["skipped"] += 1
+            return None
+
+        self.owner.stats["hits"] += 1
+        logger.info(f"Speculative search hit | '{self.query}' | ready={self.task.done()}")
+        return results
+
+    def discard(self):
+        if self.taken:
+            return
+        if not self.missed:
+            self.owner.stats["unused"] += 1  # Роутер не искал вовсе
+        self.task.cancel()
+        # Исход отмененной задачи никому не нужен — гасим "exception was never retrieved"
+        self.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+class SpeculativeSearch:
+    """
+    Спекулятивный поиск (SPECULATIVE_SEARCH): на реплику-поиск ("найди X", "кто у меня есть из X",
+    см. intent_service.search_query) гибридный поиск с эмбеддингом стартует параллельно с первым шагом роутера.
+    Если роутер вызывает search_contacts с тем же запросом — результат уже готов (или догоняется),
+    иначе отбрасывается. Поиск с упоминанием организации юзера не спекулируется: он тратит лимит
+    бесплатных поисков (Story 23). Счетчики — в /llm_stats.
+    """
+
+    def __init__(self):
+        # started — запущено; hits / misses — роутер искал то же / другое; unused — не искал;
+        # skipped — отменено из-за организации; errors — поиск упал (фолбэк на обычный)
+        self.stats = {"started": 0, "hits": 0, "misses": 0, "unused": 0, "skipped": 0, "errors": 0}
+
+    def start(self, user_text: str, user_id: int) -> Speculation | None:
+        if not settings.SPECULATIVE_SEARCH:
+            return None
+        query = intent_service.search_query(user_text)
+        if not query:
+            return None
+        self.stats["started"] += 1
+        logger.debug(f"Speculative search started | '{query}' | User: {user_id}")
+        return Speculation(self, query, asyncio.create_task(self._search(query, user_id)))
+
+    @staticmethod
+    async def _search(query: str, user_id: int):
+        from app.services.search_service import search_service
+
+        orgs = await search_service.get_user_orgs(user_id)
+        if any(org["name"].lower() in query for org in orgs):
+            return None
+        return await search_service.search(query, user_id, limit=settings.SEARCH_RESULT_SET_SIZE)
+
+    def hit_rate(self) -> float:
+        """Доля попаданий среди ходов, где роутер искал (hits / (hits + misses))."""
+        decided = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / decided if decided else 0.0
+
+
+speculative_search = SpeculativeSearch()
@@ -0,0 +1,173 @@
+import asyncio
+from datetime import datetime, timezone
+from loguru import logger
+from app.config import settings
+from app.infrastructure.supabase.client import get_supabase
+from app.services.prompt_assembly import prompt_assembly
+
+_MISSING = object()
+
+# Сколько старых сообщений сворачивать за одну компакцию (первая компакция длинной истории идет порциями)
+MAX_FOLD_BATCH = 200
+
+
+class SummaryService:
+    """
+    Rolling summary истории чата (таблица chat_summaries).
+
+    В промпт агента уходят только последние N сырых сообщений (user_service.history_depth: зависит от тарифа) —
+    все, что старше, раньше терялось. Теперь старые реплики сворачиваются в одно резюме на юзера:
+    как только несвернутых сообщений становится больше окна агента, в фоне (после SUMMARY_DEBOUNCE_SEC,
+    чтобы ход свернулся одним вызовом) запускается компакция: предыдущее резюме + все, что выпало из окна -> новое резюме.
+    Разрыва между резюме и окном нет: каждое сообщение либо в окне, либо в резюме (с точностью до одного хода).
+    """
+
+    def __init__(self):
+        self.supabase = get_supabase()
+        self._unfolded: dict[int, int] = {}  # user_id -> несвернутых сообщений (нет ключа — неизвестно, проверит компакция)
+        self._window: dict[int, int] = {}  # user_id -> окно агента на момент последней компакции
+        self._cache: dict[int, str | None] = {}  # user_id -> текущее резюме (None — резюме нет)
+        self._running: set[int] = set()
+        self._rerun: set[int] = set()  # Пока шла компакция, пришли новые сообщения
+        self._generation: dict[int, int] = {}  # user_id -> номер очистки истории (forget), см. compact
+
+    async def get_summary(self, user_id: int) -> str | None:
+        """Текущее резюме юзера. Читается из БД один раз, дальше из памяти (обновляется компакцией)."""
+        if not settings.SUMMARY_ENABLED:
+            return None
+        cached = self._cache.get(user_id, _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        row = await self._load_row(user_id)
+        summary = row["summary"] if row else None
+        self._cache[user_id] = summary
+        return summary
+
+    def note_message(self, user_id: int):
+        """Вызывается при каждом сохранении сообщения; когда сообщения выпадают из окна агента, ставит компакцию в фон."""
+        if not settings.SUMMARY_ENABLED:
+            return
+        if user_id in self._unfolded:
+            self._unfolded[user_id] += 1
+            if self._unfolded[user_id] <= self._window.get(user_id, 0):
+                return
+
+        if user_id in self._running:
+            self._rerun.add(user_id)
+            return
+        self._running.add(user_id)
+        asyncio.create_task(self._compact_safe(user_id))
+
+    def forget(self, user_id: int):
+        """Сброс состояния после очистки истории (идущая компакция свое резюме не запишет)."""
+        self._unfolded[user_id] = 0
+        self._cache[user_id] = None
+        self._generation[user_id] = self._generation.get(user_id, 0) + 1
+
+    async def clear(self, user_id: int):
+        try:
+            self.supabase.table("chat_summaries").delete().eq("user_id", user_id).execute()
+        except Exception as e:
+            logger.error(f"Failed to clear chat summary: {e}")
+        self.forget(user_id)
+
+    async def _load_row(self, user_id: int) -> dict | None:
+        try:
+            response = self.supabase.table("chat_summaries")\
+                .select("summary, covered_until, messages_folded")\
+                .eq("user_id", user_id)\
+                .execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Failed to load chat summary: {e}")
+            return None
+
+    async def _compact_safe(self, user_id: int):
+        try:
+            await asyncio.sleep(settings.SUMMARY_DEBOUNCE_SEC)
+            while True:
+                self._rerun.discard(user_id)
+                await self.compact(user_id)
+                if user_id not in self._rerun:
+                    break
+        except Exception as e:
+            logger.error(f"History compaction failed for user {user_id}: {e}")
+            self._unfolded.pop(user_id, None)  # Следующее сообщение проверит заново
+        finally:
+            self._running.discard(user_id)
+
+    async def compact(self, user_id: int) -> bool:
+        """
+        Сворачивает в резюме сообщения между covered_until и окном, которое агент видит как есть (по тарифу юзера).
+        Возвращает True, если резюме обновилось.
+        """
+        # ЛОКАЛЬНЫЙ ИМПОРТ (ai_service -> summary_service)
+        from app.services.ai_service import ai_service
+        from app.services.context_builder import context_builder
+        from app.services.user_service import user_service
+
+        generation = self._generation.get(user_id, 0)
+        keep = user_service.history_depth(user_service.plan_of(await user_service.get_user(user_id)))
+        self._window[user_id] = keep
+
+        row = await self._load_row(user_id)
+        previous = row["summary"] if row else ""
+
+        query = self.supabase.table("chat_history")\
+            .select("role, content, created_at")\
+            .eq("user_id", user_id)
+        if row:
+            query = query.gt("created_at", row["covered_until"])
+        response = query.order("created_at", desc=False).limit(keep + MAX_FOLD_BATCH).execute()
+        rows = response.data or []
+
+        to_fold = rows[:-keep] if len(rows) > keep else []
+        # Выборка уперлась в лимит — свернуто не все, следующее сообщение запустит компакцию снова
+        if len(rows) < keep + MAX_FOLD_BATCH:
+            self._unfolded[user_id] = len(rows) - len(to_fold)
+        else:
+            self._unfolded.pop(user_id, None)
+        if not to_fold:
+            return False
+
+        lines = []
+        for item in to_fold:
+            content = item["content"]
+            if item["role"] == "system":
+                content = context_builder.compact_system_row(content)
+            lines.append(f"{item['role']}: {content}")
+
+        messages = prompt_assembly.messages(
+            "history_summarizer",
+            f"PREVIOUS_SUMMARY:\n{previous or '-'}",
+            "OLD_MESSAGES:\n" + "\n".join(lines)
+        )
+        completion = await ai_service._chat(
+            "summary",
+            user_id=user_id,
+            messages=messages,
+            temperature=0.2
+        )
+        summary = (completion.choices[0].message.content or "").strip()
+        if not summary:
+            self._unfolded.pop(user_id, None)
+            return False
+        if self._generation.get(user_id, 0) != generation:
+            # Пока шел вызов LLM, юзер очистил историю (/clear): резюме удаленной истории не пишем
+            logger.info(f"History compaction dropped: history cleared meanwhile | User: {user_id}")
+            return False
+
+        self.supabase.table("chat_summaries").upsert({
+            "user_id": user_id,
+            "summary": summary,
+            "covered_until": to_fold[-1]["created_at"],
+            "messages_folded": (row["messages_folded"] if row else 0) + len(to_fold),
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }).execute()
+        self._cache[user_id] = summary
+        logger.info(f"History compacted | User: {user_id} | folded {len(to_fold)} messages")
+        return True
+
+
+summary_service = SummaryService()
@@ -0,0 +1,226 @@
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from loguru import logger
+from app.config import settings
+
+# Текущий вызов провайдера (для httpx event hooks: TTFB пишется в запись активного вызова)
+_current_call: ContextVar["CallRecord | None"] = ContextVar("llm_current_call", default=None)
+# Юзер, на которого списываются вызовы (ставится middleware / планировщиком)
+_current_user: ContextVar[int | None] = ContextVar("llm_current_user", default=None)
+
+
+@dataclass
+class CallRecord:
+    kind: str  # chat / embed / stt
+    site: str  # router.step2, rerank, extract, recall, ...
+    model: str
+    user_id: int | None
+    started: float = field(default_factory=time.perf_counter)
+    http_started: float | None = None
+    ttfb_ms: float | None = None
+    wall_ms: float = 0.0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0  # Часть prompt_tokens, прочитанная из prompt cache провайдера
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    error: str | None = None
+
+    def set_usage(self, usage):
+        if not usage:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += getattr(details, "cached_tokens", 0) or 0
+        # OpenRouter с usage accounting отдает фактическую стоимость
+        cost = getattr(usage, "cost", None)
+        if cost is not None:
+            self.cost_usd += float(cost)
+
+
+class _SiteStats:
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.wall_ms: deque[float] = deque(maxlen=window)
+        self.ttfb_ms: deque[float] = deque(maxlen=window)
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+class LLMTelemetry:
+    """
+    Телеметрия вызовов LLM / эмбеддингов / STT.
+
+    Каждый вызов оборачивается в track(): wall time, TTFB (httpx event hooks общего клиента),
+    токены и стоимость из usage, модель, место вызова и юзер.
+    В памяти — скользящие метрики по месту вызова (p50/p95), для /llm_stats.
+    В БД — дневные агрегаты по юзеру (таблица llm_usage), сбрасываются flush() по расписанию.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._sites: dict[str, _SiteStats] = {}
+        # model -> (monotonic ts, wall_ms) последних вызовов: rolling p95 для фолбэка моделей (model_router)
+        self._model_latency: dict[str, deque[tuple[float, float]]] = {}
+        # (day, user_id, site, model) -> [calls, prompt, completion, cost, wall_ms]
+        self._pending: dict[tuple, list] = {}
+
+    # --- Атрибуция ---
+
+    @staticmethod
+    def bind_user(user_id: int | None):
+        return _current_user.set(user_id)
+
+    @staticmethod
+    def reset_user(token):
+        _current_user.reset(token)
+
+    # --- Замер ---
+
+    @asynccontextmanager
+    async def track(self, kind: str, site: str, model: str, user_id: int | None = None):
+        record = CallRecord(kind=kind, site=site, model=model, user_id=user_id if user_id is not None else _current_user.get())
+        token = _current_call.set(record)
+        try:
+            yield record
+        except BaseException as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            _current_call.reset(token)
+            record.wall_ms = (time.perf_counter() - record.started) * 1000
+            self._record(record)
+
+    async def on_request(self, request):
+        """httpx event hook: момент отправки запроса (после ожидания пула)."""
+        record = _current_call.get()
+        if record is not None:
+            record.http_started = time.perf_counter()
+
+    async def on_response(self, response):
+        """httpx event hook: заголовки ответа получены (тело, в том числе stream, еще не читалось)."""
+        record = _current_call.get()
+        if record is not None and record.ttfb_ms is None:
+            record.ttfb_ms = (time.perf_counter() - (record.http_started or record.started)) * 1000
+
+    def _estimate_cost(self, record: CallRecord) -> float:
+        prices = settings.LLM_PRICES_PER_MTOK.get(record.model)
+        if not prices:
+            return 0.0
+        prompt_price, completion_price, cached_price = (list(prices) + [0.0, 0.0, None])[:3]
+        if cached_price is None:
+            cached_price = prompt_price
+        fresh_tokens = record.prompt_tokens - record.cached_tokens
+        return (fresh_tokens * prompt_price + record.cached_tokens * cached_price + record.completion_tokens * completion_price) / 1_000_000
+
+    def _record(self, record: CallRecord):
+        if not record.cost_usd:
+            record.cost_usd = self._estimate_cost(record)
+
+        stats = self._sites.setdefault(record.site, _SiteStats(self.window))
+        stats.calls += 1
+        stats.errors += 1 if record.error else 0
+        stats.prompt_tokens += record.prompt_tokens
+        stats.cached_tokens += record.cached_tokens
+        stats.completion_tokens += record.completion_tokens
+        stats.cost_usd += record.cost_usd
+        stats.wall_ms.append(record.wall_ms)
+        if record.ttfb_ms is not None:
+            stats.ttfb_ms.append(record.ttfb_ms)
+        if record.kind == "chat":
+            self._model_latency.setdefault(record.model, deque(maxlen=self.window)).append((time.monotonic(), record.wall_ms))
+
+        day = datetime.now(timezone.utc).date().isoformat()
+        key = (day, record.user_id or 0, record.site, record.model)
+        agg = self._pending.setdefault(key, [0, 0, 0, 0.0, 0.0])
+        agg[0] += 1
+        agg[1] += record.prompt_tokens
+        agg[2] += record.completion_tokens
+        agg[3] += record.cost_usd
+        agg[4] += record.wall_ms
+
+        ttfb = f"{record.ttfb_ms:.0f}ms" if record.ttfb_ms is not None else "-"
+        logger.info(
+            f"LLM Call | {record.site} | {record.model} | user={record.user_id} | wall={record.wall_ms:.0f}ms ttfb={ttfb} | "
+            f"tokens={record.prompt_tokens}+{record.completion_tokens} cached={record.cached_tokens} | ${record.cost_usd:.5f}"
+            + (f" | error={record.error}" if record.error else "")
+        )
+
+    # --- Отчеты ---
+
+    def model_p95(self, model: str, window_sec: float, min_samples: int) -> float | None:
+        """p95 wall time модели за последние window_sec секунд (None, если замеров меньше min_samples)."""
+        samples = self._model_latency.get(model)
+        if not samples:
+            return None
+        since = time.monotonic() - window_sec
+        recent = [wall for ts, wall in samples if ts >= since]
+        if len(recent) < min_samples:
+            return None
+        return _percentile(recent, 95)
+
+    def site_percentile(self, site: str, pct: float, min_samples: int) -> float | None:
+        """Перцентиль wall time места вызова по последним window замерам (None, если замеров меньше min_samples)."""
+        stats = self._sites.get(site)
+        if not stats or len(stats.wall_ms) < min_samples:
+            return None
+        return _percentile(stats.wall_ms, pct)
+
+    def snapshot(self) -> list[dict]:
+        rows = []
+        for site, stats in sorted(self._sites.items()):
+            rows.append({
+                "site": site,
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "wall_p50_ms": round(_percentile(stats.wall_ms, 50)),
+                "wall_p95_ms": round(_percentile(stats.wall_ms, 95)),
+                "ttfb_p50_ms": round(_percentile(stats.ttfb_ms, 50)),
+                "prompt_tokens": stats.prompt_tokens,
+                "cached_tokens": stats.cached_tokens,
+                "cached_pct": round(100 * stats.cached_tokens / stats.prompt_tokens) if stats.prompt_tokens else 0,
+                "completion_tokens": stats.completion_tokens,
+                "cost_usd": round(stats.cost_usd, 4),
+            })
+        return rows
+
+    async def flush(self):
+        """Сбрасывает накопленные дневные агрегаты в llm_usage (RPC record_llm_usage, инкрементальный upsert)."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [
+            {
+                "day": day, "user_id": user_id, "site": site, "model": model,
+                "calls": agg[0], "prompt_tokens": agg[1], "completion_tokens": agg[2],
+                "cost_usd": round(agg[3], 6), "wall_ms": round(agg[4]),
+            }
+            for (day, user_id, site, model), agg in pending.items()
+        ]
+        try:
+            from app.infrastructure.supabase.client import get_supabase
+            get_supabase().rpc("record_llm_usage", {"p_rows": rows}).execute()
+        except Exception as e:
+            logger.error(f"Failed to flush LLM usage ({len(rows)} rows): {e}")
+            # Возвращаем в буфер, чтобы не потерять до следующей попытки
+            for (key, agg) in pending.items():
+                current = self._pending.setdefault(key, [0, 0, 0, 0.0, 0.0])
+                for i, value in enumerate(agg):
+                    current[i] += value
+
+
+telemetry = LLMTelemetry()
@@ -0,0 +1,97 @@
+import json
+import re
+import uuid
+from loguru import logger
+from app.config import settings
+from app.services.context_builder import estimate_tokens
+
+_HANDLE_RE = re.compile(r"^#?c(\d+)$", re.IGNORECASE)
+
+
+class UnknownContactHandle(Exception):
+    """contact_id от LLM — не хэндл этого хода и не UUID (например, c1 из прошлого хода): в БД с ним не ходим."""
+
+    def __init__(self, value: str):
+        super().__init__(
+            f"Unknown contact id '{value}': handles (c1, c2, ...) are valid only within the current request. "
+            "Call search_contacts again and use the handle from its result."
+        )
+        self.value = value
+
+
+class ContactHandles:
+    """
+    Короткие хэндлы контактов на один ход агента: c1, c2, ... <-> UUID.
+
+    UUID стоит ~25 токенов и модель копирует его обратно в аргументы delete/update.
+    В результатах инструментов модель видит только хэндлы, а роутер переводит их обратно в UUID.
+    UUID, пришедший из истории ([Context Memory]), пропускается как есть.
+    """
+
+    def __init__(self):
+        self._by_id: dict[str, str] = {}
+        self._by_handle: dict[str, str] = {}
+
+    def handle(self, contact_id) -> str:
+        key = str(contact_id)
+        if key not in self._by_id:
+            handle = f"c{len(self._by_id) + 1}"
+            self._by_id[key] = handle
+            self._by_handle[handle] = key
+        return self._by_id[key]
+
+    def resolve(self, value: str | None) -> str | None:
+        """Хэндл -> UUID. Неизвестный хэндл или не-UUID — UnknownContactHandle (колонка id в БД — uuid)."""
+        if not value:
+            return value
+        value = value.strip()
+        match = _HANDLE_RE.match(value)
+        if match:
+            contact_id = self._by_handle.get(f"c{match.group(1)}")
+            if contact_id:
+                return contact_id
+            logger.warning(f"Unknown contact handle from LLM: {value}")
+            raise UnknownContactHandle(value)
+        try:
+            uuid.UUID(value)
+        except ValueError:
+            logger.warning(f"Invalid contact id from LLM: {value}")
+            raise UnknownContactHandle(value) from None
+        return value
+
+
+def _short(text: str | None, limit: int) -> str:
+    text = " ".join((text or "").split())
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1].rstrip() + "…"
+
+
+def encode_contacts(results: list, handles: ContactHandles, summary_chars: int | None = None) -> str:
+    """
+    Компактная выдача контактов для LLM: по строке на контакт.
+    Поля: хэндл, имя, обрезанное саммари, орга (только если контакт из организации).
+    """
+    summary_chars = summary_chars or settings.TOOL_SUMMARY_CHARS
+    lines = []
+    for r in results:
+        parts = [handles.handle(r.id), r.name]
+        summary = _short(r.summary, summary_chars)
+        if summary and summary != r.name:
+            parts.append(summary)
+        org_name = getattr(r, "org_name", None)
+        if org_name:
+            parts.append(f"org: {org_name}")
+        lines.append(" | ".join(parts))
+    return "\n".join(lines)
+
+
+def log_encoding_savings(fn_name: str, results: list, compact: str):
+    """Сравнивает компактную выдачу с прежним JSON (id + name + summary) — для контроля экономии."""
+    legacy = json.dumps(
+        [{"id": str(r.id), "name": r.name, "summary": r.summary} for r in results],
+        ensure_ascii=False
+    )
+    before, after = estimate_tokens(legacy), estimate_tokens(compact)
+    saved = 100 * (before - after) / before if before else 0.0
+    logger.info(f"Tool Encoding | {fn_name} | {len(results)} contacts | ~{before} -> ~{after} tokens ({saved:.0f}% saved)")
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+from loguru import logger
+from app.config import settings
+
+
+@dataclass
+class TraceRecord:
+    site: str
+    user_id: int | None
+    model: str
+    messages: list  # Снимок списка (сами сообщения не копируются и не форматируются)
+    response: Any = None  # ChatCompletion / ChatCompletionMessage как есть
+    wall_ms: float = 0.0
+    ts: float = field(default_factory=time.time)
+
+
+def _plain(value):
+    """Объекты SDK (pydantic) -> dict; вызывается только при сериализации, не на горячем пути."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+class TraceRecorder:
+    """
+    Трейсы промптов/ответов LLM вместо построчного дампа в INFO.
+
+    Пишется только выборка: юзеры из opt-in (TRACE_USER_IDS или /trace on) — всегда, остальные —
+    с вероятностью TRACE_SAMPLE_RATE. На горячем пути — только снимок ссылок в кольцевой буфер
+    (последние TRACE_BUFFER_SIZE) и в очередь; в JSON все превращается в фоне (JSONL в TRACE_DIR)
+    или при просмотре буфера. При TRACE_ENABLED=False стоимость — одна проверка флага.
+    """
+
+    def __init__(self):
+        self._buffer: deque[TraceRecord] = deque(maxlen=settings.TRACE_BUFFER_SIZE)
+        self._queue: asyncio.Queue[TraceRecord] | None = None
+        self._writer: asyncio.Task | None = None
+        self._opt_in: set[int] = set(settings.TRACE_USER_IDS)
+        self.dropped = 0
+
+    # --- Opt-in ---
+
+    def opt_in(self, user_id: int):
+        self._opt_in.add(user_id)
+
+    def opt_out(self, user_id: int):
+        self._opt_in.discard(user_id)
+
+    @property
+    def opted_in(self) -> set[int]:
+        return set(self._opt_in)
+
+    def should_trace(self, user_id: int | None) -> bool:
+        if not settings.TRACE_ENABLED:
+            return False
+        if user_id in self._opt_in:
+            return True
+        return random.random() < settings.TRACE_SAMPLE_RATE
+
+    # --- Запись ---
+
+    def record(self, site: str, user_id: int | None, model: str, messages: list, response=None, wall_ms: float = 0.0):
+        if not self.should_trace(user_id):
+            return
+        # list(...) — список сообщений роутера дальше дополняется, фиксируем состав на момент вызова
+        trace = TraceRecord(site=site, user_id=user_id, model=model, messages=list(messages), response=response, wall_ms=wall_ms)
+        self._buffer.append(trace)
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(trace)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def recent(self, limit: int = 10, user_id: int | None = None) -> list[dict]:
+        records = [r for r in self._buffer if user_id is None or r.user_id == user_id]
+        return [self.serialize(r) for r in records[-limit:]]
+
+    @staticmethod
+    def serialize(record: TraceRecord) -> dict:
+        return {
+            "ts": datetime.fromtimestamp(record.ts, timezone.utc).isoformat(),
+            "site": record.site,
+            "user_id": record.user_id,
+            "model": record.model,
+            "wall_ms": round(record.wall_ms),
+            "messages": _plain(record.messages),
+            "response": _plain(record.response),
+        }
+
+    # --- JSONL sink ---
+
+    def start(self):
+        """Запускает фоновую запись в TRACE_DIR (без TRACE_DIR трейсы живут только в буфере)."""
+        if not settings.TRACE_ENABLED or not settings.TRACE_DIR or self._writer is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.TRACE_QUEUE_SIZE)
+        self._writer = asyncio.create_task(self._write_loop())
+        logger.info(f"Trace recorder started | dir={settings.TRACE_DIR} | sample={settings.TRACE_SAMPLE_RATE} | opt-in={len(self._opt_in)}")
+
+    async def stop(self):
+        if self._writer is None:
+            return
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        await self._write(self._take_all())
+        self._writer = None
+        self._queue = None
+
+    async def _write_loop(self):
+        while True:
+            first = await self._queue.get()
+            try:
+                await self._write([first] + self._take_all())
+            except Exception as e:
+                logger.error(f"Trace write failed: {e}")
+
+    def _take_all(self) -> list[TraceRecord]:
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write(self, batch: list[TraceRecord]):
+        if batch:
+            # Сериализация и запись — в потоке, event loop не ждет ни json.dumps, ни диска
+            await asyncio.to_thread(self._append, batch)
+
+    def _append(self, batch: list[TraceRecord]):
+        lines = [json.dumps(self.serialize(r), ensure_ascii=False, default=str) for r in batch]
+        path = Path(settings.TRACE_DIR) / f"llm-{datetime.now(timezone.utc).date().isoformat()}.jsonl"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+trace_recorder = TraceRecorder()
@@ -57,28 +57,31 @@ class UserService:
     async def update_bio(self, user_id: int, bio: str) -> bool:
         return await self.update_user_field(user_id, "bio", bio)
 
+    @staticmethod
+    def plan_of(user: UserInDB | None) -> str:
+        """Тариф уже загруженного юзера: "pro" (подписка или триал) или "free"."""
+        now = datetime.now(timezone.utc)
+        if user and ((user.pro_until and user.pro_until > now) or (user.trial_ends_at and user.trial_ends_at > now)):
+            return "pro"
+        return "free"
+
+    @staticmethod
+    def history_depth(plan: str) -> int:
+        """Сколько последних сообщений истории агент видит как есть (более старые — только в резюме)."""
+        return settings.CHAT_HISTORY_DEPTH if plan == "pro" else settings.FREE_CHAT_HISTORY_DEPTH
+
     async def is_pro(self, user_id: int) -> bool:
         """
         Check if user has an active Pro subscription OR active Trial.
         """
         user = await self.get_user(user_id)
-        if not user:
-            return False
-        
-        now = datetime.now(timezone.utc)
-        
-        # 1. Check Paid Subscription
-        if user.pro_until and user.pro_until > now:
-            logger.debug(f"User {user_id} is PRO (Paid until {user.pro_until})")
-            return True
-            
-        # 2. Check Trial
-        if user.trial_ends_at and user.trial_ends_at > now:
-            logger.debug(f"User {user_id} is PRO (Trial until {user.trial_ends_at})")
-            return True
-        
-        logger.debug(f"User {user_id} is FREE (Trial ends: {user.trial_ends_at}, Pro until: {user.pro_until}, Now: {now})")
-        return False
+        pro = self.plan_of(user) == "pro"
+        if user:
+            logger.debug(
+                f"User {user_id} is {'PRO' if pro else 'FREE'} "
+                f"(Trial ends: {user.trial_ends_at}, Pro until: {user.pro_until})"
+            )
+        return pro
 
     async def update_subscription(self, user_id: int, days: int) -> bool:
         """
@@ -195,6 +198,9 @@ class UserService:
                 self.supabase.table("contacts").delete().eq("user_id", user_id).execute()
             except Exception as e:
                 logger.error(f"Error deleting contacts: {e}")
+            finally:
+                from app.services.search_service import search_service
+                search_service.name_index.invalidate(user_id)
 
             # 2. Delete Chat History
             try:
@@ -226,12 +232,7 @@ class UserService:
         Учитывает Pro-статус для определения глубины контекста.
         """
         try:
-            is_pro = await self.is_pro(user_id)
-            
-            if is_pro:
-                limit = settings.CHAT_HISTORY_DEPTH # 10-20
-            else:
-                limit = 3 # "Короткая память" для Free
+            limit = self.history_depth(self.plan_of(await self.get_user(user_id)))
                 
             # Вызываем RPC функцию
             response = self.supabase.rpc("get_chat_history", {
@@ -263,6 +264,10 @@ class UserService:
                 "content": content
             }
             self.supabase.table("chat_history").insert(data).execute()
+
+            # ЛОКАЛЬНЫЙ ИМПОРТ: счетчик для фоновой компакции истории
+            from app.services.summary_service import summary_service
+            summary_service.note_message(user_id)
         except Exception as e:
             # Suppress Foreign Key violation error (happens if user deleted account or not started yet)
             if "violates foreign key constraint" in str(e):
@@ -280,6 +285,10 @@ class UserService:
         except Exception as e:
             logger.error(f"Failed to clear chat history: {e}")
 
+        # Резюме старой истории тоже больше не актуально
+        from app.services.summary_service import summary_service
+        await summary_service.clear(user_id)
+
     async def delete_last_messages(self, user_id: int, count: int) -> int:
         """
         Удаляет последние N сообщений из истории.
@@ -0,0 +1,107 @@
+import re
+import time
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+from loguru import logger
+
+TELEGRAM_TEXT_LIMIT = 4096
+
+_TAG_RE = re.compile(r"<[^>]*>?")
+
+
+class MessageStreamer:
+    """
+    Прогрессивный вывод ответа LLM в один Telegram-ответ.
+    Usage:
+        streamer = MessageStreamer(message)
+        await streamer.push(text_so_far)   # на каждый чанк, edit троттлится
+        delivered = await streamer.finish(final_text)
+
+    Пока ответ не закончен, HTML может быть "порван" посередине тега,
+    поэтому промежуточные версии уходят plain-текстом без тегов, а финальная —
+    с parse_mode HTML (и откатом на plain, если Telegram не смог его разобрать).
+    """
+    def __init__(self, message: types.Message, min_chars: int = 100, interval_sec: float = 1.0):
+        self.message = message
+        self.min_chars = min_chars
+        self.interval_sec = interval_sec
+        self.sent: types.Message | None = None
+        self.delivered = False
+        self._last_edit = 0.0
+        self._last_text = ""
+
+    @property
+    def started(self) -> bool:
+        return self.sent is not None
+
+    @staticmethod
+    def _preview(text: str) -> str:
+        return _TAG_RE.sub("", text)[:TELEGRAM_TEXT_LIMIT]
+
+    async def push(self, text: str):
+        if not self.started and len(text) < self.min_chars:
+            return
+        if self.started and time.monotonic() - self._last_edit < self.interval_sec:
+            return
+
+        preview = self._preview(text) + " ▌"
+        if preview == self._last_text:
+            return
+        try:
+            if not self.started:
+                self.sent = await self.message.reply(preview, parse_mode=None)
+            else:
+                await self.sent.edit_text(preview, parse_mode=None)
+            self._last_text = preview
+        except TelegramBadRequest as e:
+            # "message is not modified" и подобное — просто пропускаем кадр
+            logger.debug(f"Stream edit skipped: {e}")
+        except Exception as e:
+            logger.warning(f"Stream edit failed: {e}")
+        self._last_edit = time.monotonic()
+
+    async def finish(self, text: str) -> bool:
+        """
+        Финальная версия сообщения. False — стрим не начинался (или текст не влез в одно сообщение),
+        ответ нужно отправить обычным путем.
+        """
+        if not self.started:
+            return False
+        if not text or len(text) > TELEGRAM_TEXT_LIMIT:
+            await self.abort()
+            return False
+
+        try:
+            await self.sent.edit_text(text)
+        except TelegramBadRequest as e:
+            if "not modified" not in str(e):
+                logger.warning(f"Failed to finalize streamed text with HTML: {e}. Sending plain text.")
+                if not await self._edit_plain(text):
+                    return False
+        except Exception as e:
+            logger.warning(f"Failed to finalize streamed text: {e}. Falling back to a new message.")
+            await self.abort()
+            return False
+        self.delivered = True
+        return True
+
+    async def _edit_plain(self, text: str) -> bool:
+        """Финал без разметки; не вышло — недописанное сообщение убирается, ответ уйдет обычным путем."""
+        try:
+            await self.sent.edit_text(text, parse_mode=None)
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to finalize streamed text as plain text: {e}. Falling back to a new message.")
+            await self.abort()
+            return False
+
+    async def abort(self):
+        """Убирает недописанное сообщение (например, модель в итоге ушла в вызов инструмента)."""
+        if not self.started:
+            return
+        try:
+            await self.sent.delete()
+        except Exception as e:
+            logger.warning(f"Failed to delete streamed message: {e}")
+        self.sent = None
+        self._last_text = ""
@@ -0,0 +1,4 @@
+-- idx_contacts_meta_gin (meta jsonb_path_ops) создавался ранней версией fix_search_meta_filters_v7.sql.
+-- Фильтры role/company/interest — ILIKE по триграммным индексам, containment meta @> '{...}' не используется:
+-- индекс только удорожал запись контактов.
+DROP INDEX IF EXISTS idx_contacts_meta_gin;
@@ -0,0 +1,222 @@
+-- Denormalized access list for search (multi-tenant orgs)
+-- Раньше search_hybrid и match_contacts для каждой строки-кандидата делали
+-- LEFT JOIN organization_members + organizations. С ростом орг (тысячи общих контактов)
+-- это основной расход поиска.
+--
+-- Теперь у контакта есть:
+--   allowed_user_ids BIGINT[] — кто видит контакт в поиске (владелец личного контакта
+--                               или участники орги со статусом approved/pending);
+--   org_name TEXT             — название организации (для выдачи и текстового поиска).
+-- Оба поля поддерживаются триггерами на contacts, organization_members и organizations.
+-- RPC сканируют только строки юзера через GIN-индекс по allowed_user_ids, без JOIN.
+
+-- 1. Колонки
+ALTER TABLE contacts ADD COLUMN IF NOT EXISTS allowed_user_ids BIGINT[] NOT NULL DEFAULT '{}';
+ALTER TABLE contacts ADD COLUMN IF NOT EXISTS org_name TEXT;
+
+-- 2. Контакт: ACL считается при вставке и при смене владельца/организации
+CREATE OR REPLACE FUNCTION contacts_set_acl()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF NEW.org_id IS NULL THEN
+    NEW.allowed_user_ids := ARRAY[NEW.user_id];
+    NEW.org_name := NULL;
+  ELSE
+    SELECT coalesce(array_agg(om.user_id), '{}')
+      INTO NEW.allowed_user_ids
+      FROM organization_members om
+     WHERE om.org_id = NEW.org_id
+       AND om.status IN ('approved', 'pending');
+
+    SELECT o.name INTO NEW.org_name FROM organizations o WHERE o.id = NEW.org_id;
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_contacts_set_acl ON contacts;
+CREATE TRIGGER trg_contacts_set_acl
+  BEFORE INSERT OR UPDATE OF user_id, org_id ON contacts
+  FOR EACH ROW EXECUTE FUNCTION contacts_set_acl();
+
+-- 3. Участник орги: добавляем/убираем одного юзера из ACL контактов этой орги
+CREATE OR REPLACE FUNCTION contacts_acl_sync_member(p_org_id UUID, p_user_id BIGINT)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_has_access BOOLEAN;
+BEGIN
+  SELECT EXISTS (
+    SELECT 1 FROM organization_members
+     WHERE org_id = p_org_id
+       AND user_id = p_user_id
+       AND status IN ('approved', 'pending')
+  ) INTO v_has_access;
+
+  IF v_has_access THEN
+    UPDATE contacts
+       SET allowed_user_ids = array_append(allowed_user_ids, p_user_id)
+     WHERE org_id = p_org_id
+       AND NOT (allowed_user_ids @> ARRAY[p_user_id]);
+  ELSE
+    UPDATE contacts
+       SET allowed_user_ids = array_remove(allowed_user_ids, p_user_id)
+     WHERE org_id = p_org_id
+       AND allowed_user_ids @> ARRAY[p_user_id];
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION organization_members_sync_acl()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM contacts_acl_sync_member(OLD.org_id, OLD.user_id);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM contacts_acl_sync_member(NEW.org_id, NEW.user_id);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_organization_members_sync_acl ON organization_members;
+CREATE TRIGGER trg_organization_members_sync_acl
+  AFTER INSERT OR UPDATE OF status, org_id, user_id OR DELETE ON organization_members
+  FOR EACH ROW EXECUTE FUNCTION organization_members_sync_acl();
+
+-- 4. Переименование орги
+CREATE OR REPLACE FUNCTION organizations_sync_contact_org_name()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  UPDATE contacts SET org_name = NEW.name WHERE org_id = NEW.id;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_organizations_sync_contact_org_name ON organizations;
+CREATE TRIGGER trg_organizations_sync_contact_org_name
+  AFTER UPDATE OF name ON organizations
+  FOR EACH ROW
+  WHEN (OLD.name IS DISTINCT FROM NEW.name)
+  EXECUTE FUNCTION organizations_sync_contact_org_name();
+
+-- 5. Backfill существующих контактов
+UPDATE contacts
+   SET allowed_user_ids = ARRAY[user_id],
+       org_name = NULL
+ WHERE org_id IS NULL;
+
+UPDATE contacts c
+   SET allowed_user_ids = coalesce((
+         SELECT array_agg(om.user_id)
+           FROM organization_members om
+          WHERE om.org_id = c.org_id
+            AND om.status IN ('approved', 'pending')
+       ), '{}'),
+       org_name = (SELECT o.name FROM organizations o WHERE o.id = c.org_id)
+ WHERE c.org_id IS NOT NULL;
+
+-- 6. Индекс доступа
+CREATE INDEX IF NOT EXISTS idx_contacts_allowed_users
+  ON contacts USING gin (allowed_user_ids)
+  WHERE is_archived = false;
+
+-- 7. RPC без JOIN (сигнатуры из fix_search_meta_filters_v7.sql не меняются)
+CREATE OR REPLACE FUNCTION search_hybrid(
+  p_user_id BIGINT,
+  p_query TEXT,
+  p_limit INT DEFAULT 20,
+  p_org_id UUID DEFAULT NULL,
+  p_role TEXT DEFAULT NULL,
+  p_company TEXT DEFAULT NULL,
+  p_interest TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    summary TEXT,
+    meta JSONB,
+    org_id UUID,
+    org_name TEXT
+)
+LANGUAGE sql
+AS $$
+  SELECT
+    c.id, c.name, c.summary, c.meta, c.org_id, c.org_name
+  FROM contacts c
+  WHERE
+    c.allowed_user_ids @> ARRAY[p_user_id]
+    AND
+    (
+      coalesce(p_query, '') = ''
+      OR c.name ILIKE '%' || p_query || '%'
+      OR c.summary ILIKE '%' || p_query || '%'
+      OR c.org_name ILIKE '%' || p_query || '%'
+    )
+    AND (p_org_id IS NULL OR c.org_id = p_org_id)
+    AND (p_role IS NULL OR lower(c.meta->>'role') LIKE '%' || lower(p_role) || '%')
+    AND (p_company IS NULL OR lower(c.meta->>'company') LIKE '%' || lower(p_company) || '%')
+    AND (p_interest IS NULL OR lower(c.meta->>'interests') LIKE '%' || lower(p_interest) || '%')
+    AND c.is_archived = false
+  ORDER BY
+    (c.name ILIKE p_query) DESC,
+    (c.name ILIKE p_query || '%') DESC,
+    (c.name ILIKE '%' || p_query || '%') DESC,
+    c.created_at DESC,
+    c.id DESC
+  LIMIT p_limit;
+$$;
+
+CREATE OR REPLACE FUNCTION match_contacts(
+  query_embedding vector(1536),
+  match_user_id bigint,
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 10,
+  p_org_id uuid DEFAULT NULL,
+  p_role text DEFAULT NULL,
+  p_company text DEFAULT NULL,
+  p_interest text DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  name text,
+  summary text,
+  meta jsonb,
+  org_id uuid,
+  org_name text,
+  distance float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    c.id,
+    c.name,
+    c.summary,
+    c.meta,
+    c.org_id,
+    c.org_name,
+    1 - (c.embedding <=> query_embedding) AS distance
+  FROM contacts c
+  WHERE
+    c.allowed_user_ids @> ARRAY[match_user_id]
+    AND (p_org_id IS NULL OR c.org_id = p_org_id)
+    AND (p_role IS NULL OR lower(c.meta->>'role') LIKE '%' || lower(p_role) || '%')
+    AND (p_company IS NULL OR lower(c.meta->>'company') LIKE '%' || lower(p_company) || '%')
+    AND (p_interest IS NULL OR lower(c.meta->>'interests') LIKE '%' || lower(p_interest) || '%')
+    AND c.is_archived = false
+    AND c.embedding IS NOT NULL
+    AND 1 - (c.embedding <=> query_embedding) > match_threshold
+  ORDER BY c.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
@@ -0,0 +1,126 @@
+-- Structured filters (role: / company: / interest: / org:) для search_hybrid и match_contacts
+-- 1. Триграммные GIN-индексы по role/company/interests, чтобы ILIKE '%...%' не сканировал всю таблицу.
+--    (containment meta @> '{...}' фильтры не используют, GIN jsonb_path_ops по meta не нужен)
+-- 2. Обе RPC получают необязательные фильтры. Фильтры применяются в WHERE,
+--    поэтому и лексический, и векторный этап работают по уже отфильтрованному набору.
+-- 3. search_hybrid с пустым p_query + фильтрами = "все контакты, подходящие под фильтры".
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_contacts_meta_role_trgm
+  ON contacts USING gin (lower(meta->>'role') gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_contacts_meta_company_trgm
+  ON contacts USING gin (lower(meta->>'company') gin_trgm_ops);
+
+-- interests — JSON-массив; ищем подстроку в его текстовом представлении
+CREATE INDEX IF NOT EXISTS idx_contacts_meta_interests_trgm
+  ON contacts USING gin (lower(meta->>'interests') gin_trgm_ops);
+
+-- Сигнатуры меняются, удаляем старые версии (иначе PGRST203)
+DROP FUNCTION IF EXISTS search_hybrid(BIGINT, TEXT, INT);
+DROP FUNCTION IF EXISTS match_contacts(vector, bigint, float, int);
+
+CREATE OR REPLACE FUNCTION search_hybrid(
+  p_user_id BIGINT,
+  p_query TEXT,
+  p_limit INT DEFAULT 20,
+  p_org_id UUID DEFAULT NULL,
+  p_role TEXT DEFAULT NULL,
+  p_company TEXT DEFAULT NULL,
+  p_interest TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    summary TEXT,
+    meta JSONB,
+    org_id UUID,
+    org_name TEXT
+)
+LANGUAGE sql
+AS $$
+  SELECT
+    c.id, c.name, c.summary, c.meta, c.org_id, o.name as org_name
+  FROM contacts c
+  LEFT JOIN organization_members om ON c.org_id = om.org_id AND om.user_id = p_user_id
+  LEFT JOIN organizations o ON c.org_id = o.id
+  WHERE
+    (
+      (c.user_id = p_user_id AND c.org_id IS NULL)
+      OR
+      (om.user_id IS NOT NULL AND om.status IN ('approved', 'pending'))
+    )
+    AND
+    (
+      coalesce(p_query, '') = ''
+      OR c.name ILIKE '%' || p_query || '%'
+      OR c.summary ILIKE '%' || p_query || '%'
+      OR o.name ILIKE '%' || p_query || '%'
+    )
+    -- Structured filters
+    AND (p_org_id IS NULL OR c.org_id = p_org_id)
+    AND (p_role IS NULL OR lower(c.meta->>'role') LIKE '%' || lower(p_role) || '%')
+    AND (p_company IS NULL OR lower(c.meta->>'company') LIKE '%' || lower(p_company) || '%')
+    AND (p_interest IS NULL OR lower(c.meta->>'interests') LIKE '%' || lower(p_interest) || '%')
+    AND c.is_archived = false
+  ORDER BY
+    (c.name ILIKE p_query) DESC,
+    (c.name ILIKE p_query || '%') DESC,
+    (c.name ILIKE '%' || p_query || '%') DESC,
+    c.created_at DESC,
+    c.id DESC
+  LIMIT p_limit;
+$$;
+
+CREATE OR REPLACE FUNCTION match_contacts(
+  query_embedding vector(1536),
+  match_user_id bigint,
+  match_threshold float DEFAULT 0.5,
+  match_count int DEFAULT 10,
+  p_org_id uuid DEFAULT NULL,
+  p_role text DEFAULT NULL,
+  p_company text DEFAULT NULL,
+  p_interest text DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  name text,
+  summary text,
+  meta jsonb,
+  org_id uuid,
+  org_name text,
+  distance float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    c.id,
+    c.name,
+    c.summary,
+    c.meta,
+    c.org_id,
+    o.name as org_name,
+    1 - (c.embedding <=> query_embedding) AS distance
+  FROM contacts c
+  LEFT JOIN organization_members om ON c.org_id = om.org_id AND om.user_id = match_user_id
+  LEFT JOIN organizations o ON c.org_id = o.id
+  WHERE
+    (
+      (c.user_id = match_user_id AND c.org_id IS NULL)
+      OR
+      (om.user_id IS NOT NULL AND om.status IN ('approved', 'pending'))
+    )
+    AND (p_org_id IS NULL OR c.org_id = p_org_id)
+    AND (p_role IS NULL OR lower(c.meta->>'role') LIKE '%' || lower(p_role) || '%')
+    AND (p_company IS NULL OR lower(c.meta->>'company') LIKE '%' || lower(p_company) || '%')
+    AND (p_interest IS NULL OR lower(c.meta->>'interests') LIKE '%' || lower(p_interest) || '%')
+    AND c.is_archived = false
+    AND c.embedding IS NOT NULL
+    AND 1 - (c.embedding <=> query_embedding) > match_threshold
+  ORDER BY c.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
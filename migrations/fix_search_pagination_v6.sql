@@ -0,0 +1,62 @@
+-- Pagination support (Keyset listing + stable ranking for search_hybrid)
+-- 1. search_hybrid получает p_limit и детерминированный ORDER BY.
+--    Раньше был LIMIT 20 без сортировки: состав выдачи зависел от плана запроса,
+--    и "следующую страницу" невозможно было определить.
+-- 2. Индексы под keyset-листинг (created_at DESC, id DESC) для личных и орговых контактов.
+
+-- Сигнатура меняется (новый параметр), поэтому сначала удаляем старую версию,
+-- иначе PostgREST увидит две перегрузки (Error PGRST203).
+DROP FUNCTION IF EXISTS search_hybrid(BIGINT, TEXT);
+
+CREATE OR REPLACE FUNCTION search_hybrid(
+  p_user_id BIGINT, 
+  p_query TEXT,
+  p_limit INT DEFAULT 20
+) 
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    summary TEXT,
+    meta JSONB,
+    org_id UUID,
+    org_name TEXT
+) 
+LANGUAGE sql 
+AS $$
+  SELECT 
+    c.id, c.name, c.summary, c.meta, c.org_id, o.name as org_name
+  FROM contacts c
+  LEFT JOIN organization_members om ON c.org_id = om.org_id AND om.user_id = p_user_id
+  LEFT JOIN organizations o ON c.org_id = o.id
+  WHERE 
+    (
+      (c.user_id = p_user_id AND c.org_id IS NULL)
+      OR
+      (om.user_id IS NOT NULL AND om.status IN ('approved', 'pending'))
+    )
+    AND 
+    (
+      c.name ILIKE '%' || p_query || '%' 
+      OR c.summary ILIKE '%' || p_query || '%'
+      OR o.name ILIKE '%' || p_query || '%'
+    )
+    AND c.is_archived = false
+  ORDER BY
+    -- Сначала точное совпадение имени, потом совпадение по началу имени, потом по имени вообще
+    (c.name ILIKE p_query) DESC,
+    (c.name ILIKE p_query || '%') DESC,
+    (c.name ILIKE '%' || p_query || '%') DESC,
+    c.created_at DESC,
+    c.id DESC
+  LIMIT p_limit;
+$$;
+
+-- Keyset-листинг личных контактов: WHERE user_id = ? AND is_archived = false ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_contacts_user_listing
+  ON contacts(user_id, created_at DESC, id DESC)
+  WHERE is_archived = false;
+
+-- Keyset-листинг контактов организации (org:Name)
+CREATE INDEX IF NOT EXISTS idx_contacts_org_listing
+  ON contacts(org_id, created_at DESC, id DESC)
+  WHERE is_archived = false;
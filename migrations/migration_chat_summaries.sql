@@ -0,0 +1,12 @@
+-- Rolling summary истории чата.
+-- Старые сообщения сворачиваются в одну строку на юзера (app/services/summary_service.py),
+-- Router-агент получает ее перед последними N сырыми сообщениями.
+
+CREATE TABLE IF NOT EXISTS chat_summaries (
+    user_id BIGINT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    -- created_at последнего свернутого сообщения: следующая компакция берет строки строго после него
+    covered_until TIMESTAMP WITH TIME ZONE NOT NULL,
+    messages_folded INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now())
+);
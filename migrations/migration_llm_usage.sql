@@ -0,0 +1,43 @@
+-- Дневная стоимость и латентность вызовов LLM / эмбеддингов / STT по юзерам.
+-- Пишется батчами из app/services/telemetry.py (RPC record_llm_usage), user_id = 0 — вызовы без юзера.
+-- Без FK на users: статистика должна переживать удаление аккаунта.
+
+CREATE TABLE IF NOT EXISTS llm_usage (
+    day DATE NOT NULL,
+    user_id BIGINT NOT NULL,
+    site TEXT NOT NULL,  -- router.step1, rerank, extract, recall, embed, stt, ...
+    model TEXT NOT NULL,
+    calls INT NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(12, 6) NOT NULL DEFAULT 0,
+    wall_ms BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id, site, model)
+);
+
+-- Топ юзеров по стоимости за день (/llm_stats)
+CREATE INDEX IF NOT EXISTS idx_llm_usage_day_cost ON llm_usage(day, cost_usd DESC);
+
+CREATE OR REPLACE FUNCTION record_llm_usage(p_rows JSONB)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO llm_usage AS u (day, user_id, site, model, calls, prompt_tokens, completion_tokens, cost_usd, wall_ms)
+    SELECT
+        (r->>'day')::date,
+        (r->>'user_id')::bigint,
+        r->>'site',
+        r->>'model',
+        (r->>'calls')::int,
+        (r->>'prompt_tokens')::bigint,
+        (r->>'completion_tokens')::bigint,
+        (r->>'cost_usd')::numeric,
+        (r->>'wall_ms')::bigint
+    FROM jsonb_array_elements(p_rows) AS r
+    ON CONFLICT (day, user_id, site, model) DO UPDATE SET
+        calls = u.calls + EXCLUDED.calls,
+        prompt_tokens = u.prompt_tokens + EXCLUDED.prompt_tokens,
+        completion_tokens = u.completion_tokens + EXCLUDED.completion_tokens,
+        cost_usd = u.cost_usd + EXCLUDED.cost_usd,
+        wall_ms = u.wall_ms + EXCLUDED.wall_ms;
+$$;
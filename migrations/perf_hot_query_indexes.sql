@@ -0,0 +1,27 @@
+-- Индексы под горячие запросы бота.
+-- Проверка: scripts/explain_hot_queries.py (EXPLAIN ANALYZE на локальном Postgres, падает на Seq Scan).
+--
+-- Уже покрыто ранее (здесь не дублируем):
+--   contacts(user_id)                                 — schema.sql (count, delete, name index load)
+--   contacts(user_id, created_at DESC, id DESC)       — fix_search_pagination_v6.sql (get_recent_contacts)
+--   contacts(org_id, created_at DESC, id DESC)        — fix_search_pagination_v6.sql (org: листинг)
+--   contacts USING gin (allowed_user_ids)             — fix_search_acl_v8.sql (search_hybrid / match_contacts)
+--   chat_history(user_id, created_at DESC)            — migration_history.sql (get_chat_history, delete по user_id)
+
+-- 1. Recall: WHERE user_id = ? AND is_archived = false ORDER BY last_interaction ASC NULLS FIRST LIMIT 20
+CREATE INDEX IF NOT EXISTS idx_contacts_recall
+  ON contacts(user_id, last_interaction ASC NULLS FIRST)
+  WHERE is_archived = false;
+
+-- 2. Проверка членства: WHERE user_id = ? AND org_id = ? (create, get_contact_by_id, лимиты поиска)
+CREATE INDEX IF NOT EXISTS idx_org_members_user_org
+  ON organization_members(user_id, org_id);
+
+-- 3. Заявки на вступление (WHERE status = 'pending' AND org_id IN (...))
+--    и пересчет ACL контактов по org_id (триггер contacts_set_acl)
+CREATE INDEX IF NOT EXISTS idx_org_members_org_status
+  ON organization_members(org_id, status);
+
+-- 4. Организации владельца (админка заявок, проверка is_org_owner)
+CREATE INDEX IF NOT EXISTS idx_organizations_owner
+  ON organizations(owner_id);
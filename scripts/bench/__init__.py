@@ -0,0 +1,4 @@
+"""
+Офлайн-стенд для бенчмарков NetWho: синтетический корпус, размеченные запросы
+и заглушки БД/эмбеддингов/LLM, чтобы гонять поиск без Supabase и OpenRouter.
+"""
@@ -0,0 +1,184 @@
+"""
+Генератор синтетического корпуса контактов и размеченного набора запросов.
+
+Корпус детерминирован по seed: одинаковые параметры дают одинаковые контакты,
+поэтому отчеты разных прогонов можно сравнивать между собой.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+FIRST_NAMES_RU = [
+    "Александр", "Дмитрий", "Сергей", "Андрей", "Михаил", "Иван", "Павел", "Никита",
+    "Екатерина", "Анна", "Мария", "Ольга", "Татьяна", "Юлия", "Наталья", "Камиль",
+]
+LAST_NAMES_RU = [
+    "Петров", "Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов",
+    "Новиков", "Морозов", "Волков", "Зайцев",
+]
+FIRST_NAMES_EN = ["Alex", "John", "Michael", "Kate", "Julia", "Peter", "Nick", "Helen"]
+LAST_NAMES_EN = ["Smith", "Brown", "Miller", "Wilson", "Taylor", "Clark"]
+
+# Роль -> синонимы, которыми ее ищут люди (лексически не совпадают с названием роли)
+ROLES = {
+    "CTO": ["технический директор", "техдир"],
+    "Go developer": ["гошник", "golang"],
+    "Product Manager": ["продакт", "продукт"],
+    "Designer": ["дизайнер", "UX"],
+    "Investor": ["инвестор", "венчур"],
+    "Data Scientist": ["датасаентист", "машинное обучение"],
+    "Marketing Lead": ["маркетолог", "маркетинг"],
+    "Lawyer": ["юрист", "адвокат"],
+    "Recruiter": ["рекрутер", "эйчар"],
+    "Frontend developer": ["фронтендер", "React"],
+}
+
+COMPANIES = ["Яндекс", "Сбер", "Тинькофф", "Ozon", "Avito", "Google", "VK", "Wildberries", "Kaspersky"]
+
+INTERESTS = {
+    "крипта": ["блокчейн", "crypto"],
+    "рыбалка": ["рыбак"],
+    "сноуборд": ["горные лыжи"],
+    "шахматы": ["chess"],
+    "AI": ["нейросети", "LLM"],
+    "инвестиции": ["фондовый рынок"],
+}
+
+ORGS = ["skop", "Python Heroes", "Founders Club"]
+
+
+def _person(rng: random.Random) -> str:
+    if rng.random() < 0.75:
+        return f"{rng.choice(FIRST_NAMES_RU)} {rng.choice(LAST_NAMES_RU)}"
+    return f"{rng.choice(FIRST_NAMES_EN)} {rng.choice(LAST_NAMES_EN)}"
+
+
+def generate_corpus(n_contacts: int = 1000, n_users: int = 20, seed: int = 42) -> dict:
+    """
+    Возвращает {"users": [...], "orgs": [...], "members": [...], "contacts": [...]}.
+    Строки contacts имеют ту же форму, что и в Supabase, включая денормализованные
+    allowed_user_ids/org_name (migrations/fix_search_acl_v8.sql); embedding заполняется стабом позже.
+    """
+    rng = random.Random(seed)
+    base_id = 10_000_000
+    users = [{"id": base_id + i, "full_name": _person(rng)} for i in range(n_users)]
+
+    orgs = []
+    members = []
+    for i, name in enumerate(ORGS):
+        org_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        owner = users[i % n_users]["id"]
+        orgs.append({"id": org_id, "name": name, "owner_id": owner})
+        # Примерно треть юзеров в каждой орге, часть — pending
+        for user in users:
+            if user["id"] == owner or rng.random() < 0.33:
+                status = "approved" if user["id"] == owner or rng.random() < 0.8 else "pending"
+                members.append({
+                    "user_id": user["id"],
+                    "org_id": org_id,
+                    "status": status,
+                    "free_searches_used": 0,
+                    "organizations": {"name": name},
+                })
+
+    member_orgs: dict[int, list[dict]] = {}
+    for m in members:
+        member_orgs.setdefault(m["user_id"], []).append(next(o for o in orgs if o["id"] == m["org_id"]))
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    contacts = []
+    for i in range(n_contacts):
+        owner = rng.choice(users)["id"]
+        role = rng.choice(list(ROLES))
+        company = rng.choice(COMPANIES)
+        interests = rng.sample(list(INTERESTS), k=2)
+        name = _person(rng)
+
+        org = None
+        if member_orgs.get(owner) and rng.random() < 0.25:
+            org = rng.choice(member_orgs[owner])
+
+        summary = f"{name} — {role} в {company}. Интересы: {', '.join(interests)}."
+        if org:
+            allowed = [m["user_id"] for m in members if m["org_id"] == org["id"] and m["status"] in ("approved", "pending")]
+        else:
+            allowed = [owner]
+        contacts.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": owner,
+            "name": name,
+            "summary": summary,
+            "raw_text": summary,
+            "meta": {"role": role, "company": company, "interests": interests},
+            "org_id": org["id"] if org else None,
+            "org_name": org["name"] if org else None,
+            "allowed_user_ids": allowed,
+            "created_at": (start + timedelta(minutes=i)).isoformat(),
+            "last_interaction": None,
+            "reminder_at": None,
+            "is_archived": rng.random() < 0.03,
+        })
+
+    return {"users": users, "orgs": orgs, "members": members, "contacts": contacts}
+
+
+def accessible_contacts(corpus: dict, user_id: int) -> list[dict]:
+    """Контакты, которые юзер видит в поиске (считается по членству, а не по allowed_user_ids)."""
+    org_ids = {
+        m["org_id"] for m in corpus["members"]
+        if m["user_id"] == user_id and m["status"] in ("approved", "pending")
+    }
+    return [
+        c for c in corpus["contacts"]
+        if not c["is_archived"] and (
+            (c["user_id"] == user_id and c["org_id"] is None) or c["org_id"] in org_ids
+        )
+    ]
+
+
+def generate_queries(corpus: dict, n_users: int = 5, seed: int = 7) -> list[dict]:
+    """
+    Размеченные запросы: {"user_id", "query", "type", "relevant": [contact_id, ...]}.
+    Типы: name (точное имя), role (название роли), synonym (синоним роли — только семантика),
+    company, interest, filter (структурные фильтры role:/company:).
+    """
+    rng = random.Random(seed)
+    users = [u["id"] for u in corpus["users"]]
+    queries = []
+
+    for user_id in rng.sample(users, k=min(n_users, len(users))):
+        visible = accessible_contacts(corpus, user_id)
+        if not visible:
+            continue
+
+        for contact in rng.sample(visible, k=min(3, len(visible))):
+            relevant = [c["id"] for c in visible if c["name"] == contact["name"]]
+            queries.append({"user_id": user_id, "query": contact["name"], "type": "name", "relevant": relevant})
+
+        for role in rng.sample(list(ROLES), k=3):
+            relevant = [c["id"] for c in visible if c["meta"]["role"] == role]
+            if not relevant:
+                continue
+            queries.append({"user_id": user_id, "query": role, "type": "role", "relevant": relevant})
+            queries.append({
+                "user_id": user_id, "query": rng.choice(ROLES[role]), "type": "synonym", "relevant": relevant
+            })
+
+        for company in rng.sample(COMPANIES, k=2):
+            relevant = [c["id"] for c in visible if c["meta"]["company"] == company]
+            if relevant:
+                queries.append({"user_id": user_id, "query": company, "type": "company", "relevant": relevant})
+
+        for contact in rng.sample(visible, k=min(2, len(visible))):
+            role, company = contact["meta"]["role"], contact["meta"]["company"]
+            relevant = [c["id"] for c in visible if c["meta"]["role"] == role and c["meta"]["company"] == company]
+            queries.append({
+                "user_id": user_id, "query": f'role:"{role}" company:{company}', "type": "filter", "relevant": relevant
+            })
+
+        for interest in rng.sample(list(INTERESTS), k=2):
+            relevant = [c["id"] for c in visible if interest in c["meta"]["interests"]]
+            if relevant:
+                queries.append({"user_id": user_id, "query": interest, "type": "interest", "relevant": relevant})
+
+    return queries
@@ -0,0 +1,259 @@
+"""
+Офлайн OpenAI-совместимый провайдер для нагрузочных прогонов агента.
+
+Настоящий AsyncOpenAI ходит в него через in-process транспорт httpx (MockTransport): сериализация
+запросов, SSE-стрим, парсинг ответов SDK и весь код AIService работают как в проде, но без сети и токенов.
+
+- /chat/completions с tools: роутер. Сценарий выбирается по последней реплике юзера (ROUTER_SCRIPTS)
+  и проигрывается по шагу (сколько ответов ассистента уже было после этой реплики). Есть stream=True.
+- /chat/completions без tools: extract / refine / rerank / bio / summary / recall. Тип определяется
+  по системному промпту (prompt_assembly), ответы детерминированы.
+- /embeddings: векторы StubEmbedder (те же, что у FakeSupabase).
+- Задержки — из распределений LatencyModel ("fixed:200", "uniform:100:400", "lognormal:600:1500").
+"""
+import asyncio
+import json
+import math
+import random
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.services.context_builder import estimate_tokens
+from app.services.prompt_assembly import prompt_assembly
+from scripts.bench.stubs import StubEmbedder, rerank_relevant_ids
+
+BASE_URL = "http://fake-provider/v1"
+
+
+class LatencyModel:
+    """
+    Распределение задержки ответа:
+    fixed:<ms> | uniform:<min_ms>:<max_ms> | lognormal:<p50_ms>:<p95_ms>
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, *params = spec.split(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind == "lognormal":
+            p50, p95 = self.params
+            self.mu = math.log(max(p50, 1e-3))
+            self.sigma = max(0.0, (math.log(max(p95, 1e-3)) - self.mu) / 1.645)
+        elif kind not in ("fixed", "uniform"):
+            raise ValueError(f"Unknown latency model: {spec}")
+
+    def sample_sec(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            ms = self.params[0] if self.params else 0.0
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.params)
+        else:
+            ms = rng.lognormvariate(self.mu, self.sigma)
+        return ms / 1000
+
+
+@dataclass
+class Step:
+    """Ответ роутера на одном шаге: вызовы инструментов или текст."""
+    tool_calls: list[tuple[str, dict]] = field(default_factory=list)
+    text: str | None = None
+
+
+def tool(name: str, **arguments) -> Step:
+    return Step(tool_calls=[(name, arguments)])
+
+
+# Реплика юзера -> последовательность шагов роутера. Шаги сверх списка — финальный текст.
+ROUTER_SCRIPTS: list[tuple[re.Pattern, callable]] = [
+    (re.compile(r"^(?:да|ок|подтверждаю)\b", re.IGNORECASE), lambda m: [tool("confirm_action")]),
+    (re.compile(r"^(?:нет|отмена)\b", re.IGNORECASE), lambda m: [tool("cancel_action")]),
+    (re.compile(r"^(?:найди|покажи|кто у меня)\s+(?P<q>.+)", re.IGNORECASE), lambda m: [
+        tool("search_contacts", query=m["q"]),
+        Step(text=f"Вот кого нашел по запросу «{m['q']}»."),
+    ]),
+    (re.compile(r"^(?:запиши|добавь)\s+(?P<t>.+)", re.IGNORECASE), lambda m: [tool("add_contact", text=m["t"])]),
+    (re.compile(r"^удали\s+(?P<q>.+)", re.IGNORECASE), lambda m: [
+        tool("search_contacts", query=m["q"]),
+        tool("delete_contact", contact_id="c1"),
+    ]),
+]
+
+
+def _content(message: dict) -> str:
+    content = message.get("content")
+    return content if isinstance(content, str) else ""
+
+
+class FakeProvider:
+    def __init__(
+        self,
+        chat_latency: str = "fixed:0",
+        embed_latency: str = "fixed:0",
+        stream_chunk_ms: float = 0.0,
+        embedder: StubEmbedder | None = None,
+        scripts: list | None = None,
+        seed: int = 42,
+    ):
+        self.chat_latency = LatencyModel(chat_latency)
+        self.embed_latency = LatencyModel(embed_latency)
+        self.stream_chunk_ms = stream_chunk_ms
+        self.embedder = embedder or StubEmbedder()
+        self.scripts = scripts if scripts is not None else ROUTER_SCRIPTS
+        self.rng = random.Random(seed)
+        self.calls: Counter = Counter()  # kind -> запросов
+        self._tool_call_seq = 0
+
+    # --- Клиент ---
+
+    def client(self, **http_kwargs) -> AsyncOpenAI:
+        """Настоящий AsyncOpenAI, запросы которого обслуживает этот провайдер (http_kwargs — в httpx.AsyncClient)."""
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle), **http_kwargs)
+        return AsyncOpenAI(api_key="fake", base_url=BASE_URL, http_client=http_client, max_retries=0)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content or b"{}")
+        if request.url.path.endswith("/embeddings"):
+            return await self._embeddings(body)
+        if request.url.path.endswith("/chat/completions"):
+            return await self._chat(body)
+        return httpx.Response(404, json={"error": {"message": f"Unknown endpoint {request.url.path}"}})
+
+    # --- Embeddings ---
+
+    async def _embeddings(self, body: dict) -> httpx.Response:
+        self.calls["embed"] += 1
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(self.embed_latency.sample_sec(self.rng))
+        tokens = sum(estimate_tokens(text) for text in inputs)
+        return httpx.Response(200, json={
+            "object": "list",
+            "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": self.embedder.embed_sync(text)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    # --- Chat ---
+
+    async def _chat(self, body: dict) -> httpx.Response:
+        messages = body.get("messages") or []
+        if body.get("tools") and body.get("tool_choice") != "none":
+            kind = "router"
+            step = self._router_step(messages)
+        else:
+            kind = self._classify(messages)
+            step = Step(text=self._complete(kind, messages))
+        self.calls[kind] += 1
+
+        usage = {
+            "prompt_tokens": sum(estimate_tokens(_content(m)) for m in messages),
+            "completion_tokens": estimate_tokens(step.text) + 20 * len(step.tool_calls),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        tool_calls = [
+            {"id": self._next_tool_call_id(), "type": "function",
+             "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)}}
+            for name, args in step.tool_calls
+        ]
+
+        delay = self.chat_latency.sample_sec(self.rng)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=self._sse(body.get("model"), step.text, tool_calls, usage if include_usage else None, delay)
+            )
+
+        await asyncio.sleep(delay)
+        message = {"role": "assistant", "content": step.text}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-fake-{self.calls.total()}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "tool_calls" if tool_calls else "stop", "message": message}],
+            "usage": usage,
+        })
+
+    async def _sse(self, model: str, text: str | None, tool_calls: list, usage: dict | None, delay: float):
+        await asyncio.sleep(delay)  # TTFB, дальше чанки идут с шагом stream_chunk_ms
+
+        def event(delta: dict | None = None, finish: str | None = None, usage_payload: dict | None = None) -> bytes:
+            chunk = {
+                "id": "chatcmpl-fake-stream", "object": "chat.completion.chunk", "created": 0, "model": model,
+                "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            if usage_payload:
+                chunk["usage"] = usage_payload
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        yield event({"role": "assistant", "content": ""})
+        if text:
+            words = text.split(" ")
+            for i in range(0, len(words), 3):
+                yield event({"content": " ".join(words[i:i + 3]) + (" " if i + 3 < len(words) else "")})
+                if self.stream_chunk_ms:
+                    await asyncio.sleep(self.stream_chunk_ms / 1000)
+        for index, call in enumerate(tool_calls):
+            yield event({"tool_calls": [{"index": index, "id": call["id"], "type": "function", "function": call["function"]}]})
+        yield event({}, finish="tool_calls" if tool_calls else "stop")
+        if usage:
+            yield event(usage_payload=usage)
+        yield b"data: [DONE]\n\n"
+
+    def _next_tool_call_id(self) -> str:
+        self._tool_call_seq += 1
+        return f"call_fake_{self._tool_call_seq}"
+
+    def _router_step(self, messages: list) -> Step:
+        last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+        user_text = _content(messages[last_user]).strip() if last_user >= 0 else ""
+        step_index = sum(1 for m in messages[last_user + 1:] if m.get("role") == "assistant")
+
+        for pattern, build in self.scripts:
+            match = pattern.search(user_text)
+            if match:
+                steps = build(match)
+                if step_index < len(steps):
+                    return steps[step_index]
+                break
+        return Step(text="Понял. Что дальше?")
+
+    @staticmethod
+    def _classify(messages: list) -> str:
+        system = _content(messages[0]) if messages else ""
+        for key, kind in (
+            ("extractor", "extract"), ("refiner", "refine"), ("reranker", "rerank"),
+            ("bio_extractor", "bio"), ("history_summarizer", "summary"), ("recall_advisor", "recall"),
+        ):
+            if system == prompt_assembly.system_text(key):
+                return kind
+        return "chat"
+
+    @staticmethod
+    def _complete(kind: str, messages: list) -> str:
+        user_content = _content(messages[-1]) if messages else ""
+        if kind == "rerank":
+            return json.dumps({"relevant_ids": rerank_relevant_ids(user_content)})
+        if kind in ("extract", "refine"):
+            text = user_content.rpartition("UPDATE:\n")[2] if kind == "refine" else user_content
+            words = text.split()
+            name = words[0].capitalize() if words else "Контакт"
+            return json.dumps({"action": "save", "name": name, "summary": text, "meta": {}}, ensure_ascii=False)
+        if kind == "bio":
+            return user_content[:200]
+        if kind == "summary":
+            return "- Юзер искал и добавлял контакты."
+        if kind == "recall":
+            return "👀 Напиши <b>кому-нибудь</b> из списка."
+        return "Ок."
@@ -0,0 +1,393 @@
+"""
+Заглушки внешних бэкендов для офлайн-бенчмарков:
+- FakeSupabase: in-memory таблицы + RPC search_hybrid / match_contacts / get_chat_history с той же семантикой, что SQL в migrations/;
+- StubEmbedder: детерминированные "эмбеддинги" (хэш токенов + концепты-синонимы), чтобы векторный поиск
+  находил "гошник" по "Go developer", а лексический — нет. Словарь концептов у него неполный (часть синонимов
+  отложена) и к векторам подмешан шум: разметка запросов от эмбеддера не зависит, recall вектора не 1.0 по построению;
+- FakeRerankLLM: имитация LLM-реранкера (фильтр по пересечению концептов) с настраиваемой задержкой.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from scripts.bench.corpus import INTERESTS, ROLES
+
+EMBED_DIM = 256
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def _build_concepts(holdout: bool = False) -> dict[str, list[str]]:
+    """holdout — без последнего синонима каждого понятия (если их больше одного): их эмбеддер "не знает"."""
+    concepts = {}
+    for prefix, table in (("role", ROLES), ("interest", INTERESTS)):
+        for key, synonyms in table.items():
+            known = synonyms[:-1] if holdout and len(synonyms) > 1 else synonyms
+            concepts[f"{prefix}:{key}"] = [key.lower()] + [s.lower() for s in known]
+    return concepts
+
+
+# Полный словарь — для имитации LLM-реранкера; неполный — для эмбеддера
+CONCEPTS = _build_concepts()
+EMBED_CONCEPTS = _build_concepts(holdout=True)
+
+
+def extract_concepts(text: str, concepts: dict[str, list[str]] = CONCEPTS) -> set[str]:
+    lowered = (text or "").lower()
+    return {key for key, forms in concepts.items() if any(form in lowered for form in forms)}
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % EMBED_DIM
+
+
+class StubEmbedder:
+    """
+    Детерминированный embedder: концепты (вес 3) + токены (вес 1) + триграммы (вес 0.3)
+    + гауссов шум noise (зерно — хэш текста, одинаковый текст дает одинаковый вектор).
+    """
+
+    def __init__(self, latency_ms: float = 0.0, noise: float = 0.1):
+        self.latency_ms = latency_ms
+        self.noise = noise
+        self.calls = 0
+
+    def embed_sync(self, text: str) -> list[float]:
+        vec = [0.0] * EMBED_DIM
+        lowered = (text or "").lower()
+        for concept in extract_concepts(lowered, EMBED_CONCEPTS):
+            vec[_bucket(concept)] += 3.0
+        for token in _TOKEN_RE.findall(lowered):
+            vec[_bucket(f"t:{token}")] += 1.0
+            padded = f" {token} "
+            for i in range(len(padded) - 2):
+                vec[_bucket(f"g:{padded[i:i + 3]}")] += 0.3
+        if self.noise:
+            rng = random.Random(zlib.crc32(lowered.encode("utf-8")))
+            vec = [v + rng.gauss(0.0, self.noise) for v in vec]
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    async def get_embedding(self, text: str) -> list[float]:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self.embed_sync(text)
+
+
+# --- Fake Supabase ---
+
+class _Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _compare(value, op: str, target) -> bool:
+    if op == "is":
+        return value is None if target in (None, "null") else str(value).lower() == str(target).lower()
+    if value is None:
+        return False
+    if op == "eq":
+        return str(value) == str(target)
+    if op == "neq":
+        return str(value) != str(target)
+    if op == "ilike":
+        pattern = "^" + re.escape(str(target)).replace("%", ".*") + "$"
+        return re.match(pattern, str(value), re.IGNORECASE | re.DOTALL) is not None
+    if op in ("lt", "lte", "gt", "gte"):
+        a, b = str(value), str(target)
+        return {"lt": a < b, "lte": a <= b, "gt": a > b, "gte": a >= b}[op]
+    raise ValueError(f"Unsupported operator in fake: {op}")
+
+
+def _split_top_level(expr: str) -> list[str]:
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _parse_logic(expr: str, mode: str = "or"):
+    """Мини-парсер PostgREST-фильтра or=(...): col.op.value, and(...), or(...)."""
+    terms = []
+    for part in _split_top_level(expr):
+        part = part.strip()
+        nested = re.match(r"^(and|or)\((.*)\)$", part, re.DOTALL)
+        if nested:
+            terms.append(_parse_logic(nested.group(2), nested.group(1)))
+            continue
+        col, op, value = part.split(".", 2)
+        value = value.strip('"')
+        terms.append(lambda row, c=col, o=op, v=value: _compare(row.get(c), o, v))
+    combine = all if mode == "and" else any
+    return lambda row: combine(t(row) for t in terms)
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table_name = table
+        self.filters = []
+        self.orders = []
+        self._limit = None
+        self._count = None
+        self._head = False
+        self._insert = None
+        self._conflict = None
+        self._delete = False
+
+    def select(self, *columns, count=None, head=False):
+        self._count = count
+        self._head = head
+        return self
+
+    def eq(self, col, value):
+        self.filters.append(lambda row: _compare(row.get(col), "eq", value))
+        return self
+
+    def neq(self, col, value):
+        self.filters.append(lambda row: _compare(row.get(col), "neq", value))
+        return self
+
+    def ilike(self, col, pattern):
+        self.filters.append(lambda row: _compare(row.get(col), "ilike", pattern))
+        return self
+
+    def gt(self, col, value):
+        self.filters.append(lambda row: _compare(row.get(col), "gt", value))
+        return self
+
+    def lt(self, col, value):
+        self.filters.append(lambda row: _compare(row.get(col), "lt", value))
+        return self
+
+    def in_(self, col, values):
+        allowed = {str(v) for v in values}
+        self.filters.append(lambda row: str(row.get(col)) in allowed)
+        return self
+
+    def or_(self, expr):
+        self.filters.append(_parse_logic(expr))
+        return self
+
+    def order(self, col, desc=False, nullsfirst=False):
+        self.orders.append((col, desc, nullsfirst))
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def insert(self, data):
+        self._insert = data if isinstance(data, list) else [data]
+        return self
+
+    def delete(self):
+        self._delete = True
+        return self
+
+    def upsert(self, data, on_conflict: str | None = None):
+        self._insert = data if isinstance(data, list) else [data]
+        self._conflict = on_conflict or ("id" if "id" in self._insert[0] else "user_id")
+        return self
+
+    def execute(self):
+        self.db._sleep()
+        if self._insert is not None:
+            return _Response(self.db._insert(self.table_name, self._insert, self._conflict))
+        rows = [r for r in self.db.tables.get(self.table_name, []) if all(f(r) for f in self.filters)]
+        if self._delete:
+            self.db.tables[self.table_name] = [r for r in self.db.tables.get(self.table_name, []) if r not in rows]
+            return _Response([dict(r) for r in rows])
+        for col, desc, nullsfirst in reversed(self.orders):
+            present = [r for r in rows if r.get(col) is not None]
+            missing = [r for r in rows if r.get(col) is None]
+            present.sort(key=lambda r: str(r.get(col)), reverse=desc)
+            rows = missing + present if nullsfirst else present + missing
+        count = len(rows)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._head:
+            return _Response([], count)
+        return _Response([dict(r) for r in rows], count if self._count else None)
+
+
+class FakeRPC:
+    def __init__(self, fn, params):
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        return _Response(self.fn(**self.params))
+
+
+class FakeSupabase:
+    """
+    Read-only подмножество supabase-py клиента, которое использует поиск.
+    execute() блокирующий — как и у настоящего синхронного клиента.
+    """
+
+    def __init__(self, corpus: dict, embedder: StubEmbedder, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.embedder = embedder
+        self.tables = {
+            "contacts": corpus["contacts"],
+            "organizations": corpus["orgs"],
+            "organization_members": corpus["members"],
+            "users": corpus["users"],
+            "chat_history": [],
+        }
+        for contact in corpus["contacts"]:
+            if "embedding" not in contact:
+                contact["embedding"] = embedder.embed_sync(f"{contact['name']} {contact['summary']} {contact['meta']}")
+
+    def _sleep(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: dict) -> FakeRPC:
+        fn = {
+            "search_hybrid": self._search_hybrid,
+            "match_contacts": self._match_contacts,
+            "get_chat_history": self._get_chat_history,
+        }[name]
+        return FakeRPC(fn, params)
+
+    def _insert(self, table: str, rows: list[dict], conflict: str | None = None) -> list[dict]:
+        inserted = []
+        for row in rows:
+            if conflict:
+                # upsert: строка с тем же ключом заменяется
+                self.tables[table] = [r for r in self.tables.get(table, []) if r.get(conflict) != row.get(conflict)]
+            row = dict(row)
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+            self.tables.setdefault(table, []).append(row)
+            inserted.append(dict(row))
+        return inserted
+
+    @staticmethod
+    def _visible(contact: dict, user_id: int) -> bool:
+        """allowed_user_ids @> ARRAY[user_id] AND is_archived = false (migrations/fix_search_acl_v8.sql)."""
+        return not contact["is_archived"] and user_id in contact["allowed_user_ids"]
+
+    @staticmethod
+    def _passes_filters(c: dict, p_org_id=None, p_role=None, p_company=None, p_interest=None) -> bool:
+        """Структурные фильтры из migrations/fix_search_meta_filters_v7.sql."""
+        meta = c.get("meta") or {}
+        if p_org_id and str(c["org_id"]) != str(p_org_id):
+            return False
+        if p_role and p_role.lower() not in str(meta.get("role") or "").lower():
+            return False
+        if p_company and p_company.lower() not in str(meta.get("company") or "").lower():
+            return False
+        if p_interest and p_interest.lower() not in json.dumps(meta.get("interests") or [], ensure_ascii=False).lower():
+            return False
+        return True
+
+    def _row(self, c: dict, **extra) -> dict:
+        row = {
+            "id": c["id"], "name": c["name"], "summary": c["summary"], "meta": c["meta"],
+            "org_id": c["org_id"], "org_name": c["org_name"],
+        }
+        row.update(extra)
+        return row
+
+    def _search_hybrid(self, p_user_id, p_query, p_limit=20, **filters):
+        q = (p_query or "").lower()
+        hits = []
+        for c in self.tables["contacts"]:
+            if not self._visible(c, p_user_id) or not self._passes_filters(c, **filters):
+                continue
+            org_name = (c["org_name"] or "").lower()
+            name, summary = c["name"].lower(), (c["summary"] or "").lower()
+            if not q or q in name or q in summary or (org_name and q in org_name):
+                hits.append(c)
+        # Тот же ORDER BY, что в migrations/fix_search_pagination_v6.sql (две стабильные сортировки)
+        hits.sort(key=lambda c: (c["created_at"], c["id"]), reverse=True)
+        hits.sort(key=lambda c: (
+            c["name"].lower() != q,
+            not c["name"].lower().startswith(q),
+            q not in c["name"].lower(),
+        ))
+        self._sleep()
+        return [self._row(c) for c in hits[:p_limit]]
+
+    def _match_contacts(self, query_embedding, match_user_id, match_threshold=0.5, match_count=10, **filters):
+        scored = []
+        for c in self.tables["contacts"]:
+            if not self._visible(c, match_user_id) or not c.get("embedding") or not self._passes_filters(c, **filters):
+                continue
+            similarity = sum(a * b for a, b in zip(query_embedding, c["embedding"]))
+            if similarity > match_threshold:
+                scored.append((similarity, c))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        self._sleep()
+        return [self._row(c, distance=sim) for sim, c in scored[:match_count]]
+
+    def _get_chat_history(self, p_user_id, p_limit):
+        """Последние p_limit сообщений в хронологическом порядке (migrations/migration_history.sql)."""
+        rows = [r for r in self.tables["chat_history"] if r["user_id"] == p_user_id]
+        return [{"role": r["role"], "content": r["content"]} for r in rows[-p_limit:]]
+
+
+# --- Fake LLM (reranker) ---
+
+def rerank_relevant_ids(user_content: str) -> list[str]:
+    """Решение реранкера по сообщению rerank_contacts: кандидаты с общим концептом или токеном с запросом."""
+    query_line, _, candidates_json = user_content.partition("\nCandidates: ")
+    query = query_line.replace("Query: ", "", 1).lower()
+    query_concepts = extract_concepts(query)
+    query_tokens = set(_TOKEN_RE.findall(query))
+
+    relevant = []
+    for cand in json.loads(candidates_json):
+        text = f"{cand['name']} {cand.get('summary') or ''} {json.dumps(cand.get('meta'), ensure_ascii=False)}"
+        lowered = text.lower()
+        if query_concepts & extract_concepts(lowered) or query_tokens & set(_TOKEN_RE.findall(lowered)):
+            relevant.append(cand["id"])
+    return relevant
+
+
+class FakeRerankLLM:
+    """
+    Имитирует chat.completions.create для rerank_contacts: оставляет кандидатов,
+    у которых есть общий концепт или токен с запросом. Формат ответа — как у OpenAI SDK.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model=None, messages=None, **kwargs):
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        relevant = rerank_relevant_ids(messages[-1]["content"])
+        message = SimpleNamespace(content=json.dumps({"relevant_ids": relevant}), tool_calls=None, role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
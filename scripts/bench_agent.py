@@ -0,0 +1,238 @@
+"""
+Нагрузочный бенчмарк агента (офлайн): run_router_agent целиком на фейковом провайдере.
+
+Настоящий AsyncOpenAI направляется в scripts/bench/fake_provider.py (in-process транспорт httpx),
+БД — FakeSupabase из scripts/bench. Виртуальные юзеры параллельно гоняют сценарий диалога
+(поиск, добавление с подтверждением, удаление, болтовня), задержки провайдера задаются распределениями.
+Считает throughput (ходов/с), p50/p95/p99 хода по типам реплик и вызовы LLM по местам (telemetry).
+
+Usage:
+    python scripts/bench_agent.py --users 20 --turns 10 --llm-latency lognormal:600:1500 --embed-latency fixed:80
+    python scripts/bench_agent.py --users 50 --turns 20 --stream --out /tmp/bench_agent.json
+    python scripts/bench_agent.py --users 20 --turns 10 --speculative-search
+    python scripts/bench_agent.py --users 20 --turns 10 --llm-latency lognormal:2000:6000 --budget-sec 8 --budget-reserve-sec 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# Добавляем корень проекта в путь
+sys.path.append(os.getcwd())
+
+# Настройки бота обязательны при импорте app.*, но в офлайн-прогоне не используются
+for key, value in {
+    "BOT_TOKEN": "0:bench",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "bench",
+    "OPENROUTER_API_KEY": "bench",
+    "OPENROUTER_BASE_URL": "http://fake-provider/v1",
+    "LOG_LEVEL": "WARNING",
+}.items():
+    os.environ.setdefault(key, value)
+
+from app.config import settings
+from app.services.ai_service import ai_service
+from app.services.search_service import search_service
+from app.services.agent_budget import agent_budgets
+from app.services.speculative_search import speculative_search
+from app.services.summary_service import summary_service
+from app.services.telemetry import telemetry
+from app.services.user_service import user_service
+from scripts.bench.corpus import COMPANIES, INTERESTS, ROLES, generate_corpus
+from scripts.bench.fake_provider import FakeProvider
+from scripts.bench.stubs import FakeSupabase, StubEmbedder
+
+
+def install(corpus: dict, args) -> tuple[FakeSupabase, FakeProvider]:
+    # Юзеры корпуса — в Pro (полная глубина истории, без лимитов free)
+    now = datetime.now(timezone.utc)
+    for user in corpus["users"]:
+        user.update({"created_at": now.isoformat(), "updated_at": now.isoformat(), "pro_until": (now + timedelta(days=30)).isoformat()})
+
+    embedder = StubEmbedder()
+    fake_db = FakeSupabase(corpus, embedder, latency_ms=args.db_latency_ms)
+    provider = FakeProvider(
+        chat_latency=args.llm_latency,
+        embed_latency=args.embed_latency,
+        stream_chunk_ms=args.stream_chunk_ms,
+        embedder=embedder,
+        seed=args.seed,
+    )
+
+    search_service.supabase = fake_db
+    search_service.repo.db = fake_db
+    search_service.org_repo.db = fake_db
+    user_service.supabase = fake_db
+    summary_service.supabase = fake_db
+    # Те же event hooks, что у общего пула: TTFB в телеметрии
+    ai_service.llm_client = provider.client(event_hooks={"request": [telemetry.on_request], "response": [telemetry.on_response]})
+    return fake_db, provider
+
+
+def dialog(rng: random.Random, turns: int) -> list[tuple[str, str]]:
+    """(тип реплики, текст) — детерминированный по rng сценарий одного юзера."""
+    script = []
+    while len(script) < turns:
+        kind = rng.choice(["search", "search", "add", "delete", "chat"])
+        if kind == "search":
+            script.append(("search", f"найди {rng.choice(list(ROLES) + list(INTERESTS))}"))
+        elif kind == "add":
+            role, company = rng.choice(list(ROLES)), rng.choice(COMPANIES)
+            script.append(("add", f"запиши Тестового {role} из {company}, любит {rng.choice(list(INTERESTS))}"))
+            script.append(("confirm", "да"))
+        elif kind == "delete":
+            script.append(("delete", f"удали {rng.choice(list(ROLES))}"))
+            script.append(("cancel", "нет"))
+        else:
+            script.append(("chat", rng.choice(["как дела", "что умеешь", "спасибо"])))
+    return script[:turns]
+
+
+class _Streamer:
+    """Имитация MessageStreamer без Telegram: считает push, как будто edit прошел."""
+
+    def __init__(self):
+        self.delivered = False
+        self.started = False
+        self.pushes = 0
+
+    async def push(self, text: str):
+        self.started = True
+        self.pushes += 1
+
+    async def finish(self, text: str) -> bool:
+        self.delivered = self.started
+        return self.delivered
+
+    async def abort(self):
+        self.started = False
+
+
+async def run_user(user_id: int, script: list[tuple[str, str]], stream: bool, latencies: dict, errors: list):
+    for kind, text in script:
+        started = time.perf_counter()
+        try:
+            await ai_service.run_router_agent(text, user_id, streamer=_Streamer() if stream else None)
+        except Exception as e:
+            errors.append(f"{user_id} '{text}': {type(e).__name__}: {e}")
+        latencies.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "turns": len(values),
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "mean": round(statistics.fmean(values), 1) if values else 0.0,
+    }
+
+
+async def main(args):
+    settings.LLM_CACHE_ENABLED = args.llm_cache
+    settings.SPECULATIVE_SEARCH = args.speculative_search
+    if args.budget_sec:
+        settings.AGENT_BUDGET_SEC = {plan: args.budget_sec for plan in settings.AGENT_BUDGET_SEC}
+    if args.budget_reserve_sec is not None:
+        settings.AGENT_BUDGET_RESERVE_SEC = args.budget_reserve_sec
+    corpus = generate_corpus(n_contacts=args.contacts, n_users=max(args.users, 1), seed=args.seed)
+    fake_db, provider = install(corpus, args)
+
+    rng = random.Random(args.seed)
+    users = [u["id"] for u in corpus["users"][:args.users]]
+    scripts = {user_id: dialog(rng, args.turns) for user_id in users}
+
+    latencies: dict[str, list[float]] = {}
+    errors: list[str] = []
+    semaphore = asyncio.Semaphore(args.concurrency or len(users))
+
+    async def bounded(user_id: int):
+        async with semaphore:
+            token = telemetry.bind_user(user_id)
+            try:
+                await run_user(user_id, scripts[user_id], args.stream, latencies, errors)
+            finally:
+                telemetry.reset_user(token)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[bounded(user_id) for user_id in users])
+    wall_sec = time.perf_counter() - started
+
+    all_turns = [v for values in latencies.values() for v in values]
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "users": len(users), "turns": args.turns, "concurrency": args.concurrency or len(users),
+            "contacts": args.contacts, "seed": args.seed, "stream": args.stream, "llm_cache": args.llm_cache,
+            "speculative_search": args.speculative_search,
+            "agent_budget_sec": settings.AGENT_BUDGET_SEC, "agent_budget_reserve_sec": settings.AGENT_BUDGET_RESERVE_SEC,
+            "llm_latency": args.llm_latency, "embed_latency": args.embed_latency,
+            "stream_chunk_ms": args.stream_chunk_ms, "db_latency_ms": args.db_latency_ms,
+        },
+        "wall_sec": round(wall_sec, 2),
+        "throughput_turns_per_sec": round(len(all_turns) / wall_sec, 2) if wall_sec else 0.0,
+        "turn_latency_ms": summarize(all_turns),
+        "by_kind": {kind: summarize(values) for kind, values in sorted(latencies.items())},
+        "provider_calls": dict(provider.calls),
+        "llm_sites": telemetry.snapshot(),
+        "agent_budget": agent_budgets.snapshot(),
+        "speculative_search": {**speculative_search.stats, "hit_rate": round(speculative_search.hit_rate(), 3)},
+        "chat_history_rows": len(fake_db.tables["chat_history"]),
+        "errors": errors[:20],
+    }
+
+    t = report["turn_latency_ms"]
+    print(
+        f"{len(all_turns)} turns in {wall_sec:.1f}s -> {report['throughput_turns_per_sec']} turns/s | "
+        f"p50={t['p50']}ms p95={t['p95']}ms p99={t['p99']}ms | errors={len(errors)}"
+    )
+    for kind, s in report["by_kind"].items():
+        print(f"  {kind:<8} {s['turns']:>5} turns  p50={s['p50']:>8.1f}ms  p95={s['p95']:>8.1f}ms")
+    print(f"  provider calls: {report['provider_calls']}")
+    print(f"  agent budget: {report['agent_budget']}")
+    if args.speculative_search:
+        print(f"  speculative search: {report['speculative_search']}")
+
+    # Отложенные эмбеддинги драфтов и фоновые компакции не должны висеть после прогона
+    pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agent throughput benchmark on a fake OpenAI-compatible provider (offline)")
+    parser.add_argument("--users", type=int, default=10, help="Виртуальных юзеров (параллельных диалогов)")
+    parser.add_argument("--turns", type=int, default=10, help="Реплик на юзера")
+    parser.add_argument("--concurrency", type=int, default=0, help="Одновременных диалогов (0 — все)")
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-latency", type=str, default="lognormal:600:1500", help="fixed:MS | uniform:MIN:MAX | lognormal:P50:P95")
+    parser.add_argument("--embed-latency", type=str, default="fixed:80")
+    parser.add_argument("--stream-chunk-ms", type=float, default=30.0)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="Шаги роутера через streaming API")
+    parser.add_argument("--llm-cache", action="store_true", help="Включить llm_cache (по умолчанию выключен, чтобы мерить провайдер)")
+    parser.add_argument("--speculative-search", action="store_true", help="Поиск параллельно с первым шагом роутера (SPECULATIVE_SEARCH)")
+    parser.add_argument("--budget-sec", type=float, default=0.0, help="Бюджет хода агента для всех тарифов (0 — AGENT_BUDGET_SEC)")
+    parser.add_argument("--budget-reserve-sec", type=float, default=None, help="Резерв бюджета на ответ (по умолчанию AGENT_BUDGET_RESERVE_SEC)")
+    parser.add_argument("--out", type=str, default=None, help="JSON-отчет (по умолчанию не пишется)")
+    asyncio.run(main(parser.parse_args()))
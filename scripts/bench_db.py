@@ -0,0 +1,184 @@
+"""
+Бенчмарк БД на локальном Postgres + pgvector.
+
+Для каждого размера корпуса (по умолчанию 1k / 100k / 1M контактов) пересоздает схему,
+накатывает migrations/ (scripts/bench/local_db.py), сидирует данные и замеряет горячие запросы:
+search_hybrid, match_contacts, get_chat_history и выборку кандидатов Recall —
+на нескольких уровнях конкурентности (отдельное соединение на воркер, как у пула).
+
+Отчет: throughput (ops/s) и p50/p95/p99 латентности на каждый (размер, запрос, конкурентность).
+
+Usage:
+    python scripts/bench_db.py --sizes 1000,100000 --concurrency 1,4,16 --out /tmp/bench_db.json
+    python scripts/bench_db.py --sizes 1000000 --embed-fraction 0.2   # 1M с векторами = ~6GB, можно частично
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Добавляем корень проекта в путь
+sys.path.append(os.getcwd())
+
+from loguru import logger
+from scripts.bench.local_db import (
+    BASE_USER_ID, COMPANIES, DEFAULT_DSN, EMBEDDING_DIM, ROLES, connect, prepare
+)
+
+QUERY_WORDS = ROLES + COMPANIES + ["Contact 1", "Contact 42", "Contact 777"]
+
+
+def _random_vector(rng: random.Random) -> str:
+    return "[" + ",".join(f"{rng.random() - 0.5:.4f}" for _ in range(EMBEDDING_DIM)) + "]"
+
+
+class Workload:
+    """Генераторы (sql, params) для каждого горячего запроса."""
+
+    def __init__(self, n_users: int, seed: int):
+        rng = random.Random(seed)
+        self.n_users = n_users
+        # Пул векторов запросов: генерация 1536 чисел на каждый вызов исказила бы замер
+        self.vectors = [_random_vector(rng) for _ in range(32)]
+
+    def user(self, rng: random.Random) -> int:
+        return BASE_USER_ID + rng.randrange(self.n_users)
+
+    def search_hybrid(self, rng):
+        return (
+            "SELECT * FROM search_hybrid(%(u)s, %(q)s, 20)",
+            {"u": self.user(rng), "q": rng.choice(QUERY_WORDS)},
+        )
+
+    def match_contacts(self, rng):
+        return (
+            "SELECT * FROM match_contacts(%(v)s::vector, %(u)s, %(t)s, 30)",
+            {"v": rng.choice(self.vectors), "u": self.user(rng), "t": 0.0},
+        )
+
+    def get_chat_history(self, rng):
+        return ("SELECT * FROM get_chat_history(%(u)s, 10)", {"u": self.user(rng)})
+
+    def recall_candidates(self, rng):
+        return (
+            "SELECT id, name, summary, meta, last_interaction, created_at FROM contacts "
+            "WHERE user_id = %(u)s AND is_archived = false "
+            "ORDER BY last_interaction ASC NULLS FIRST LIMIT 20",
+            {"u": self.user(rng)},
+        )
+
+    OPS = ["search_hybrid", "match_contacts", "get_chat_history", "recall_candidates"]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run_level(dsn: str, workload: Workload, op: str, concurrency: int, total_ops: int, seed: int) -> dict:
+    conns = [connect(dsn) for _ in range(concurrency)]
+    per_worker = max(1, total_ops // concurrency)
+    build = getattr(workload, op)
+
+    def worker(idx: int) -> list[float]:
+        conn = conns[idx]
+        rng = random.Random(seed * 1000 + idx)
+        # Прогрев: план, кэш страниц
+        for _ in range(3):
+            sql, params = build(rng)
+            conn.execute(sql, params).fetchall()
+        latencies = []
+        for _ in range(per_worker):
+            sql, params = build(rng)
+            started = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    for conn in conns:
+        conn.close()
+
+    latencies = [lat for worker_lat in results for lat in worker_lat]
+    return {
+        "concurrency": concurrency,
+        "ops": len(latencies),
+        "throughput_ops_s": round(len(latencies) / wall, 1) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        },
+    }
+
+
+def main(args):
+    sizes = [int(s) for s in args.sizes.split(",")]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    ops = args.ops.split(",") if args.ops else Workload.OPS
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "sizes": sizes, "concurrency": levels, "ops_per_level": args.ops_per_level,
+            "users": args.users, "orgs": args.orgs, "embed_fraction": args.embed_fraction, "seed": args.seed,
+        },
+        "results": {},
+    }
+
+    for size in sizes:
+        logger.info(f"Preparing database with {size} contacts...")
+        started = time.perf_counter()
+        conn = prepare(args.dsn, n_contacts=size, n_users=args.users, n_orgs=args.orgs,
+                       embed_fraction=args.embed_fraction)
+        db_size = conn.execute("SELECT pg_size_pretty(pg_database_size(current_database()))").fetchone()[0]
+        conn.close()
+        seed_sec = round(time.perf_counter() - started, 1)
+        logger.info(f"Seeded {size} contacts in {seed_sec}s (database size {db_size})")
+
+        workload = Workload(n_users=args.users, seed=args.seed)
+        size_report = {"seed_sec": seed_sec, "db_size": db_size, "ops": {}}
+        for op in ops:
+            size_report["ops"][op] = []
+            for level in levels:
+                res = run_level(args.dsn, workload, op, level, args.ops_per_level, args.seed)
+                size_report["ops"][op].append(res)
+                print(
+                    f"{size:>8} {op:<18} c={level:<3} {res['throughput_ops_s']:>8.1f} ops/s  "
+                    f"p50={res['latency_ms']['p50']:.2f}ms  p95={res['latency_ms']['p95']:.2f}ms  "
+                    f"p99={res['latency_ms']['p99']:.2f}ms"
+                )
+        report["results"][str(size)] = size_report
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database-scale benchmark (local Postgres + pgvector)")
+    parser.add_argument("--dsn", type=str, default=DEFAULT_DSN)
+    parser.add_argument("--sizes", type=str, default="1000,100000,1000000")
+    parser.add_argument("--concurrency", type=str, default="1,4,16,32")
+    parser.add_argument("--ops", type=str, default="", help=f"Через запятую из: {','.join(Workload.OPS)}")
+    parser.add_argument("--ops-per-level", type=int, default=400)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--orgs", type=int, default=200)
+    parser.add_argument("--embed-fraction", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=str, default=None, help="JSON-отчет (по умолчанию не пишется)")
+    main(parser.parse_args())
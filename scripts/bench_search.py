@@ -0,0 +1,198 @@
+"""
+Бенчмарк качества и латентности поиска (офлайн).
+
+Генерирует синтетический корпус и размеченные запросы, подменяет Supabase/эмбеддинги/LLM заглушками
+из scripts/bench и гоняет каждый режим поиска: lexical, vector, hybrid — с rerank и без.
+Считает recall@k, MRR и p50/p95 латентности, пишет JSON-отчет для сравнения прогонов.
+
+Usage:
+    python scripts/bench_search.py --contacts 2000 --threshold 0.2 --out /tmp/bench_search.json
+    python scripts/bench_search.py --llm-latency-ms 600 --embed-latency-ms 80 --db-latency-ms 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+# Добавляем корень проекта в путь
+sys.path.append(os.getcwd())
+
+# Настройки бота обязательны при импорте app.*, но в офлайн-прогоне не используются
+for key, value in {
+    "BOT_TOKEN": "0:bench",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "bench",
+    "OPENROUTER_API_KEY": "bench",
+    "LOG_LEVEL": "WARNING",
+}.items():
+    os.environ.setdefault(key, value)
+
+from app.config import settings
+from app.schemas import SearchResult
+from app.services.ai_service import ai_service
+from app.services.search_service import search_service
+from app.services.user_service import user_service
+from scripts.bench.corpus import generate_corpus, generate_queries
+from scripts.bench.stubs import FakeRerankLLM, FakeSupabase, StubEmbedder
+
+MODES = ["lexical", "vector", "hybrid", "lexical+rerank", "vector+rerank", "hybrid+rerank"]
+
+
+def install_stubs(corpus: dict, args) -> tuple[FakeSupabase, StubEmbedder, FakeRerankLLM]:
+    embedder = StubEmbedder(latency_ms=args.embed_latency_ms, noise=args.embed_noise)
+    fake_db = FakeSupabase(corpus, embedder, latency_ms=args.db_latency_ms)
+    fake_llm = FakeRerankLLM(latency_ms=args.llm_latency_ms)
+
+    search_service.supabase = fake_db
+    search_service.repo.db = fake_db
+    search_service.org_repo.db = fake_db
+    user_service.supabase = fake_db
+    ai_service.get_embedding = embedder.get_embedding
+    ai_service.llm_client = fake_llm
+    return fake_db, embedder, fake_llm
+
+
+async def run_query(mode: str, query: str, user_id: int, k: int) -> list[SearchResult]:
+    base = mode.split("+")[0]
+
+    if base == "lexical":
+        response = await search_service.repo.search(user_id, query, limit=k)
+        results = [SearchResult(**item) for item in response.data or []]
+    elif base == "vector":
+        embedding = await ai_service.get_embedding(query)
+        response = search_service.supabase.rpc("match_contacts", {
+            "query_embedding": embedding,
+            "match_user_id": user_id,
+            "match_threshold": settings.SEARCH_MATCH_THRESHOLD,
+            "match_count": k,
+        }).execute()
+        results = [SearchResult(**item) for item in response.data or []]
+    else:
+        results = await search_service.search(query, user_id, limit=k)
+
+    if mode.endswith("+rerank") and results:
+        results = await ai_service.rerank_contacts(query, list(results))
+    return list(results)[:k]
+
+
+def score(results: list[SearchResult], relevant: list[str], k: int) -> tuple[float, float]:
+    ids = [str(r.id) for r in results[:k]]
+    relevant_set = set(relevant)
+    hits = sum(1 for cid in ids if cid in relevant_set)
+    recall = hits / min(len(relevant_set), k) if relevant_set else 0.0
+    rr = 0.0
+    for rank, cid in enumerate(ids, start=1):
+        if cid in relevant_set:
+            rr = 1.0 / rank
+            break
+    return recall, rr
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def bench_mode(mode: str, queries: list[dict], k: int) -> dict:
+    recalls, rrs, latencies = [], [], []
+    by_type: dict[str, dict[str, list]] = {}
+
+    for q in queries:
+        started = time.perf_counter()
+        try:
+            results = await run_query(mode, q["query"], q["user_id"], k)
+        except Exception as e:
+            print(f"[{mode}] query '{q['query']}' failed: {e}", file=sys.stderr)
+            results = []
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        recall, rr = score(results, q["relevant"], k)
+        recalls.append(recall)
+        rrs.append(rr)
+        bucket = by_type.setdefault(q["type"], {"recall": [], "rr": []})
+        bucket["recall"].append(recall)
+        bucket["rr"].append(rr)
+
+    return {
+        f"recall@{k}": round(statistics.fmean(recalls), 4) if recalls else 0.0,
+        "mrr": round(statistics.fmean(rrs), 4) if rrs else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "mean": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        },
+        "queries": len(queries),
+        "by_type": {
+            qtype: {
+                f"recall@{k}": round(statistics.fmean(v["recall"]), 4),
+                "mrr": round(statistics.fmean(v["rr"]), 4),
+                "queries": len(v["recall"]),
+            }
+            for qtype, v in sorted(by_type.items())
+        },
+    }
+
+
+async def main(args):
+    settings.SEARCH_MATCH_THRESHOLD = args.threshold
+
+    corpus = generate_corpus(n_contacts=args.contacts, n_users=args.users, seed=args.seed)
+    queries = generate_queries(corpus, n_users=args.query_users, seed=args.seed + 1)
+    _, embedder, fake_llm = install_stubs(corpus, args)
+
+    modes = args.modes.split(",") if args.modes else MODES
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "contacts": args.contacts,
+            "users": args.users,
+            "seed": args.seed,
+            "k": args.k,
+            "match_threshold": args.threshold,
+            "db_latency_ms": args.db_latency_ms,
+            "embed_latency_ms": args.embed_latency_ms,
+            "embed_noise": args.embed_noise,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "corpus": {"contacts": len(corpus["contacts"]), "orgs": len(corpus["orgs"]), "queries": len(queries)},
+        "modes": {},
+    }
+
+    for mode in modes:
+        report["modes"][mode] = await bench_mode(mode, queries, args.k)
+        m = report["modes"][mode]
+        print(
+            f"{mode:<16} recall@{args.k}={m[f'recall@{args.k}']:.3f}  mrr={m['mrr']:.3f}  "
+            f"p50={m['latency_ms']['p50']:.1f}ms  p95={m['latency_ms']['p95']:.1f}ms"
+        )
+
+    report["stub_calls"] = {"embeddings": embedder.calls, "llm": fake_llm.calls}
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search quality & latency benchmark (offline)")
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--query-users", type=int, default=5, help="Для скольких юзеров генерировать запросы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=settings.SEARCH_MATCH_THRESHOLD)
+    parser.add_argument("--modes", type=str, default="", help=f"Через запятую из: {','.join(MODES)}")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-noise", type=float, default=0.1, help="Шум стаб-эмбеддингов (0 — без шума)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--out", type=str, default=None, help="JSON-отчет (по умолчанию не пишется)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,207 @@
+"""
+EXPLAIN-регрессии для горячих запросов бота.
+
+Поднимает схему на локальном Postgres (scripts/bench/local_db.py), сидирует данные,
+прогоняет EXPLAIN (ANALYZE, BUFFERS) для каждого запроса, который реально шлет код,
+и падает (exit 1), если по большой таблице план ушел в Seq Scan.
+RPC (search_hybrid, match_contacts) вызываются целиком; планы запросов внутри функций
+собираются через auto_explain (log_nested_statements, NOTICE клиенту) и проверяются так же.
+Маленькие таблицы (меньше --min-rows строк) не проверяются: там Seq Scan — нормальный выбор планировщика.
+
+Usage:
+    python scripts/explain_hot_queries.py --contacts 100000
+    python scripts/explain_hot_queries.py --no-seed   # база уже подготовлена
+"""
+import argparse
+import json
+import os
+import sys
+
+# Добавляем корень проекта в путь
+sys.path.append(os.getcwd())
+
+from loguru import logger
+from scripts.bench.local_db import DEFAULT_DSN, EMBEDDING_DIM, connect, prepare, sample_ids
+
+# (имя, откуда в коде, SQL). Параметры: %(user_id)s, %(org_id)s, %(owner_id)s, %(embedding)s
+HOT_QUERIES = [
+    (
+        "recent_contacts", "SearchService.list_contacts_page (личные)",
+        """SELECT id, name, summary, meta, org_id, org_name, created_at FROM contacts
+           WHERE is_archived = false AND user_id = %(user_id)s
+           ORDER BY created_at DESC, id DESC LIMIT 11""",
+    ),
+    (
+        "org_listing", "SearchService.list_contacts_page (org:)",
+        """SELECT id, name, summary, meta, org_id, org_name, created_at FROM contacts
+           WHERE is_archived = false AND org_id = %(org_id)s
+           ORDER BY created_at DESC, id DESC LIMIT 11""",
+    ),
+    (
+        "recall_candidates", "RecallService.get_random_contacts_for_user",
+        """SELECT id, name, summary, meta, last_interaction, created_at FROM contacts
+           WHERE user_id = %(user_id)s AND is_archived = false
+           ORDER BY last_interaction ASC NULLS FIRST LIMIT 20""",
+    ),
+    (
+        "count_contacts", "SearchService.count_contacts",
+        "SELECT count(*) FROM contacts WHERE user_id = %(user_id)s",
+    ),
+    (
+        "name_index_load", "SearchService._load_contact_names",
+        "SELECT id, name, summary FROM contacts WHERE user_id = %(user_id)s",
+    ),
+    # RPC вызываются как есть: планы их тел приходят от auto_explain (log_nested_statements),
+    # копии SQL из миграций здесь не держим — они расходятся с реальными функциями
+    (
+        "search_hybrid", "ContactRepository.search (RPC search_hybrid)",
+        "SELECT * FROM search_hybrid(%(user_id)s::bigint, 'Contact 1', 20)",
+    ),
+    (
+        "search_hybrid_filters", "ContactRepository.search (RPC search_hybrid, role:/company:)",
+        "SELECT * FROM search_hybrid(%(user_id)s::bigint, '', 20, p_role => 'CTO', p_company => 'Яндекс')",
+    ),
+    (
+        "match_contacts", "SearchService.search, векторный этап (RPC match_contacts)",
+        "SELECT * FROM match_contacts(%(embedding)s::vector, %(user_id)s::bigint, 0.2, 20)",
+    ),
+    (
+        "membership_check", "ContactRepository.create / get_contact_by_id / check_search_limit",
+        "SELECT status, free_searches_used FROM organization_members WHERE user_id = %(user_id)s AND org_id = %(org_id)s",
+    ),
+    (
+        "user_orgs", "OrgRepository.get_user_orgs",
+        """SELECT om.org_id, om.status, o.name FROM organization_members om
+           JOIN organizations o ON o.id = om.org_id WHERE om.user_id = %(user_id)s""",
+    ),
+    (
+        "pending_members", "OrgRepository.get_pending_members_for_owner",
+        "SELECT user_id, org_id FROM organization_members WHERE status = 'pending' AND org_id IN (%(org_id)s)",
+    ),
+    (
+        "owned_orgs", "OrgRepository.is_org_owner / get_pending_members_for_owner",
+        "SELECT id, name FROM organizations WHERE owner_id = %(owner_id)s",
+    ),
+    (
+        "chat_history_recent", "get_chat_history RPC",
+        """SELECT role, content, created_at FROM chat_history WHERE user_id = %(user_id)s
+           ORDER BY created_at DESC LIMIT 10""",
+    ),
+    (
+        "chat_history_trim", "UserService.delete_last_messages",
+        """SELECT id FROM chat_history WHERE user_id = %(user_id)s
+           ORDER BY created_at DESC LIMIT 2""",
+    ),
+    (
+        "chat_history_clear", "UserService.clear_history (DELETE, откатывается)",
+        "DELETE FROM chat_history WHERE user_id = %(user_id)s",
+    ),
+]
+
+
+def _walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def table_sizes(conn) -> dict[str, float]:
+    rows = conn.execute(
+        "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"
+    ).fetchall()
+    return {name: tuples for name, tuples in rows}
+
+
+def enable_auto_explain(conn):
+    """auto_explain в сессии: планы вложенных запросов (тела RPC) приходят клиенту NOTICE'ами в JSON."""
+    for statement in (
+        "LOAD 'auto_explain'",
+        "SET auto_explain.log_min_duration = 0",
+        "SET auto_explain.log_analyze = on",
+        "SET auto_explain.log_buffers = on",
+        "SET auto_explain.log_nested_statements = on",
+        "SET auto_explain.log_format = 'json'",
+        "SET auto_explain.log_level = 'notice'",
+    ):
+        conn.execute(statement)
+
+
+def explain(conn, sql: str, params: dict) -> tuple[dict, list[dict]]:
+    """(план EXPLAIN, планы вложенных запросов от auto_explain)."""
+    nested = []
+
+    def on_notice(diag):
+        message = diag.message_primary or ""
+        start = message.find("{")
+        if start < 0:
+            return
+        try:
+            nested.append(json.loads(message[start:]))
+        except ValueError:
+            pass
+
+    conn.add_notice_handler(on_notice)
+    try:
+        # ANALYZE реально выполняет запрос: DELETE и прочее откатываем
+        with conn.transaction(force_rollback=True):
+            row = conn.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params).fetchone()
+    finally:
+        conn.remove_notice_handler(on_notice)
+    plan = row[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0], nested
+
+
+def main(args) -> int:
+    if args.no_seed:
+        conn = connect(args.dsn)
+    else:
+        conn = prepare(args.dsn, n_contacts=args.contacts, n_users=args.users, n_orgs=args.orgs,
+                       embed_fraction=args.embed_fraction)
+
+    params = sample_ids(conn)
+    sizes = table_sizes(conn)
+    logger.info(f"Params: {params}; table sizes: { {k: int(v) for k, v in sizes.items()} }")
+    params["embedding"] = "[" + ",".join(["0.01"] * EMBEDDING_DIM) + "]"
+    enable_auto_explain(conn)
+
+    failures = []
+    for name, origin, sql in HOT_QUERIES:
+        result, nested = explain(conn, sql, params)
+        nodes = [node for plan in [result] + nested for node in _walk(plan["Plan"])]
+        seq_scans = [
+            n["Relation Name"] for n in nodes
+            if n.get("Node Type") == "Seq Scan" and sizes.get(n.get("Relation Name"), 0) >= args.min_rows
+        ]
+        scans = sorted({
+            f"{n['Node Type']}:{n.get('Index Name') or n.get('Relation Name')}"
+            for n in nodes if "Scan" in n.get("Node Type", "")
+        })
+        status = "FAIL" if seq_scans else "ok"
+        print(f"[{status:>4}] {name:<20} {result['Execution Time']:8.2f}ms  {', '.join(scans)}  ({origin})")
+        if seq_scans:
+            failures.append((name, seq_scans))
+
+    conn.close()
+
+    if failures:
+        for name, tables in failures:
+            print(f"Seq Scan regression in '{name}' on: {', '.join(tables)}", file=sys.stderr)
+        return 1
+    print("All hot queries use indexes.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN regression suite for hot queries")
+    parser.add_argument("--dsn", type=str, default=DEFAULT_DSN)
+    parser.add_argument("--contacts", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--orgs", type=int, default=200)
+    parser.add_argument("--embed-fraction", type=float, default=0.0,
+                        help="Доля контактов с embedding (для EXPLAIN не нужны, заливка быстрее)")
+    parser.add_argument("--min-rows", type=int, default=10_000,
+                        help="Seq Scan по таблицам меньше этого размера не считается регрессией")
+    parser.add_argument("--no-seed", action="store_true", help="Не пересоздавать схему, использовать текущую БД")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""
+Проверка локального классификатора ответов на ожидающее действие (intent_service), без БД и сети:
+python scripts/test_intent_service.py
+
+Подтверждение / отмена выполняются сразу, без LLM, поэтому все неоднозначное
+(уточнения, правки, чужие глаголы) должно возвращать None и уходить в роутер.
+"""
+import os
+import sys
+
+# Добавляем корень проекта в путь
+sys.path.append(os.getcwd())
+
+from loguru import logger
+from app.services.intent_service import intent_service
+
+# (реплика, тип ожидающего действия, ожидаемый интент)
+CASES = [
+    # Подтверждения
+    ("да", "add", "confirm"),
+    ("Ок!", "add", "confirm"),
+    ("да, пожалуйста", "add", "confirm"),
+    ("👍", "del", "confirm"),
+    ("сохрани", "add", "confirm"),
+    ("удаляй", "del", "confirm"),
+    ("обнови", "update", "confirm"),
+    ("все верно", "add", "confirm"),
+    ("все так", "update", "confirm"),
+    # Отмены
+    ("нет", "add", "cancel"),
+    ("Отмена.", "del", "cancel"),
+    ("нет, спасибо", "add", "cancel"),
+    ("не надо", "add", "cancel"),
+    ("нет, не надо", "del", "cancel"),
+    ("не сохраняй", "add", "cancel"),
+    ("нет, не удаляй", "del", "cancel"),
+    ("стоп", "update", "cancel"),
+    # Глагол чужого действия — решает LLM
+    ("удали", "add", None),
+    ("сохрани", "del", None),
+    ("не удаляй", "add", None),
+    ("нет, не удаляй", "add", None),
+    ("обнови", "add", None),
+    # Уточнения и правки
+    ("да, но поменяй компанию", "add", None),
+    ("да, только телефон другой", "add", None),
+    ("не так", "add", None),
+    ("не все", "update", None),
+    ("нет, не так", "add", None),
+    ("не Петров, а Петрова", "add", None),
+    ("не", "add", None),
+    ("да нет наверное", "add", None),
+    ("ок стоп", "add", None),
+    ("сохрани, но с пометкой что он из крипты", "add", None),
+    # "надо" — это "да, делай", а не отмена
+    ("надо", "add", None),
+    ("надо, пожалуйста", "add", None),
+    ("надо надо", "add", None),
+    # Пустое
+    ("", "add", None),
+    ("!!!", "add", None),
+]
+
+
+def run_tests():
+    failed = 0
+    for text, action, expected in CASES:
+        intent = intent_service.classify(text, action)
+        ok = intent == expected
+        failed += not ok
+        log = logger.success if ok else logger.error
+        log(f"{text!r} (pending {action}): {intent} (expected {expected})")
+
+    if failed:
+        logger.error(f"{failed} intent checks failed")
+        sys.exit(1)
+    logger.success("All intent checks passed")
+
+
+if __name__ == "__main__":
+    run_tests()
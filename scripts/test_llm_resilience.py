@@ -0,0 +1,153 @@
+"""
+Проверка llm_resilience (дедлайны, брейкер, хеджирование) на локальном фейковом OpenAI-совместимом сервере.
+Сеть и ключи не нужны: python scripts/test_llm_resilience.py
+
+Поведение фейка задается моделью в запросе:
+- "ok"    — сразу отвечает;
+- "slow"  — отвечает через 5 секунд;
+- "fail"  — 500;
+- "bad"   — 400 (ошибка запроса, не провайдера);
+- "hedge" — первый запрос висит 5 секунд, следующие отвечают сразу.
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+# Добавляем корень проекта в путь
+sys.path.append(os.getcwd())
+
+from aiohttp import web
+from loguru import logger
+from openai import AsyncOpenAI
+from app.config import settings
+from app.services.llm_resilience import CircuitOpenError, LLMResilience
+
+hits: Counter = Counter()
+
+
+async def chat_completions(request: web.Request) -> web.Response:
+    body = await request.json()
+    model = body["model"]
+    hits[model] += 1
+
+    if model == "fail":
+        return web.json_response({"error": {"message": "upstream error"}}, status=500)
+    if model == "bad":
+        return web.json_response({"error": {"message": "invalid request"}}, status=400)
+    if model == "slow" or (model == "hedge" and hits[model] == 1):
+        await asyncio.sleep(5)
+
+    return web.json_response({
+        "id": f"chatcmpl-{hits[model]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": f"reply #{hits[model]}"}}],
+        "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+    })
+
+
+async def start_fake_server() -> tuple[web.AppRunner, str]:
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1"
+
+
+def configure():
+    settings.LLM_TIMEOUT_SEC = 1.0
+    settings.LLM_TIMEOUTS_SEC = {"rerank": 2.0}
+    settings.LLM_BREAKER_ERROR_RATE = 0.5
+    settings.LLM_BREAKER_MIN_CALLS = 4
+    settings.LLM_BREAKER_WINDOW_SEC = 60.0
+    settings.LLM_BREAKER_COOLDOWN_SEC = 1.0
+    settings.LLM_HEDGE_ENABLED = True
+    settings.LLM_HEDGE_CALL_TYPES = ["rerank"]
+    settings.LLM_HEDGE_MIN_SAMPLES = 1000  # телеметрии нет — берется задержка по умолчанию
+    settings.LLM_HEDGE_DEFAULT_DELAY_MS = 300
+    settings.LLM_HEDGE_MIN_DELAY_MS = 100
+
+
+async def run_tests():
+    configure()
+    runner, base_url = await start_fake_server()
+    client = AsyncOpenAI(api_key="test", base_url=base_url, max_retries=0)
+    resilience = LLMResilience()
+
+    def request(model: str):
+        return lambda: client.chat.completions.create(model=model, messages=[{"role": "user", "content": "hi"}])
+
+    try:
+        # 1. Дедлайн: зависший провайдер обрывается по LLM_TIMEOUT_SEC
+        started = time.perf_counter()
+        try:
+            await resilience.call("extract", "slow", request("slow"))
+            raise AssertionError("timeout expected")
+        except TimeoutError:
+            elapsed = time.perf_counter() - started
+        assert elapsed < 1.5, elapsed
+        logger.success(f"Timeout: cut after {elapsed:.2f}s")
+
+        # 2. Брейкер: после всплеска 5xx вызовы отклоняются без похода в сеть
+        for _ in range(settings.LLM_BREAKER_MIN_CALLS):
+            try:
+                await resilience.call("extract", "fail", request("fail"))
+            except Exception as e:
+                assert not isinstance(e, CircuitOpenError), e
+        assert resilience.breaker("fail").state == "open"
+        sent = hits["fail"]
+        try:
+            await resilience.call("extract", "fail", request("fail"))
+            raise AssertionError("CircuitOpenError expected")
+        except CircuitOpenError:
+            pass
+        assert hits["fail"] == sent, "open circuit must not reach the provider"
+        logger.success(f"Breaker: open after {sent} failures, fast-fail without request")
+
+        # 400 от кривого запроса — не сбой провайдера, брейкер не размыкается
+        for _ in range(settings.LLM_BREAKER_MIN_CALLS):
+            try:
+                await resilience.call("extract", "bad", request("bad"))
+            except Exception as e:
+                assert not isinstance(e, CircuitOpenError), e
+        assert resilience.breaker("bad").state == "closed"
+        logger.success("Breaker: 4xx errors do not open the circuit")
+
+        # 3. Half-open: после cooldown один пробный вызов; успех закрывает брейкер
+        breaker = resilience.breaker("ok")
+        breaker._open(time.monotonic(), "test")
+        await asyncio.sleep(settings.LLM_BREAKER_COOLDOWN_SEC + 0.1)
+        response = await resilience.call("extract", "ok", request("ok"))
+        assert response.choices[0].message.content.startswith("reply")
+        assert breaker.state == "closed", breaker.state
+        logger.success("Breaker: half-open probe succeeded, circuit closed")
+
+        # 4. Хеджирование: первый запрос висит, дубль после задержки отвечает сразу
+        started = time.perf_counter()
+        response = await resilience.call("rerank", "hedge", request("hedge"), site="rerank")
+        elapsed = time.perf_counter() - started
+        assert hits["hedge"] == 2, hits["hedge"]
+        assert response.choices[0].message.content == "reply #2", response.choices[0].message.content
+        assert elapsed < 1.5, elapsed
+        logger.success(f"Hedge: duplicate won in {elapsed:.2f}s (primary would take 5s)")
+
+        # 5. Ответ быстрее задержки хеджирования — дубль не уходит
+        before = hits["ok"]
+        await resilience.call("rerank", "ok", request("ok"), site="rerank")
+        assert hits["ok"] == before + 1
+        logger.success("Hedge: fast call sent once")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+    logger.success("All resilience checks passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,52 @@
+"""
+Проверка похожести имен для предупреждения о дублях (name_index), без БД и сети:
+python scripts/test_name_index.py
+
+Совпадение одного имени при разных фамилиях не должно давать предупреждение,
+а транслитерация, уменьшительные, порядок слов и опечатки — должны.
+"""
+import os
+import sys
+
+# Добавляем корень проекта в путь
+sys.path.append(os.getcwd())
+
+from loguru import logger
+from app.config import settings
+from app.services.name_index import _tokenize, name_similarity
+
+threshold = settings.NAME_MATCH_THRESHOLD
+
+# (новый контакт, существующий, должен ли считаться дублем)
+CASES = [
+    ("Анна Смирнова", "Анна Кузнецова", False),
+    ("Саша Петров", "Александр Иванов", False),
+    ("Иван Петров", "Иван Сидоров", False),
+    ("Alex Smith", "Alexander Brown", False),
+    ("Анна Смирнова", "Анна", False),
+    ("Анна Смирнова", "Анна Смирнова", True),
+    ("Саша Петров", "Александр Петров", True),
+    ("Anna Smirnova", "Анна Смирнова", True),
+    ("Смирнова Анна", "Анна Смирнова", True),
+    ("Анна Смирнва", "Анна Смирнова", True),
+    ("Саша", "Александр Иванов", True),
+]
+
+
+def run_tests():
+    failed = 0
+    for new_name, existing, expected in CASES:
+        score = name_similarity(_tokenize(new_name), _tokenize(existing))
+        ok = (score >= threshold) == expected
+        failed += not ok
+        log = logger.success if ok else logger.error
+        log(f"{new_name!r} vs {existing!r}: {score:.2f} (threshold {threshold}, duplicate expected: {expected})")
+
+    if failed:
+        logger.error(f"{failed} name similarity checks failed")
+        sys.exit(1)
+    logger.success("All name similarity checks passed")
+
+
+if __name__ == "__main__":
+    run_tests()